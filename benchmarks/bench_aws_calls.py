@@ -0,0 +1,61 @@
+"""
+Measures the per call cost of DynamoDBUtils and S3Utils operations, with clients answered in process (see local_aws)
+
+The numbers include botocore request serialization, signing and response parsing, not the network.
+
+Run with: python -m benchmarks.bench_aws_calls
+"""
+import timeit
+
+from benchmarks.bench_serialization import event_item
+from benchmarks.local_aws import CONFIG, local_aws
+from ie_utils import DynamoDBUtils, S3Utils
+from ie_utils.registry import AwsRegistry
+
+CALLS = 200
+REPEAT = 5
+TABLE_ITEMS = 1000
+KB = 1024
+PAYLOAD_SIZES = {'1 KB': KB, '64 KB': 64 * KB, '1 MB': 1024 * KB, '8 MB': 8 * 1024 * KB}
+
+
+def per_call(fn, calls=CALLS):
+    return min(timeit.repeat(fn, number=calls, repeat=REPEAT)) / calls
+
+
+def run():
+    """
+    :return: dict of case name -> best time in seconds per call
+    """
+    with local_aws() as fake:
+        fake.put_items('events', DynamoDBUtils.serialize_items([event_item(i) for i in range(TABLE_ITEMS)]))
+        item = event_item(0)
+        DynamoDBUtils.get_table('events')
+        results = {
+            'client construction': per_call(lambda: AwsRegistry().get_client('dynamodb', **CONFIG), calls=5),
+            'get_table cached': per_call(lambda: DynamoDBUtils.get_table('events'), calls=10000),
+            'get_item_by_search_key': per_call(
+                lambda: DynamoDBUtils.get_item_by_search_key('events', {'identifier': 'event-1'})),
+            'put_item': per_call(lambda: DynamoDBUtils.put_item('events', item)),
+            'update_event': per_call(lambda: DynamoDBUtils.update_event(
+                table_name='events', table_key='event-1', status='processed', errorMessage=None)),
+            'log': per_call(lambda: DynamoDBUtils.log('events', 'event-1', 'received', item)),
+            f'scan_items {TABLE_ITEMS} items': per_call(
+                lambda: list(DynamoDBUtils.scan_items('events', page_size=100)), calls=5),
+            # the local responses are computed under the GIL, segments only overlap the waits of a real network: this
+            # case measures the overhead of the parallel scan (worker threads, their tables), not its speedup
+            f'scan_items {TABLE_ITEMS} items 4 segments': per_call(
+                lambda: list(DynamoDBUtils.scan_items('events', total_segments=4, page_size=100)), calls=5),
+        }
+        for name, size in PAYLOAD_SIZES.items():
+            payload = b'x' * size
+            calls = max(5, min(CALLS, 4 * 1024 * KB // size))
+            results[f'put_object {name}'] = per_call(lambda: S3Utils.put_object('bucket', name, payload), calls)
+            results[f'get_object {name}'] = per_call(
+                lambda: S3Utils.get_object('bucket', name).get()['Body'].read(), calls)
+    return results
+
+
+if __name__ == '__main__':
+    for name, seconds in run().items():
+        print(f'{name:<40} {seconds * 1e6:10.1f} us / call')
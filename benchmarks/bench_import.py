@@ -0,0 +1,84 @@
+"""
+Measures the import time of the package entry points, each in a fresh interpreter (as on a lambda cold start)
+
+Exits with status 1 when an entry point loads a module of its forbidden list or when ie_utils takes more than
+MAX_RATIO of the time of importing its heavy dependencies eagerly, so it can guard against regressions in CI.
+
+Run with: python -m benchmarks.bench_import [--importtime]
+"""
+import json
+import subprocess
+import sys
+
+REPEAT = 5
+MAX_RATIO = 0.5
+EAGER = 'import boto3.dynamodb.conditions, boto3.dynamodb.types, sentry_sdk.integrations.aws_lambda'
+HEAVY_MODULES = ('boto3', 'sentry_sdk')
+
+# statement -> modules it must not load
+CASES = {
+    'import ie_utils': HEAVY_MODULES,
+    'from ie_utils import get_logger': HEAVY_MODULES,
+    'from ie_utils import S3Utils': HEAVY_MODULES,
+    'from ie_utils import DynamoDBUtils': HEAVY_MODULES,
+    'from ie_utils import create_cloud_watch_cron_rule': HEAVY_MODULES,
+}
+
+_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'modules': [m for m in {modules!r} if m in sys.modules]}}))
+'''
+
+
+def measure(statement, modules=HEAVY_MODULES) -> dict:
+    """
+    :return: dict with the best time in seconds over REPEAT fresh interpreters and the listed modules loaded
+    """
+    runs = []
+    for _ in range(REPEAT):
+        output = subprocess.run([sys.executable, '-c', _SCRIPT.format(statement=statement, modules=modules)],
+                                check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output))
+    return {'seconds': min(it['seconds'] for it in runs), 'modules': runs[0]['modules']}
+
+
+def importtime(statement) -> str:
+    """
+    :return: -X importtime report of a statement, to find the modules responsible for a regression
+    """
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                          check=True, capture_output=True, text=True).stderr
+
+
+def run():
+    """
+    :return: dict of case name -> best import time in seconds
+    """
+    results = {statement: measure(statement)['seconds'] for statement in CASES}
+    results['eager boto3 + sentry_sdk'] = measure(EAGER)['seconds']
+    return results
+
+
+def main():
+    failures = []
+    eager = measure(EAGER)['seconds']
+    print(f'{"eager boto3 + sentry_sdk":<52} {eager * 1000:8.1f} ms')
+    for statement, forbidden in CASES.items():
+        result = measure(statement, forbidden)
+        print(f'{statement:<52} {result["seconds"] * 1000:8.1f} ms  loaded: {result["modules"] or "-"}')
+        if result['modules']:
+            failures.append(f'{statement} loads {result["modules"]}')
+        if result['seconds'] > eager * MAX_RATIO:
+            failures.append(f'{statement} takes more than {MAX_RATIO:.0%} of the eager import time')
+        if '--importtime' in sys.argv:
+            print(importtime(statement))
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares the per call overhead of the previous log_wrapper with DynamoDBUtils.logged
+
+Log entries go through the buffered writer with a no-op write, so the numbers are the cost paid by the caller.
+
+Run with: python -m benchmarks.bench_log_wrapper
+"""
+import datetime
+import inspect
+import json
+import timeit
+
+import mock
+
+from ie_utils import DynamoDBUtils
+
+CALLS = 10000
+REPEAT = 5
+
+
+def handle(event, context=None):
+    return {'identifier': event['identifier'], 'status': 'processed', 'lines': len(event['body']['lines'])}
+
+
+def event(i):
+    return {'identifier': f'event-{i}', 'body': {'lines': [{'sku': f'sku-{n}', 'quantity': n} for n in range(20)]}}
+
+
+def legacy_log(table_name, table_key, description, log_object):
+    entry = {'datetime': str(datetime.datetime.now()), 'description': description, 'log_object': str(log_object)}
+    DynamoDBUtils._log_writer.enqueue(table_name, table_key, entry)
+
+
+def legacy_wrapper(func, table_name, table_key):
+    def wrapper(*args, **kwargs):
+        legacy_log(table_name, table_key, f'function {func.__name__} request',
+                   {'signature': str(inspect.signature(func)), 'args': list(args), 'kwargs': kwargs})
+        results = func(*args, **kwargs)
+        legacy_log(table_name, table_key, f'function {func.__name__} response',
+                   {'args': list(args), 'result': json.dumps(results)})
+        return results
+
+    return wrapper
+
+
+def per_call(fn, payload):
+    return min(timeit.repeat(lambda: fn(payload), number=CALLS, repeat=REPEAT)) / CALLS
+
+
+def run():
+    """
+    :return: dict of case name -> best time in seconds per call
+    """
+    payload = event(1)
+    cases = {
+        'unwrapped': handle,
+        'legacy log_wrapper': legacy_wrapper(handle, 'table', 'key'),
+        'logged': DynamoDBUtils.logged('table', 'key')(handle),
+        'logged sample_rate=0.1': DynamoDBUtils.logged('table', 'key', sample_rate=0.1)(handle),
+        'logged sample_rate=0': DynamoDBUtils.logged('table', 'key', sample_rate=0)(handle),
+    }
+    with mock.patch.object(DynamoDBUtils, 'append_log_entries'):
+        DynamoDBUtils.enable_log_buffering(max_queue_size=4 * CALLS)
+        try:
+            results = {}
+            for name, fn in cases.items():
+                results[name] = per_call(fn, payload)
+                DynamoDBUtils.flush_logs()
+        finally:
+            DynamoDBUtils.disable_log_buffering()
+    return results
+
+
+if __name__ == '__main__':
+    for name, seconds in run().items():
+        print(f'{name:<30} {seconds * 1e6:8.2f} us / call')
@@ -0,0 +1,76 @@
+"""
+Compares the bulk dynamo db codec with the per call boto3 serializer path
+
+Run with: python -m benchmarks.bench_serialization
+"""
+import timeit
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from ie_utils import DynamoDBUtils
+
+PAGE_SIZE = 100
+REPEAT = 5
+
+
+def event_item(i):
+    """
+    Item shaped like an integration event with a nested payload
+    """
+    return {
+        'identifier': f'event-{i}',
+        'source': 'stripe',
+        'status': 'processed',
+        'date_time': '2019-05-31T10:00:00',
+        'attempts': i % 5,
+        'amount': Decimal('1234.56'),
+        'body': {
+            'customer': {'id': f'cus_{i}', 'email': f'user{i}@example.com', 'tags': {'vip', 'eu'}},
+            'lines': [{'sku': f'sku-{n}', 'quantity': n, 'price': Decimal('9.99'), 'taxable': n % 2 == 0}
+                      for n in range(5)],
+            'metadata': {'retry': False, 'note': None},
+        },
+        'log_messages': [{'datetime': '2019-05-31 10:00:00', 'description': 'received', 'log_object': '{}'}] * 3,
+    }
+
+
+def legacy_deserialize(dynamo_db_dict):
+    deserializer = TypeDeserializer()
+    return {k: deserializer.deserialize(v) for k, v in dynamo_db_dict.items()}
+
+
+def legacy_serialize(python_data):
+    serializer = TypeSerializer()
+    return {k: serializer.serialize(v) for k, v in python_data.items()}
+
+
+def best_time(fn):
+    return min(timeit.repeat(fn, number=1, repeat=REPEAT))
+
+
+def run():
+    """
+    :return: dict of case name -> best time in seconds per page of PAGE_SIZE items
+    """
+    python_page = [event_item(i) for i in range(PAGE_SIZE)]
+    wire_page = [legacy_serialize(item) for item in python_page]
+    return {
+        'serialize legacy': best_time(lambda: [legacy_serialize(item) for item in python_page]),
+        'serialize_python_data': best_time(lambda: [DynamoDBUtils.serialize_python_data(item)
+                                                    for item in python_page]),
+        'serialize_items': best_time(lambda: DynamoDBUtils.serialize_items(python_page)),
+        'deserialize legacy': best_time(lambda: [legacy_deserialize(item) for item in wire_page]),
+        'deserialize_to_python_data': best_time(lambda: [DynamoDBUtils.deserialize_to_python_data(item)
+                                                         for item in wire_page]),
+        'deserialize_items': best_time(lambda: DynamoDBUtils.deserialize_items(wire_page)),
+        'deserialize_items native numbers': best_time(lambda: DynamoDBUtils.deserialize_items(wire_page,
+                                                                                              use_decimal=False)),
+        'deserialize_items 2 attributes': best_time(lambda: DynamoDBUtils.deserialize_items(
+            wire_page, attributes=['identifier', 'status'])),
+    }
+
+
+if __name__ == '__main__':
+    for name, seconds in run().items():
+        print(f'{name:<40} {seconds * 1000:8.3f} ms / {PAGE_SIZE} items')
@@ -0,0 +1,136 @@
+"""
+In-process stand-in for dynamo db and s3, answering requests of the clients of an AwsRegistry from a before-send
+handler, so benchmarks run offline while going through the whole botocore request / response path
+
+Supported: dynamo db GetItem, PutItem, UpdateItem (not applied) and Scan (with Limit, ExclusiveStartKey and segments),
+s3 PutObject and GetObject.
+"""
+import contextlib
+import io
+import json
+import os
+import zlib
+from urllib.parse import unquote, urlsplit
+
+import mock
+from botocore.awsrequest import AWSResponse
+
+from ie_utils.constants import DYNAMO_DB_CONFIG_VAR_NAME
+from ie_utils.registry import AwsRegistry
+from ie_utils.retry import ThrottleControl
+
+CONFIG = {'region_name': 'us-west-2', 'aws_access_key_id': 'local', 'aws_secret_access_key': 'local'}
+ENVIRON = {DYNAMO_DB_CONFIG_VAR_NAME: json.dumps(CONFIG), 'AWS_DEFAULT_REGION': 'us-west-2',
+           'AWS_ACCESS_KEY_ID': 'local', 'AWS_SECRET_ACCESS_KEY': 'local'}
+DEFAULT_SCAN_PAGE_SIZE = 100
+
+
+class _Raw(io.BytesIO):
+    def stream(self, **kwargs):
+        yield self.getvalue()
+
+
+class LocalAws:
+    """
+    Tables of wire format items keyed by 'identifier', and buckets of objects
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self.objects = {}
+
+    def put_items(self, table_name, items):
+        table = self.tables.setdefault(table_name, {})
+        for item in items:
+            table[item['identifier']['S']] = item
+
+    def __call__(self, request, **kwargs):
+        target = request.headers.get('X-Amz-Target')
+        if target:
+            operation = target.decode('utf-8').split('.')[-1] if isinstance(target, bytes) else target.split('.')[-1]
+            return self._dynamodb(operation, json.loads(request.body))
+        return self._s3(request)
+
+    def _dynamodb(self, operation, params):
+        table = self.tables.setdefault(params.get('TableName'), {})
+        if operation == 'GetItem':
+            item = table.get(params['Key']['identifier']['S'])
+            return _response(200, {'Item': item} if item else {})
+        if operation == 'PutItem':
+            table[params['Item']['identifier']['S']] = params['Item']
+            return _response(200, {})
+        if operation == 'UpdateItem':
+            return _response(200, {})
+        if operation == 'Scan':
+            return _response(200, self._scan(table, params))
+        return _response(400, {'__type': 'com.amazon.coral.validate#ValidationException', 'message': operation})
+
+    @staticmethod
+    def _scan(table, params):
+        keys = sorted(table)
+        if 'TotalSegments' in params:
+            keys = [it for it in keys if zlib.crc32(it.encode()) % params['TotalSegments'] == params['Segment']]
+        start = 0
+        if 'ExclusiveStartKey' in params:
+            start = keys.index(params['ExclusiveStartKey']['identifier']['S']) + 1
+        page = keys[start:start + params.get('Limit', DEFAULT_SCAN_PAGE_SIZE)]
+        response = {'Items': [table[it] for it in page], 'Count': len(page), 'ScannedCount': len(page)}
+        if page and start + len(page) < len(keys):
+            response['LastEvaluatedKey'] = {'identifier': {'S': page[-1]}}
+        return response
+
+    def _s3(self, request):
+        url = urlsplit(request.url)
+        key = (url.netloc.split('.')[0], unquote(url.path.lstrip('/')))
+        if request.method == 'PUT':
+            body = request.body.read() if hasattr(request.body, 'read') else request.body or b''
+            if b'aws-chunked' in _header(request, 'Content-Encoding'):
+                body = _decode_aws_chunked(body)
+            self.objects[key] = bytes(body)
+            return AWSResponse(request.url, 200, {'ETag': '"local"'}, _Raw(b''))
+        body = self.objects.get(key)
+        if body is None:
+            return AWSResponse(request.url, 404, {}, _Raw(b'<Error><Code>NoSuchKey</Code></Error>'))
+        return AWSResponse(request.url, 200, {'ETag': '"local"', 'Content-Length': str(len(body))}, _Raw(body))
+
+
+def _response(status, body):
+    return AWSResponse(None, status, {'Content-Type': 'application/x-amz-json-1.0'}, _Raw(json.dumps(body).encode()))
+
+
+def _header(request, name) -> bytes:
+    value = request.headers.get(name) or b''
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+def _decode_aws_chunked(body) -> bytes:
+    # <hex size>\r\n<data>\r\n ... 0\r\n<trailers>
+    data = bytearray()
+    position = 0
+    while True:
+        end = body.index(b'\r\n', position)
+        size = int(body[position:end].split(b';')[0], 16)
+        if not size:
+            return bytes(data)
+        data += body[end + 2:end + 2 + size]
+        position = end + 2 + size + 2
+
+
+@contextlib.contextmanager
+def local_aws():
+    """
+    Route the calls of DynamoDBUtils and S3Utils to a LocalAws, with the throttle handlers of the library enabled
+
+    :return: LocalAws
+    """
+    fake = LocalAws()
+    registry = AwsRegistry()
+    registry.add_event_handler('before-send', fake, 'local-aws')
+    throttle_control = ThrottleControl()
+    throttle_control.enable(registry)
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.dict(os.environ, ENVIRON))
+        stack.enter_context(mock.patch('ie_utils.dynamodb.aws_registry', registry))
+        stack.enter_context(mock.patch('ie_utils.s3.aws_registry', registry))
+        stack.callback(throttle_control.disable)
+        yield fake
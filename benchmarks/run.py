@@ -0,0 +1,118 @@
+"""
+Runs the benchmark suites, saves the results as json and compares them with a previous run
+
+Every suite is the run() function of a benchmark module, returning case name -> best time in seconds. A case is a
+regression when it takes more than (1 + threshold) times its baseline time; the exit status is then 1.
+
+Run with: python -m benchmarks.run [--suites import aws_calls] [--repeat 3] [--output results.json]
+                                   [--baseline previous.json] [--threshold 0.25]
+"""
+import argparse
+import datetime
+import importlib
+import json
+import platform
+import subprocess
+import sys
+
+SUITES = {
+    'import': 'benchmarks.bench_import',
+    'serialization': 'benchmarks.bench_serialization',
+    'log_wrapper': 'benchmarks.bench_log_wrapper',
+    'aws_calls': 'benchmarks.bench_aws_calls',
+}
+DEFAULT_THRESHOLD = 0.25
+
+
+def run_suites(names, repeat=1) -> dict:
+    """
+    :param names: suite names, see SUITES
+    :param repeat: number of runs of every suite, the best time of every case is kept
+    :return: dict with the run environment and results: suite name -> case name -> seconds
+    """
+    results = {}
+    for name in names:
+        suite = importlib.import_module(SUITES[name])
+        cases = results[name] = {}
+        for i in range(repeat):
+            print(f'running {name} ({i + 1}/{repeat})', file=sys.stderr)
+            for case, seconds in suite.run().items():
+                cases[case] = min(seconds, cases.get(case, seconds))
+    return {'environment': environment(), 'results': results}
+
+
+def environment() -> dict:
+    import boto3
+    import botocore
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'boto3': boto3.__version__,
+        'botocore': botocore.__version__,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD) -> list:
+    """
+    Cases slower than their baseline by more than threshold, cases missing from either run are skipped
+
+    :param baseline: results of a previous run_suites
+    :param current: results of run_suites
+    :param threshold: allowed slowdown, 0.25 for 25 %
+    :return: list of dicts with suite, case, baseline, current (seconds) and ratio
+    """
+    regressions = []
+    for suite, cases in current['results'].items():
+        baseline_cases = baseline['results'].get(suite, {})
+        for case, seconds in cases.items():
+            baseline_seconds = baseline_cases.get(case)
+            if baseline_seconds and seconds > baseline_seconds * (1 + threshold):
+                regressions.append({'suite': suite, 'case': case, 'baseline': baseline_seconds, 'current': seconds,
+                                    'ratio': seconds / baseline_seconds})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run ie_utils benchmarks')
+    parser.add_argument('--suites', nargs='+', choices=sorted(SUITES), default=list(SUITES))
+    parser.add_argument('--repeat', type=int, default=1, help='runs of every suite, the best times are kept')
+    parser.add_argument('--output', help='json file to save the results to')
+    parser.add_argument('--baseline', help='json results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown against the baseline, 0.25 for 25 %%')
+    args = parser.parse_args(argv)
+
+    current = run_suites(args.suites, repeat=args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    for suite, cases in current['results'].items():
+        print(suite)
+        for case, seconds in cases.items():
+            previous = baseline and baseline['results'].get(suite, {}).get(case)
+            change = f'  {seconds / previous - 1:+7.1%}' if previous else ''
+            print(f'  {case:<48} {seconds * 1e6:12.1f} us{change}')
+
+    if baseline is None:
+        return 0
+    regressions = compare(baseline, current, args.threshold)
+    for it in regressions:
+        print(f'REGRESSION: {it["suite"]} / {it["case"]} {it["baseline"] * 1e6:.1f} us -> {it["current"] * 1e6:.1f} us '
+              f'({it["ratio"]:.2f}x)')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
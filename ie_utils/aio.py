@@ -0,0 +1,206 @@
+"""
+asyncio facade over DynamoDBUtils and S3Utils
+
+Blocking calls run on a dedicated thread pool, at most a given number at a time per service, so an event loop can fan
+out hundreds of item reads or object fetches without blocking and without exhausting the http connection pools.
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import itertools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from ie_utils.dynamodb import DynamoDBUtils
+from ie_utils.s3 import S3Utils
+
+DEFAULT_MAX_WORKERS = 64
+# botocore clients keep 10 http connections per pool by default
+DEFAULT_LIMITS = {'dynamodb': 10, 's3': 10}
+DEFAULT_SCAN_BATCH_SIZE = 100
+
+
+class AsyncExecutor:
+    """
+    Runs blocking calls on a thread pool from coroutines, with a concurrency limit per service
+
+    A call that is cancelled or times out while waiting for its service slot never runs; one already running on a
+    thread cannot be interrupted, so it keeps its slot until it returns, and the limit holds for the threads really
+    busy. The log context (see log_context) of the caller is passed to the thread.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, limits=None, timeout=None):
+        """
+        :param max_workers: number of threads of the pool
+        :param limits: dict of service name -> max number of concurrent calls, see DEFAULT_LIMITS
+        :param timeout: default timeout of a call in seconds, including the wait for a slot; None for no timeout
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ie-utils-aio')
+        self._limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        # asyncio semaphores belong to one event loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    async def run(self, service_name, func, *args, timeout=None, **kwargs):
+        """
+        Call func(*args, **kwargs) on the thread pool
+
+        :param service_name: service whose limit applies, e.g. 'dynamodb'
+        :param func: blocking callable
+        :param timeout: timeout in seconds, the default timeout of the executor if None
+        :return: func result
+        :raises asyncio.TimeoutError: when the call did not complete in time
+        """
+        timeout = self._timeout if timeout is None else timeout
+        call = self._call(service_name, functools.partial(func, *args, **kwargs))
+        if timeout is None:
+            return await call
+        return await asyncio.wait_for(call, timeout)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    async def _call(self, service_name, call):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore(loop, service_name)
+        await semaphore.acquire()
+        try:
+            future = self._executor.submit(contextvars.copy_context().run, call)
+        except BaseException:
+            semaphore.release()
+            raise
+        future.add_done_callback(lambda _: _call_soon(loop, semaphore.release))
+        try:
+            return await asyncio.shield(asyncio.wrap_future(future, loop=loop))
+        except asyncio.CancelledError:
+            # only cancels a call still queued in the pool, a running one releases its slot when it returns
+            future.cancel()
+            raise
+
+    def _semaphore(self, loop, service_name) -> asyncio.Semaphore:
+        with self._lock:
+            semaphores = self._semaphores.setdefault(loop, {})
+            semaphore = semaphores.get(service_name)
+            if semaphore is None:
+                semaphore = semaphores[service_name] = asyncio.Semaphore(
+                    self._limits.get(service_name, DEFAULT_MAX_WORKERS))
+        return semaphore
+
+
+def _call_soon(loop, callback):
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError:
+        # the loop is closed, its semaphores are gone with it
+        pass
+
+
+def _close(generator):
+    # a batch that timed out may still be running on its thread, it stops there when its scan ends
+    with contextlib.suppress(ValueError):
+        generator.close()
+
+
+def configure_executor(max_workers=DEFAULT_MAX_WORKERS, limits=None, timeout=None) -> AsyncExecutor:
+    """
+    Replace the executor of AsyncDynamoDBUtils and AsyncS3Utils; calls already running finish on the previous one
+
+    :param max_workers: number of threads of the pool
+    :param limits: dict of service name -> max number of concurrent calls
+    :param timeout: default timeout of a call in seconds
+    :return: the new executor
+    """
+    global executor
+    previous, executor = executor, AsyncExecutor(max_workers=max_workers, limits=limits, timeout=timeout)
+    previous.shutdown(wait=False)
+    return executor
+
+
+class AsyncDynamoDBUtils:
+    """
+    Coroutine versions of DynamoDBUtils operations, see AsyncExecutor; every method accepts a timeout in seconds
+    """
+    SERVICE_NAME = 'dynamodb'
+
+    @staticmethod
+    async def get_item_by_search_key(table_name, search_key, timeout=None) -> dict:
+        return await executor.run(AsyncDynamoDBUtils.SERVICE_NAME, DynamoDBUtils.get_item_by_search_key, table_name,
+                                  search_key, timeout=timeout)
+
+    @staticmethod
+    async def get_items_by_keys(table_name, search_keys, projection=None, consistent_read=False,
+                                timeout=None) -> dict:
+        return await executor.run(AsyncDynamoDBUtils.SERVICE_NAME, DynamoDBUtils.get_items_by_keys, table_name,
+                                  search_keys, projection=projection, consistent_read=consistent_read,
+                                  timeout=timeout)
+
+    @staticmethod
+    async def put_item(table_name, entry_data, timeout=None):
+        await executor.run(AsyncDynamoDBUtils.SERVICE_NAME, DynamoDBUtils.put_item, table_name, entry_data,
+                           timeout=timeout)
+
+    @staticmethod
+    async def update_item(table_name, timeout=None, **kwargs):
+        await executor.run(AsyncDynamoDBUtils.SERVICE_NAME, DynamoDBUtils.update_item, table_name, timeout=timeout,
+                           **kwargs)
+
+    @staticmethod
+    async def update_event(timeout=None, **kwargs):
+        await executor.run(AsyncDynamoDBUtils.SERVICE_NAME, DynamoDBUtils.update_event, timeout=timeout, **kwargs)
+
+    @staticmethod
+    async def log(table_name, table_key, description, log_object, timeout=None):
+        await executor.run(AsyncDynamoDBUtils.SERVICE_NAME, DynamoDBUtils.log, table_name, table_key, description,
+                           log_object, timeout=timeout)
+
+    @staticmethod
+    async def query_items(table_name, index_name=None, timeout=None, **query_kwargs) -> list:
+        return await executor.run(AsyncDynamoDBUtils.SERVICE_NAME,
+                                  lambda: list(DynamoDBUtils.query_items(table_name, index_name, **query_kwargs)),
+                                  timeout=timeout)
+
+    @staticmethod
+    async def scan_items(table_name, batch_size=DEFAULT_SCAN_BATCH_SIZE, timeout=None, **scan_kwargs):
+        """
+        Async generator of the items of a scan, see DynamoDBUtils.scan_items; items are fetched from the scanner
+        batch_size at a time, timeout applies to each batch
+        """
+        items = iter(DynamoDBUtils.scan_items(table_name, **scan_kwargs))
+        try:
+            while True:
+                batch = await executor.run(AsyncDynamoDBUtils.SERVICE_NAME, list,
+                                           itertools.islice(items, batch_size), timeout=timeout)
+                for item in batch:
+                    yield item
+                if len(batch) < batch_size:
+                    return
+        finally:
+            # stops the segment threads of a parallel scan left before its end
+            await asyncio.get_running_loop().run_in_executor(None, _close, items)
+
+
+class AsyncS3Utils:
+    """
+    Coroutine versions of S3Utils operations, see AsyncExecutor; every method accepts a timeout in seconds
+    """
+    SERVICE_NAME = 's3'
+
+    @staticmethod
+    async def get_object_bytes(bucket_name, file_key, timeout=None) -> bytes:
+        """
+        :return: content of an s3 object
+        """
+        return await executor.run(AsyncS3Utils.SERVICE_NAME,
+                                  lambda: S3Utils.get_object(bucket_name, file_key).get()['Body'].read(),
+                                  timeout=timeout)
+
+    @staticmethod
+    async def put_object(bucket_name, file_key, file_bytes, timeout=None):
+        await executor.run(AsyncS3Utils.SERVICE_NAME, S3Utils.put_object, bucket_name, file_key, file_bytes,
+                           timeout=timeout)
+
+
+executor = AsyncExecutor()
@@ -0,0 +1,126 @@
+import functools
+import inspect
+import json
+import random
+
+DEFAULT_MAX_PAYLOAD_SIZE = None
+
+
+class LazyPayload:
+    """
+    Log object rendered to a (truncated) string the first time it is converted to str
+
+    With buffered logging the payload is rendered by the writer thread, off the caller's path. Arguments are not
+    copied, so a mutable argument changed by the caller before the entry is written is logged as changed.
+    """
+    __slots__ = ('_value', '_max_size', '_render', '_rendered')
+
+    def __init__(self, value, max_size=DEFAULT_MAX_PAYLOAD_SIZE, render=None):
+        """
+        :param value: json serializable value, other objects are rendered with str
+        :param max_size: max number of characters of the rendered payload, None for no limit
+        :param render: callable (value) returning the rendered string, to_json if None
+        """
+        self._value = value
+        self._max_size = max_size
+        self._render = render or to_json
+        self._rendered = None
+
+    def __str__(self):
+        if self._rendered is None:
+            self._rendered = truncate(self._render(self._value), self._max_size)
+            self._value = None
+        return self._rendered
+
+
+def to_json(value) -> str:
+    try:
+        return json.dumps(value, default=str)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def to_repr(value) -> str:
+    """
+    Format of the entries of the previous log_wrapper: str of the payload dict, with args as a list and the result as
+    a json string
+    """
+    value = dict(value, args=list(value['args']))
+    if 'result' in value:
+        value['result'] = to_json(value['result'])
+    return str(value)
+
+
+PAYLOAD_FORMATS = {'json': to_json, 'repr': to_repr}
+
+
+def truncate(text, max_size) -> str:
+    """
+    :param text:
+    :param max_size: max number of characters kept, None for no limit
+    :return: text, cut to max_size characters followed by a marker with the number of dropped characters
+    """
+    if max_size is None or len(text) <= max_size:
+        return text
+    return f'{text[:max_size]}...[{len(text) - max_size} more characters]'
+
+
+def log_calls(func, log, table_name, table_key, sample_rate=1.0, max_payload_size=DEFAULT_MAX_PAYLOAD_SIZE,
+              log_result=True, log_errors=True, payload_format='json', sample=random.random):
+    """
+    Wrap a function so that its calls are logged as a request and a response entry
+
+    Everything that does not depend on the call (signature, descriptions) is computed once here. Payloads are
+    LazyPayload objects, rendered only when the entry is written. Calls that are not sampled cost one random number;
+    errors are logged for every call when log_errors is set, sampled or not.
+
+    :param func: function, method or bound method
+    :param log: callable (table_name, table_key, description, log_object)
+    :param table_name: dynamo db table name
+    :param table_key: identifier of the logged item, or callable (*args, **kwargs) returning it
+    :param sample_rate: fraction of calls logged, 0 to 1
+    :param max_payload_size: max number of characters of a rendered payload, None for no limit
+    :param log_result: log the result in the response entry
+    :param log_errors: log raised exceptions
+    :param payload_format: 'json', or 'repr' for the str of the payload dict, see PAYLOAD_FORMATS
+    :param sample: callable returning a random float in [0, 1)
+    :return: wrapper function
+    """
+    if payload_format not in PAYLOAD_FORMATS:
+        raise ValueError(f'Unknown payload format {payload_format}, expected one of {sorted(PAYLOAD_FORMATS)}')
+    render = PAYLOAD_FORMATS[payload_format]
+    name = func.__name__
+    signature = str(inspect.signature(func))
+    parameters = list(inspect.signature(func).parameters)
+    # functions decorated in a class body receive self / cls, which is not logged
+    first_arg = 1 if parameters and parameters[0] in ('self', 'cls') else 0
+    request_description = f'function {name} request'
+    response_description = f'function {name} response'
+    error_description = f'function {name} error'
+    get_key = table_key if callable(table_key) else None
+    always = sample_rate >= 1
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        logged = always or sample() < sample_rate
+        if not (logged or log_errors):
+            return func(*args, **kwargs)
+
+        key = get_key(*args, **kwargs) if get_key else table_key
+        logged_args = args[first_arg:] if first_arg else args
+        if logged:
+            log(table_name, key, request_description,
+                LazyPayload({'signature': signature, 'args': logged_args, 'kwargs': kwargs}, max_payload_size, render))
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if log_errors:
+                log(table_name, key, error_description,
+                    LazyPayload({'args': logged_args, 'kwargs': kwargs, 'error': repr(e)}, max_payload_size, render))
+            raise
+        if logged:
+            payload = {'args': logged_args, 'result': result} if log_result else {'args': logged_args}
+            log(table_name, key, response_description, LazyPayload(payload, max_payload_size, render))
+        return result
+
+    return wrapper
@@ -0,0 +1,128 @@
+import uuid
+
+from ie_utils.cron_multiplexer import DEFAULT_MAX_WORKERS, DEFAULT_TABLE_NAME, CronMultiplexer
+from ie_utils.cron_rules import RULE_PREFIX, CronRuleManager
+from ie_utils.logging_utils import get_logger
+from ie_utils.registry import aws_registry
+
+# function arns are cached across calls, clients are resolved on every call
+_cron_rules = CronRuleManager(lambda service_name: aws_registry.get_client(service_name))
+_cron_multiplexer = None
+
+
+def create_cloud_watch_cron_rule(cron_expression, lambda_function, lambda_json_input, description,
+                                 attach_rule_data=False):
+    """
+    Create a cron rule and a lambda trigger, one rule per job; see register_cron_job to share rules between jobs
+    """
+
+    return _cron_rules.create_rule(**_new_rule(cron_expression, lambda_function, lambda_json_input, description,
+                                               attach_rule_data))
+
+
+def delete_cloud_watch_cron_rule(rule_name, statement_id, function_name):
+    """
+    Delete a cron rule and a lambda trigger
+    """
+
+    if rule_name:
+        _cron_rules.delete_rule(rule_name, statement_id, function_name)
+
+
+def create_cloud_watch_cron_rules(rules) -> list:
+    """
+    Create cron rules and lambda triggers concurrently
+
+    :param rules: iterable of dicts of create_cloud_watch_cron_rule arguments
+    :return: list of CronRuleResult (rule_name, statement_ids, error), in input order
+    """
+    return _cron_rules.create_rules(_new_rule(**it) for it in rules)
+
+
+def delete_cloud_watch_cron_rules(rules) -> list:
+    """
+    Delete cron rules and lambda triggers concurrently
+
+    :param rules: iterable of dicts of delete_cloud_watch_cron_rule arguments
+    :return: list of CronRuleResult (rule_name, statement_ids, error), in input order
+    """
+    return _cron_rules.delete_rules(it for it in rules if it.get('rule_name'))
+
+
+def sweep_cloud_watch_cron_rules(is_orphan, prefix=RULE_PREFIX, dry_run=False) -> list:
+    """
+    Delete orphaned cron rules and the lambda permissions of their targets, see CronRuleManager.sweep
+
+    :param is_orphan: callable (rule dict of list_rules, with Name and Arn) returning True for a rule to delete
+    :param prefix: rule name prefix
+    :param dry_run: only report what would be deleted
+    :return: list of CronRuleResult (rule_name, statement_ids, error)
+    """
+    return _cron_rules.sweep(is_orphan, prefix=prefix, dry_run=dry_run)
+
+
+def _new_rule(cron_expression, lambda_function, lambda_json_input, description, attach_rule_data=False) -> dict:
+    return {
+        'rule_name': 'Rule_{}'.format(uuid.uuid4().hex),
+        'statement_id': f'{lambda_function}-stmt-id-{uuid.uuid4().hex}',
+        'cron_expression': cron_expression,
+        'lambda_function': lambda_function,
+        'lambda_json_input': lambda_json_input,
+        'description': description,
+        'attach_rule_data': attach_rule_data,
+    }
+
+
+def enable_cron_multiplexer(dispatcher_function, table_name=DEFAULT_TABLE_NAME, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Enable register_cron_job: jobs with the same cron expression share one rule, which triggers the dispatcher lambda
+
+    :param dispatcher_function: name of the lambda whose handler calls dispatch_cron_jobs
+    :param table_name: jobs table, hash key schedule and range key job_id (strings)
+    :param max_workers: max number of jobs invoked in parallel per dispatch
+    :return:
+    """
+    global _cron_multiplexer
+    _cron_multiplexer = CronMultiplexer(aws_registry.get_client, _get_table, dispatcher_function,
+                                        table_name=table_name, max_workers=max_workers)
+
+
+def register_cron_job(cron_expression, lambda_function, lambda_json_input, description=None, job_id=None) -> str:
+    """
+    Schedule a lambda invocation on the shared rule of its cron expression, see enable_cron_multiplexer
+
+    :return: job id, to be passed to unregister_cron_job
+    """
+    return _get_cron_multiplexer().register(cron_expression, lambda_function, lambda_json_input,
+                                            description=description, job_id=job_id)
+
+
+def unregister_cron_job(cron_expression, job_id):
+    """
+    Remove a job registered with register_cron_job
+    """
+    _get_cron_multiplexer().unregister(cron_expression, job_id)
+
+
+def dispatch_cron_jobs(event, context=None) -> dict:
+    """
+    Dispatcher lambda handler, invokes the jobs of the cron expression of a shared rule
+
+    :return: dict with schedule, dispatched and failed job counts
+    """
+    result = _get_cron_multiplexer().dispatch(event)
+    get_logger().info(f'Dispatched {result["dispatched"]} jobs scheduled for {result["schedule"]}, '
+                      f'{result["failed"]} failed')
+    return result
+
+
+def _get_cron_multiplexer() -> CronMultiplexer:
+    if _cron_multiplexer is None:
+        raise ValueError('Cron multiplexer is not enabled, call enable_cron_multiplexer first')
+    return _cron_multiplexer
+
+
+def _get_table(table_name):
+    # the dynamodb module is only needed by the multiplexer, it is not imported with the cron functions
+    from ie_utils.dynamodb import DynamoDBUtils
+    return DynamoDBUtils.get_table(table_name)
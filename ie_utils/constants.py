@@ -1,3 +1,5 @@
 LOGGING_LEVEL_VAR_NAME = 'logging_level'
 SENTRY_DSN_VAR_NAME = 'sentry_dsn'
 DYNAMO_DB_CONFIG_VAR_NAME = 'dynamo_db_config'
+LOGGING_MODULE_LEVELS_VAR_NAME = 'logging_module_levels'
+LOGGING_DEBUG_SAMPLE_RATE_VAR_NAME = 'logging_debug_sample_rate'
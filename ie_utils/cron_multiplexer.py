@@ -0,0 +1,211 @@
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from ie_utils.dynamodb_scan import paginate
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_KEY = 'schedule'
+JOB_KEY = 'job_id'
+RULE_PREFIX = 'Cron_'
+STATEMENT_ID = 'ie-utils-cron-multiplexer'
+DEFAULT_TABLE_NAME = 'cron_jobs'
+DEFAULT_MAX_WORKERS = 8
+
+
+def schedule_rule_name(cron_expression) -> str:
+    """
+    :return: name of the shared rule of a cron expression, the same in every process
+    """
+    return RULE_PREFIX + hashlib.sha1(cron_expression.encode('utf-8')).hexdigest()[:32]
+
+
+class CronMultiplexer:
+    """
+    Scheduled jobs sharing one CloudWatch rule per distinct cron expression
+
+    Jobs are items of a dynamo db table with the cron expression as hash key and the job id as range key, so
+    registering or removing a job is a single item write. Each rule triggers a dispatcher lambda with the cron
+    expression as input; the dispatcher queries the jobs of the expression and invokes their lambdas asynchronously
+    with their input, as the rule of a job would have.
+
+    The lambda permission of the dispatcher covers every Cron_ rule of the account and region, so the resource
+    policy holds one statement whatever the number of schedules.
+    """
+
+    def __init__(self, get_client, get_table, dispatcher_function, table_name=DEFAULT_TABLE_NAME,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        """
+        :param get_client: callable (service name) returning a boto3 client
+        :param get_table: callable (table name) returning a dynamo db table
+        :param dispatcher_function: name of the lambda calling dispatch
+        :param table_name: jobs table, hash key schedule and range key job_id (strings)
+        :param max_workers: max number of jobs invoked in parallel by dispatch
+        """
+        self._get_client = get_client
+        self._get_table = get_table
+        self._dispatcher_function = dispatcher_function
+        self._table_name = table_name
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._schedules = set()
+        self._dispatcher_arn = None
+        self._permission_added = False
+
+    def register(self, cron_expression, lambda_function, lambda_json_input, description=None, job_id=None) -> str:
+        """
+        Schedule a lambda invocation, creating the rule of the cron expression if this process did not yet
+
+        :param cron_expression: schedule expression, e.g. 'cron(0 12 * * ? *)'
+        :param lambda_function: name of the lambda to invoke
+        :param lambda_json_input: invocation input, json serializable
+        :param description: job description
+        :param job_id: job id, a random one if None; registering an existing job id replaces the job
+        :return: job id
+        """
+        self.ensure_schedule(cron_expression)
+        job_id = job_id or uuid.uuid4().hex
+        item = {
+            SCHEDULE_KEY: cron_expression,
+            JOB_KEY: job_id,
+            'lambda_function': lambda_function,
+            'input': json.dumps(lambda_json_input),
+        }
+        if description:
+            item['description'] = description
+        self._get_table(self._table_name).put_item(Item=item)
+        logger.info(f'Job {job_id} scheduled for {cron_expression}')
+        return job_id
+
+    def unregister(self, cron_expression, job_id):
+        """
+        Remove a job; the rule of the cron expression is kept, see delete_schedule
+        """
+        self._get_table(self._table_name).delete_item(Key={SCHEDULE_KEY: cron_expression, JOB_KEY: job_id})
+        logger.info(f'Job {job_id} removed from {cron_expression}')
+
+    def jobs(self, cron_expression):
+        """
+        :return: generator of the job items of a cron expression, queried page by page
+        """
+        table = self._get_table(self._table_name)
+        for items, _ in paginate(table.query, KeyConditionExpression='#schedule = :schedule',
+                                 ExpressionAttributeNames={'#schedule': SCHEDULE_KEY},
+                                 ExpressionAttributeValues={':schedule': cron_expression}):
+            yield from items
+
+    def dispatch(self, event, run=None) -> dict:
+        """
+        Run the jobs of the cron expression of a rule event; a failing job is logged and does not stop the others
+
+        :param event: dispatcher lambda input, dict with the schedule
+        :param run: callable (job item) running a job, invokes its lambda asynchronously if None
+        :return: dict with schedule, dispatched and failed job counts
+        """
+        cron_expression = event[SCHEDULE_KEY]
+        run = run or self._invoke
+        jobs = list(self.jobs(cron_expression))
+
+        def run_job(job):
+            try:
+                run(job)
+                return True
+            except Exception:
+                logger.exception(f'Failed to run job {job[JOB_KEY]} of {cron_expression}')
+                return False
+
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(self._max_workers, len(jobs)),
+                                    thread_name_prefix='ie-utils-cron') as executor:
+                results = list(executor.map(run_job, jobs))
+        else:
+            results = []
+        failed = results.count(False)
+        return {'schedule': cron_expression, 'dispatched': len(results) - failed, 'failed': failed}
+
+    def ensure_schedule(self, cron_expression) -> str:
+        """
+        Create (or update) the rule of a cron expression and its dispatcher target, once per process
+
+        :return: rule name
+        """
+        rule_name = schedule_rule_name(cron_expression)
+        if cron_expression in self._schedules:
+            return rule_name
+        with self._lock:
+            if cron_expression in self._schedules:
+                return rule_name
+            events_client = self._get_client('events')
+            rule_arn = events_client.put_rule(
+                Name=rule_name,
+                ScheduleExpression=cron_expression,
+                State='ENABLED',
+                Description=f'Multiplexed jobs scheduled for {cron_expression}'
+            )['RuleArn']
+            events_client.put_targets(
+                Rule=rule_name,
+                Targets=[{
+                    'Id': rule_name,
+                    'Arn': self._get_dispatcher_arn(),
+                    'Input': json.dumps({SCHEDULE_KEY: cron_expression})
+                }]
+            )
+            self._ensure_permission(rule_arn)
+            self._schedules.add(cron_expression)
+        logger.info(f'Rule {rule_name} dispatches jobs scheduled for {cron_expression}')
+        return rule_name
+
+    def delete_schedule(self, cron_expression, force=False) -> bool:
+        """
+        Delete the rule of a cron expression
+
+        A job registered by another process while the rule is deleted is not run until a process creates the rule
+        again, so this is meant for maintenance rather than for every unregister.
+
+        :param cron_expression: schedule expression
+        :param force: delete the rule even if jobs are still registered
+        :return: True if the rule was deleted
+        """
+        if not force and next(iter(self.jobs(cron_expression)), None) is not None:
+            return False
+        rule_name = schedule_rule_name(cron_expression)
+        events_client = self._get_client('events')
+        with self._lock:
+            events_client.remove_targets(Rule=rule_name, Ids=[rule_name], Force=True)
+            events_client.delete_rule(Name=rule_name, Force=True)
+            self._schedules.discard(cron_expression)
+        logger.info(f'Rule {rule_name} deleted')
+        return True
+
+    def _invoke(self, job):
+        self._get_client('lambda').invoke(
+            FunctionName=job['lambda_function'],
+            InvocationType='Event',
+            Payload=job['input'].encode('utf-8')
+        )
+
+    def _get_dispatcher_arn(self) -> str:
+        if self._dispatcher_arn is None:
+            self._dispatcher_arn = self._get_client('lambda').get_function(
+                FunctionName=self._dispatcher_function)['Configuration']['FunctionArn']
+        return self._dispatcher_arn
+
+    def _ensure_permission(self, rule_arn):
+        if self._permission_added:
+            return
+        lambda_client = self._get_client('lambda')
+        try:
+            lambda_client.add_permission(
+                FunctionName=self._dispatcher_function,
+                StatementId=STATEMENT_ID,
+                Action='lambda:InvokeFunction',
+                SourceArn=f'{rule_arn.rsplit("/", 1)[0]}/{RULE_PREFIX}*',
+                Principal='events.amazonaws.com'
+            )
+        except lambda_client.exceptions.ResourceConflictException:
+            pass
+        self._permission_added = True
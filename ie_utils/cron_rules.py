@@ -0,0 +1,238 @@
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from ie_utils.retry import AdaptiveBackoff
+
+logger = logging.getLogger(__name__)
+
+RULE_PREFIX = 'Rule_'
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_ATTEMPTS = 8
+REMOVE_TARGETS_MAX_IDS = 100
+# concurrent updates of the same rule or function policy; botocore retries throttling errors but not these
+CONFLICT_ERROR_CODES = {'ConcurrentModificationException'}
+NOT_FOUND_ERROR_CODES = {'ResourceNotFoundException'}
+
+
+class CronRuleResult(namedtuple('CronRuleResult', ['rule_name', 'statement_ids', 'error'])):
+    """
+    Outcome of a bulk operation for one rule; error is the exception raised, None on success
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def error_code(exc) -> str:
+    return exc.response.get('Error', {}).get('Code') if isinstance(exc, ClientError) else None
+
+
+class CronRuleManager:
+    """
+    Creates and deletes cron rules triggering lambdas, one rule per schedule, in bulk on a bounded thread pool
+
+    Function arns are fetched once per function. Throttled calls are retried by botocore; calls failing on a concurrent
+    modification are retried with a backoff shared by all workers.
+    Bulk operations never raise for a single rule: they return a CronRuleResult per rule, in input order.
+    """
+
+    def __init__(self, get_client, max_workers=DEFAULT_MAX_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        :param get_client: callable (service name) returning a boto3 client, called from every worker thread
+        :param max_workers: max number of rules handled concurrently
+        :param max_attempts: max number of attempts of a call failing on a concurrent modification
+        """
+        self._get_client = get_client
+        self._max_workers = max_workers
+        self._max_attempts = max_attempts
+        self._backoff = AdaptiveBackoff()
+        self._lock = threading.Lock()
+        self._function_arns = {}
+
+    def function_arn(self, function_name) -> str:
+        """
+        :return: arn of a lambda function, cached
+        """
+        arn = self._function_arns.get(function_name)
+        if arn is None:
+            arn = self._call('lambda', 'get_function', FunctionName=function_name)['Configuration']['FunctionArn']
+            with self._lock:
+                self._function_arns[function_name] = arn
+        return arn
+
+    def create_rule(self, rule_name, statement_id, cron_expression, lambda_function, lambda_json_input, description,
+                    attach_rule_data=False):
+        """
+        Create a cron rule, its lambda target and the lambda permission; a partly created rule is deleted again
+
+        :param attach_rule_data: add cron_rule_name and statement_id to the json body of the lambda input
+        :return: (rule name, statement id)
+        """
+        rule_arn = self._call('events', 'put_rule', Name=rule_name, ScheduleExpression=cron_expression,
+                              State='ENABLED', Description=description)['RuleArn']
+        logger.info(f'Rule {rule_name} created, and scheduled for {cron_expression}')
+        try:
+            if attach_rule_data:
+                json_body = json.loads(lambda_json_input.get('body'))
+                json_body.update({'cron_rule_name': rule_name, 'statement_id': statement_id})
+                lambda_json_input['body'] = json.dumps(json_body)
+
+            self._call('events', 'put_targets', Rule=rule_name, Targets=[{
+                'Id': rule_name,
+                'Arn': self.function_arn(lambda_function),
+                'Input': json.dumps(lambda_json_input)
+            }])
+            logger.info(f'Target for rule {rule_name} added')
+
+            self._call('lambda', 'add_permission', FunctionName=lambda_function, StatementId=statement_id,
+                       Action='lambda:InvokeFunction', SourceArn=rule_arn, Principal='events.amazonaws.com')
+            logger.info(f'Permission with id {statement_id} added for rule {rule_name}')
+        except Exception:
+            try:
+                self.delete_rule(rule_name)
+            except Exception:
+                logger.exception(f'Failed to delete partly created rule {rule_name}')
+            raise
+        return rule_name, statement_id
+
+    def delete_rule(self, rule_name, statement_id=None, function_name=None):
+        """
+        Delete a rule with all its targets, and the lambda permission if given; missing resources are ignored
+        """
+        target_ids = [it['Id'] for it in self.list_targets(rule_name)]
+        for i in range(0, len(target_ids), REMOVE_TARGETS_MAX_IDS):
+            self._call('events', 'remove_targets', Rule=rule_name, Ids=target_ids[i:i + REMOVE_TARGETS_MAX_IDS],
+                       Force=True)
+        self._call_ignoring_missing('events', 'delete_rule', Name=rule_name, Force=True)
+        logger.info(f'Rule {rule_name} deleted')
+
+        if statement_id and function_name:
+            self._call_ignoring_missing('lambda', 'remove_permission', FunctionName=function_name,
+                                        StatementId=statement_id)
+            logger.info(f'Permission {statement_id} deleted')
+
+    def list_targets(self, rule_name) -> list:
+        """
+        :return: all targets of a rule, following NextToken; empty if the rule does not exist
+        """
+        targets = []
+        kwargs = {'Rule': rule_name}
+        while True:
+            response = self._call_ignoring_missing('events', 'list_targets_by_rule', **kwargs) or {}
+            targets.extend(response.get('Targets', []))
+            if not response.get('NextToken'):
+                return targets
+            kwargs['NextToken'] = response['NextToken']
+
+    def list_rules(self, prefix=RULE_PREFIX):
+        """
+        :return: generator of the rules with a name prefix, following NextToken
+        """
+        kwargs = {'NamePrefix': prefix}
+        while True:
+            response = self._call('events', 'list_rules', **kwargs)
+            yield from response.get('Rules', [])
+            if not response.get('NextToken'):
+                return
+            kwargs['NextToken'] = response['NextToken']
+
+    def create_rules(self, rules) -> list:
+        """
+        :param rules: iterable of dicts of create_rule arguments
+        :return: list of CronRuleResult
+        """
+        def create(rule):
+            rule_name, statement_id = self.create_rule(**rule)
+            return rule_name, [statement_id]
+
+        return self._run_all(create, rules)
+
+    def delete_rules(self, rules) -> list:
+        """
+        :param rules: iterable of dicts of delete_rule arguments (rule_name, statement_id, function_name)
+        :return: list of CronRuleResult
+        """
+        def delete(rule):
+            self.delete_rule(**rule)
+            return rule['rule_name'], [rule['statement_id']] if rule.get('statement_id') else []
+
+        return self._run_all(delete, rules)
+
+    def sweep(self, is_orphan, prefix=RULE_PREFIX, dry_run=False) -> list:
+        """
+        Delete the orphaned rules with a name prefix, with the permissions of their lambda targets
+
+        Permissions are found in the resource policy of each target function, by the rule arn in their source arn
+        condition, so sweeping does not need the statement ids.
+
+        :param is_orphan: callable (rule dict of list_rules) returning True for a rule to delete, e.g. a rule no
+            longer referenced by any event
+        :param prefix: rule name prefix
+        :param dry_run: only report the orphaned rules and the statement ids that would be removed
+        :return: list of CronRuleResult, one per orphaned rule
+        """
+        def delete(rule):
+            rule_name = rule['Name']
+            permissions = [(target['Arn'], statement_id)
+                           for target in self.list_targets(rule_name) if ':lambda:' in target['Arn']
+                           for statement_id in self._statement_ids(target['Arn'], rule['Arn'])]
+            if not dry_run:
+                self.delete_rule(rule_name)
+                for function_arn, statement_id in permissions:
+                    self._call_ignoring_missing('lambda', 'remove_permission', FunctionName=function_arn,
+                                                StatementId=statement_id)
+            return rule_name, [it[1] for it in permissions]
+
+        # listed before deleting, deleting rules while paging through them would skip some
+        orphans = [it for it in self.list_rules(prefix) if is_orphan(it)]
+        return self._run_all(delete, orphans)
+
+    def _statement_ids(self, function_arn, rule_arn) -> list:
+        response = self._call_ignoring_missing('lambda', 'get_policy', FunctionName=function_arn)
+        if not response:
+            return []
+        statements = json.loads(response['Policy']).get('Statement', [])
+        return [it['Sid'] for it in statements
+                if it.get('Condition', {}).get('ArnLike', {}).get('AWS:SourceArn') == rule_arn]
+
+    def _run_all(self, operation, rules) -> list:
+        def run(rule):
+            try:
+                rule_name, statement_ids = operation(rule)
+                return CronRuleResult(rule_name, statement_ids, None)
+            except Exception as e:
+                rule_name = rule.get('rule_name') or rule.get('Name')
+                logger.exception(f'Failed to process rule {rule_name}')
+                return CronRuleResult(rule_name, [], e)
+
+        with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='ie-utils-cron-rules') as executor:
+            return list(executor.map(run, rules))
+
+    def _call(self, service_name, operation_name, **kwargs):
+        operation = getattr(self._get_client(service_name), operation_name)
+        for attempt in range(self._max_attempts):
+            try:
+                response = operation(**kwargs)
+            except ClientError as e:
+                if error_code(e) not in CONFLICT_ERROR_CODES or attempt + 1 == self._max_attempts:
+                    raise
+                time.sleep(self._backoff.throttled())
+                continue
+            self._backoff.succeeded()
+            return response
+
+    def _call_ignoring_missing(self, service_name, operation_name, **kwargs):
+        try:
+            return self._call(service_name, operation_name, **kwargs)
+        except ClientError as e:
+            if error_code(e) not in NOT_FOUND_ERROR_CODES:
+                raise
+            return None
@@ -0,0 +1,769 @@
+import datetime
+import functools
+import json
+import os
+from collections.abc import Mapping
+
+from botocore.exceptions import ClientError
+
+from ie_utils.call_logging import DEFAULT_MAX_PAYLOAD_SIZE, LazyPayload, log_calls
+from ie_utils.constants import DYNAMO_DB_CONFIG_VAR_NAME
+from ie_utils.dynamodb_batch import (BulkWriteResult, batch_get_items, batch_write_items, key_id, put_if_absent,
+                                     put_items_if_absent, unique_keys)
+from ie_utils.dynamodb_planner import QUERY, QueryPlan, QueryPlanner
+from ie_utils.dynamodb_scan import TableScanner, paginate, projection_arguments
+from ie_utils.event_session import EventSession
+from ie_utils.export import DEFAULT_TOTAL_SEGMENTS as DEFAULT_EXPORT_SEGMENTS, TableExporter
+from ie_utils.item_cache import ItemCache
+from ie_utils.log_buffer import DEFAULT_MAX_WRITE_BYTES, BufferedLogWriter
+from ie_utils.log_store import DEFAULT_TABLE_FORMAT as DEFAULT_LOG_TABLE_FORMAT, LogStore, sequence_before
+from ie_utils.logging_utils import capture_exception, flush_exceptions, flush_logging, get_logger
+from ie_utils.registry import aws_registry, parse_config
+from ie_utils.s3 import S3Utils
+from ie_utils.s3_transfer import MB
+from ie_utils.seen_filter import SeenKeyFilter
+
+
+class DynamoDBUtils:
+    """
+    Util cass for aws dynamo db operations
+    """
+    DYNAMO_DB_RESOURCE_NAME = 'dynamodb'
+    _log_writer = None
+    _item_cache = None
+    _log_store = None
+    _seen_filter = None
+    query_planner = QueryPlanner(lambda table_name: DynamoDBUtils.describe_table(table_name))
+
+    @staticmethod
+    def log_wrapper(class_instance, fn_name, table_name, table_key, **options):
+        """
+        Replace a method of an instance with a wrapper logging its requests and responses, see logged for options
+
+        Payloads keep the format of earlier versions (payload_format='repr'), and a failing call only logs its request
+        entry (log_errors=False), unless options say otherwise.
+        """
+        func = getattr(class_instance, fn_name)
+        options.setdefault('payload_format', 'repr')
+        options.setdefault('log_errors', False)
+        setattr(class_instance, fn_name, DynamoDBUtils.logged(table_name, table_key, **options)(func))
+
+    @staticmethod
+    def logged(table_name, table_key, sample_rate=1.0, max_payload_size=DEFAULT_MAX_PAYLOAD_SIZE, log_result=True,
+               log_errors=True, payload_format='json'):
+        """
+        Decorator for functions and methods, logs a request and a response entry per call
+
+        Logging is synchronous: every logged call makes two update_item calls, unless enable_log_buffering was
+        called, in which case the caller only queues two entries and their payloads are serialized by the writer
+        thread.
+
+        :param table_name: dynamo db table name
+        :param table_key: identifier of the logged item, or callable (*args, **kwargs) returning it
+        :param sample_rate: fraction of calls logged, 0 to 1
+        :param max_payload_size: max number of characters of a logged payload, None (default) for no limit
+        :param log_result: log the result in the response entry
+        :param log_errors: log exceptions of every call, sampled or not
+        :param payload_format: 'json', or 'repr' for the str of the payload dict used by log_wrapper
+        :return: decorator
+        """
+
+        def decorator(func):
+            return log_calls(func, lambda *args: DynamoDBUtils.log(*args), table_name, table_key,
+                             sample_rate=sample_rate, max_payload_size=max_payload_size, log_result=log_result,
+                             log_errors=log_errors, payload_format=payload_format)
+
+        return decorator
+
+    @staticmethod
+    def log(table_name, table_key, description, log_object):
+        if not (table_name and table_key and log_object):
+            get_logger().error(
+                f'Database logging impossible due to None value, '
+                f'table name: {table_name}, table key: {table_key}, log_object: {log_object}'
+            )
+            return
+
+        try:
+            entry = {
+                'datetime': str(datetime.datetime.now()),
+                'description': description,
+                'log_object': log_object
+            }
+            log_writer = DynamoDBUtils._log_writer
+            if log_writer:
+                # lazy payloads are rendered by the writer thread, in append_log_entries
+                if not isinstance(log_object, LazyPayload):
+                    entry['log_object'] = str(log_object)
+                log_writer.enqueue(table_name, table_key, entry)
+            else:
+                DynamoDBUtils.append_log_entries(table_name, table_key, [entry])
+        except Exception as e:
+            get_logger().exception(f'Error logging event {description} to db, log object: {log_object}')
+            capture_exception(e)
+
+    @staticmethod
+    def append_log_entries(table_name, table_key, entries):
+        """
+        Append log entries to the log_messages list of an item in a single update, or to the log store if enabled
+
+        :param table_name: dynamo db table name
+        :param table_key: identifier of the logged item
+        :param entries: list of log entries
+        :return:
+        """
+        entries = [dict(entry, log_object=str(entry['log_object'])) if not isinstance(entry['log_object'], str)
+                   else entry for entry in entries]
+        log_store = DynamoDBUtils._log_store
+        if log_store:
+            log_store.append(table_name, table_key, entries)
+            return
+        DynamoDBUtils.update_item(
+            table_name,
+            **{
+                'Key': {'identifier': table_key},
+                'UpdateExpression':
+                    "SET log_messages = list_append(if_not_exists(log_messages, :empty_list), :add_value)",
+                'ExpressionAttributeValues': {
+                    ':empty_list': [],
+                    ':add_value': entries
+                }
+            }
+        )
+
+    @staticmethod
+    def enable_log_store(table_format=DEFAULT_LOG_TABLE_FORMAT):
+        """
+        Store log entries as separate items of a log table instead of the log_messages list of the logged item
+
+        The log table has 'identifier' (string) as hash key and 'sequence' (string) as range key. Appends cost the same
+        whatever the size of the log, and long logs do not hit the item size limit.
+
+        :param table_format: log table name, formatted with the name of the logged item's table
+        :return:
+        """
+        DynamoDBUtils._log_store = LogStore(lambda name: DynamoDBUtils.get_table(name),
+                                            lambda: DynamoDBUtils.get_resource(), table_format=table_format)
+
+    @staticmethod
+    def disable_log_store():
+        DynamoDBUtils._log_store = None
+
+    @staticmethod
+    def read_log(table_name, table_key, include_archived=False, page_size=None) -> list:
+        """
+        Rebuild the log of an item: entries of its log_messages list followed by entries of the log store
+
+        :param table_name: dynamo db table name of the logged item
+        :param table_key: identifier of the logged item
+        :param include_archived: replace archive entries by the entries they archived, read from s3
+        :param page_size: max number of log store entries per query
+        :return: list of log entries in log order
+        """
+        item = DynamoDBUtils.get_table(table_name).get_item(
+            Key={'identifier': table_key},
+            ProjectionExpression='log_messages'
+        ).get('Item') or {}
+        entries = list(item.get('log_messages', []))
+
+        log_store = DynamoDBUtils._log_store
+        if log_store:
+            get_archive = DynamoDBUtils._get_log_archive if include_archived else None
+            entries.extend(log_store.read(table_name, table_key, page_size=page_size, get_archive=get_archive))
+        return entries
+
+    @staticmethod
+    def compact_log(table_name, table_key, bucket_name, older_than=0, file_key=None) -> dict:
+        """
+        Archive log store entries older than older_than seconds to s3 as NDJSON, replaced by one archive entry
+
+        :param table_name: dynamo db table name of the logged item
+        :param table_key: identifier of the logged item
+        :param bucket_name: archive bucket
+        :param older_than: min age of archived entries in seconds
+        :param file_key: archive object key, defaults to <log table>/<table key>/<first>_<last>.ndjson
+        :return: dict with archived (number of entries), bucket_name and file_key
+        """
+        if not DynamoDBUtils._log_store:
+            raise ValueError('Log store is not enabled, call DynamoDBUtils.enable_log_store first')
+        return DynamoDBUtils._log_store.compact(table_name, table_key, S3Utils.put_object, bucket_name,
+                                                before=sequence_before(older_than), file_key=file_key)
+
+    @staticmethod
+    def _get_log_archive(bucket_name, file_key) -> bytes:
+        return S3Utils.get_object(bucket_name, file_key).get()['Body'].read()
+
+    @staticmethod
+    def enable_log_buffering(max_batch_size=100, flush_interval=1.0, max_queue_size=10000,
+                             max_write_bytes=DEFAULT_MAX_WRITE_BYTES):
+        """
+        Buffer log calls and write them from a background thread, one update per table key and flush
+
+        Pending entries are written on size, on time, on flush_logs() and on interpreter exit. Lambda handlers should
+        be decorated with flush_logs_after, since a frozen lambda container does not run the background thread.
+
+        :param max_batch_size: number of pending entries that triggers a flush
+        :param flush_interval: max number of seconds an entry stays pending
+        :param max_queue_size: max number of queued entries, log calls block while the queue is full
+        :param max_write_bytes: max approximate size of the entries appended by one update
+        :return:
+        """
+        DynamoDBUtils.disable_log_buffering()
+        DynamoDBUtils._log_writer = BufferedLogWriter(
+            DynamoDBUtils.append_log_entries,
+            error_handler=DynamoDBUtils._log_entries_failed,
+            max_batch_size=max_batch_size,
+            flush_interval=flush_interval,
+            max_queue_size=max_queue_size,
+            max_write_bytes=max_write_bytes
+        )
+
+    @staticmethod
+    def disable_log_buffering():
+        """
+        Write pending log entries and go back to one synchronous update per log call
+        """
+        log_writer, DynamoDBUtils._log_writer = DynamoDBUtils._log_writer, None
+        if log_writer:
+            log_writer.close()
+
+    @staticmethod
+    def flush_logs(timeout=None) -> bool:
+        """
+        Write all buffered log entries
+
+        :param timeout: max number of seconds to wait
+        :return: True if all entries were written, False on timeout
+        """
+        log_writer = DynamoDBUtils._log_writer
+        return log_writer.flush(timeout) if log_writer else True
+
+    @staticmethod
+    def flush_logs_after(handler):
+        """
+        Decorator for lambda handlers, flushes buffered log entries, reported exceptions and log records when the
+        handler returns or raises
+        """
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                DynamoDBUtils.flush_logs()
+                flush_exceptions()
+                flush_logging()
+
+        return wrapper
+
+    @staticmethod
+    def _log_entries_failed(exc, table_name, table_key, entries):
+        get_logger().exception(f'Error logging {len(entries)} events to db, table key: {table_key}, '
+                               f'descriptions: {[entry["description"] for entry in entries]}')
+        capture_exception(exc)
+
+    @staticmethod
+    def update_event(**kwargs):
+        DynamoDBUtils.update_item(
+            kwargs.get('table_name'),
+            **{
+                'Key': {'identifier': kwargs.get('table_key')},
+                'UpdateExpression':
+                    "SET message = :errorMessage, #st = :eventStatus, processed_at = :ts",
+                'ExpressionAttributeValues': {
+                    ':errorMessage': kwargs.get('errorMessage') if 'errorMessage' in kwargs else None,
+                    ':eventStatus': kwargs.get('status') if 'status' in kwargs else None,
+                    ':ts': str(datetime.datetime.now())
+                },
+                'ExpressionAttributeNames': {"#st": "status"}
+            }
+        )
+
+    @staticmethod
+    def update_item(table_name, **kwargs):
+        table = DynamoDBUtils.get_table(table_name)
+        table.update_item(**kwargs)
+        DynamoDBUtils._item_cache and DynamoDBUtils._item_cache.invalidate(table_name, kwargs.get('Key'))
+
+    @staticmethod
+    def event_session(table_name, table_key) -> EventSession:
+        """
+        Session collecting the status, message and log entries of an event, written in one update on exit of the
+        with block or on commit, instead of one update per update_event and log call
+
+        with DynamoDBUtils.event_session(table_name, table_key) as session:
+            session.log('received', event)
+            session.set_status('PROCESSED', 'ok')
+
+        :param table_name: dynamo db table name
+        :param table_key: identifier of the event item
+        :return: EventSession; log entries go to the log store if enabled
+        """
+        log_store = DynamoDBUtils._log_store
+        append_log_entries = functools.partial(log_store.append, table_name, table_key) if log_store else None
+        return EventSession(DynamoDBUtils.update_item, table_name, table_key, append_log_entries=append_log_entries)
+
+    @staticmethod
+    def enable_item_cache(ttl=60, max_items=1000, negative_ttl=None, table_ttls=None):
+        """
+        Cache items read by get_item_by_search_key and record_exists in process, across warm lambda invocations
+
+        put_item, put_items, update_item (and so update_event and log) invalidate the items they write. Writes made by
+        other processes are seen only once cached items expire.
+
+        :param ttl: seconds an item stays cached
+        :param max_items: max number of cached items per table, least recently used items are evicted first
+        :param negative_ttl: seconds a missing item stays cached, defaults to ttl
+        :param table_ttls: dict of table name -> ttl, overriding ttl
+        :return:
+        """
+        DynamoDBUtils._item_cache = ItemCache(ttl=ttl, max_items=max_items, negative_ttl=negative_ttl,
+                                              table_ttls=table_ttls)
+
+    @staticmethod
+    def disable_item_cache():
+        DynamoDBUtils._item_cache = None
+
+    @staticmethod
+    def item_cache_stats() -> dict:
+        """
+        :return: dict with hits, misses, expirations, evictions and invalidations counters of the item cache
+        """
+        return dict(DynamoDBUtils._item_cache.stats) if DynamoDBUtils._item_cache else {}
+
+    @staticmethod
+    def get_table(table_name):
+        """
+        Fetch dynamo db table based on table name
+
+        :param table_name:
+        :return:
+        """
+        return aws_registry.get_table(table_name, **DynamoDBUtils.get_config())
+
+    @staticmethod
+    def get_resource():
+        """
+        Fetch dynamo db service resource, e.g. for batch operations
+
+        :return:
+        """
+        return aws_registry.get_resource(DynamoDBUtils.DYNAMO_DB_RESOURCE_NAME, **DynamoDBUtils.get_config())
+
+    @staticmethod
+    def get_config() -> dict:
+        """
+        Dynamo db boto3 configuration, read from the environment
+
+        :return: keyword arguments for boto3 dynamo db client/resource creation
+        """
+        return parse_config(os.getenv(DYNAMO_DB_CONFIG_VAR_NAME))
+
+    @staticmethod
+    def deserialize_to_python_data(dynamo_db_dict: dict) -> dict:
+        return _codec().deserializer.deserialize_item(dynamo_db_dict)
+
+    @staticmethod
+    def serialize_python_data(python_data: dict) -> dict:
+        return _codec().serializer.serialize_item(python_data)
+
+    @staticmethod
+    def deserialize_items(dynamo_db_items, use_decimal=True, attributes=None) -> list:
+        """
+        Convert a list of dynamo db wire format items (e.g. a scan page of a low level client) to python data
+
+        :param dynamo_db_items: list of wire format items
+        :param use_decimal: numbers as Decimal if True, as int/float otherwise
+        :param attributes: only decode these attributes, all if None
+        :return: list of dicts
+        """
+        deserializer = _codec().deserializer if use_decimal else _codec().native_deserializer
+        return deserializer.deserialize_items(dynamo_db_items, attributes)
+
+    @staticmethod
+    def serialize_items(python_items, allow_float=False) -> list:
+        """
+        Convert a list of python dicts to dynamo db wire format
+
+        :param python_items: list of dicts
+        :param allow_float: accept float values, rejected like boto3 does if False
+        :return: list of wire format items
+        """
+        serializer = _codec().float_serializer if allow_float else _codec().serializer
+        return serializer.serialize_items(python_items)
+
+    @staticmethod
+    def deserialize_stream_records(records, use_decimal=True) -> list:
+        """
+        Decode Keys, NewImage and OldImage of a batch of dynamo db stream records
+
+        :param records: 'Records' of a dynamo db stream lambda event
+        :param use_decimal: numbers as Decimal if True, as int/float otherwise
+        :return: list of records
+        """
+        deserializer = _codec().deserializer if use_decimal else _codec().native_deserializer
+        return deserializer.deserialize_stream_records(records)
+
+    @staticmethod
+    def lazy_python_data(dynamo_db_dict: dict, use_decimal=True) -> Mapping:
+        """
+        Read only mapping over a wire format item, decoding only the attributes that are accessed
+
+        :param dynamo_db_dict: wire format item
+        :param use_decimal: numbers as Decimal if True, as int/float otherwise
+        :return: LazyItem
+        """
+        deserializer = _codec().deserializer if use_decimal else _codec().native_deserializer
+        return deserializer.lazy_item(dynamo_db_dict)
+
+    @staticmethod
+    def record_exists(table_name, search_key) -> bool:
+        """
+        Checks is a record already exists in dynamo db
+
+        :param table_name: dynamo db table name
+        :param search_key: key to search by
+        :return: True, if event is present in dynamo db, False otherwise
+        """
+        if DynamoDBUtils._item_cache:
+            return DynamoDBUtils.get_item_by_search_key(table_name, search_key) is not None
+
+        table = DynamoDBUtils.get_table(table_name)
+        item = table.get_item(Key=search_key) if table else None
+        return item is not None and 'Item' in item
+
+    @staticmethod
+    def records_exist(table_name, search_keys) -> dict:
+        """
+        Checks which of the given records exist in dynamo db
+
+        :param table_name: dynamo db table name
+        :param search_keys: list of keys to search by
+        :return: dict of DynamoDBUtils.key_id(search_key) -> True if the record exists, False otherwise
+        """
+        search_keys = unique_keys(search_keys)
+        projection = list(search_keys[0]) if search_keys else None
+        items = DynamoDBUtils.get_items_by_keys(table_name, search_keys, projection=projection)
+        return {k: item is not None for k, item in items.items()}
+
+    @staticmethod
+    def get_items_by_keys(table_name, search_keys, projection=None, consistent_read=False, max_workers=4) -> dict:
+        """
+        Get items from dynamo db by a list of keys, with BatchGetItem requests of up to 100 keys run concurrently
+
+        A single key is fetched with a plain GetItem.
+
+        :param table_name: dynamo db table name
+        :param search_keys: list of keys to search by, all with the same attribute names
+        :param projection: list of attribute names to return
+        :param consistent_read: use strongly consistent reads
+        :param max_workers: max number of concurrent BatchGetItem requests
+        :return: dict of DynamoDBUtils.key_id(search_key) -> item, None for missing items, in input order
+        """
+        search_keys = unique_keys(search_keys)
+        if len(search_keys) == 1:
+            search_key = search_keys[0]
+            get_item_kwargs = {'Key': search_key}
+            if projection:
+                get_item_kwargs.update(projection_arguments(projection))
+            if consistent_read:
+                get_item_kwargs['ConsistentRead'] = True
+            item = DynamoDBUtils.get_table(table_name).get_item(**get_item_kwargs)
+            return {key_id(search_key): item.get('Item')}
+
+        return batch_get_items(DynamoDBUtils.get_resource, table_name, search_keys, projection=projection,
+                               consistent_read=consistent_read, max_workers=max_workers)
+
+    @staticmethod
+    def key_id(search_key) -> tuple:
+        """
+        Hashable identity of a key, used to key the results of bulk operations
+
+        :param search_key: key dict, e.g. {'identifier': 'id'}
+        :return: tuple of sorted (attribute name, value) pairs
+        """
+        return key_id(search_key)
+
+    @staticmethod
+    def put_item(table_name, entry_data):
+        """
+        Put entry_data into dynamo db table with a given name
+
+        :param table_name:
+        :param entry_data:
+        :return:
+        """
+        table = DynamoDBUtils.get_table(table_name)
+        table and table.put_item(Item=entry_data)
+        DynamoDBUtils._item_cache and DynamoDBUtils._item_cache.invalidate_item(table_name, entry_data)
+
+    @staticmethod
+    def put_items(table_name, entries, key_names=None, writers=1) -> BulkWriteResult:
+        """
+        Put a stream of entries into dynamo db table with a given name, in BatchWriteItem requests of 25 items
+
+        Entries with the same primary key inside a batch are deduplicated (last one wins), unprocessed items are retried
+        with backoff, throttled requests by botocore or throttle_control. Memory use does not depend on the length of
+        the stream.
+
+        :param table_name: dynamo db table name
+        :param entries: iterable (e.g. generator) of entries
+        :param key_names: primary key attribute names, read from the table description if None
+        :param writers: number of concurrent writer threads
+        :return: BulkWriteResult with written, duplicates, batches, throttle_events (throttled responses and responses
+            with unprocessed items) and elapsed seconds
+        """
+        key_names = DynamoDBUtils._key_names(table_name, key_names)
+        try:
+            return batch_write_items(DynamoDBUtils.get_resource, table_name, entries, key_names, writers=writers)
+        finally:
+            DynamoDBUtils._item_cache and DynamoDBUtils._item_cache.invalidate(table_name)
+
+    @staticmethod
+    def put_if_absent(table_name, entry_data, key_names=None) -> bool:
+        """
+        Put entry_data unless an item with its primary key exists, in one conditional request
+
+        Replaces record_exists followed by put_item: one round trip, and of concurrent writers of the same key only one
+        succeeds. With the seen key filter enabled (see enable_seen_filter), keys written or found recently by this
+        process are rejected without a request.
+
+        :param table_name: dynamo db table name
+        :param entry_data: item to put
+        :param key_names: primary key attribute names, read from the table description if None
+        :return: True if the item was written, False if its key already existed
+        """
+        key_names = DynamoDBUtils._key_names(table_name, key_names)
+        key = {it: entry_data[it] for it in key_names}
+        seen_filter = DynamoDBUtils._seen_filter
+        if seen_filter and seen_filter.seen(table_name, key):
+            return False
+        written = put_if_absent(DynamoDBUtils.get_table(table_name), entry_data, key_names)
+        seen_filter and seen_filter.add(table_name, key)
+        written and DynamoDBUtils._item_cache and DynamoDBUtils._item_cache.invalidate(table_name, key)
+        return written
+
+    @staticmethod
+    def put_items_if_absent(table_name, entries, key_names=None, max_workers=8) -> dict:
+        """
+        Bulk put_if_absent, with concurrent conditional requests
+
+        :param table_name: dynamo db table name
+        :param entries: list of items, an item whose key comes again later is only written once
+        :param key_names: primary key attribute names, read from the table description if None
+        :param max_workers: max number of concurrent requests
+        :return: dict of DynamoDBUtils.key_id(key) -> True if the item was written, False otherwise, in input order
+        """
+        key_names = DynamoDBUtils._key_names(table_name, key_names)
+        try:
+            return put_items_if_absent(DynamoDBUtils.get_table, table_name, entries, key_names,
+                                       max_workers=max_workers, seen_filter=DynamoDBUtils._seen_filter)
+        finally:
+            DynamoDBUtils._item_cache and DynamoDBUtils._item_cache.invalidate(table_name)
+
+    @staticmethod
+    def enable_seen_filter(capacity=100000, error_rate=0.001, ttl=None):
+        """
+        Remember the keys put_if_absent wrote or found in process, to reject replays without a dynamo db call
+
+        The filter is probabilistic: a new key is wrongly rejected with probability at most error_rate, and memory
+        stays bounded (about 4 bytes per key of capacity at 0.001). Keys written by other processes are still
+        caught by the condition of the put.
+
+        :param capacity: number of recent keys remembered at least
+        :param error_rate: max probability of rejecting a new key
+        :param ttl: seconds after which keys may be forgotten, None to only forget on capacity
+        :return:
+        """
+        DynamoDBUtils._seen_filter = SeenKeyFilter(capacity=capacity, error_rate=error_rate, ttl=ttl)
+
+    @staticmethod
+    def disable_seen_filter():
+        DynamoDBUtils._seen_filter = None
+
+    @staticmethod
+    def _key_names(table_name, key_names) -> list:
+        if key_names is not None:
+            return list(key_names)
+        schema = DynamoDBUtils.query_planner.get_schema(table_name)
+        if schema is None:
+            raise ValueError(f'Key names of table {table_name} unknown, pass key_names')
+        return schema.key_names
+
+    @staticmethod
+    def get_items_by_search_attr(table_name, key, value, total_segments=None):
+        """
+        Get all items with a given attribute value
+
+        Uses a Query when the attribute is the partition key of the table or of an index holding every item (see
+        explain_search), and falls back to scanning every page of the table otherwise.
+
+        :param table_name: dynamo db table name
+        :param key: attribute name
+        :param value: attribute value
+        :param total_segments: number of segments to scan in parallel when scanning, sequential scan if None
+        :return: list of items
+        """
+        from boto3.dynamodb.conditions import Attr, Key
+
+        query_plan = DynamoDBUtils.explain_search(table_name, key, value)
+        if query_plan.operation == QUERY:
+            return list(DynamoDBUtils.query_items(table_name, index_name=query_plan.index_name,
+                                                  KeyConditionExpression=Key(key).eq(value)))
+        get_logger().debug(f'Scanning table {table_name} for {key}: {query_plan.reason}')
+        return list(DynamoDBUtils.scan_items(table_name, total_segments=total_segments,
+                                             FilterExpression=Attr(key).eq(value)))
+
+    @staticmethod
+    def explain_search(table_name, key, value) -> QueryPlan:
+        """
+        Plan used by get_items_by_search_attr for a lookup, counted in DynamoDBUtils.query_planner.stats
+
+        :param table_name: dynamo db table name
+        :param key: attribute name
+        :param value: attribute value
+        :return: QueryPlan with operation 'query' or 'scan', the index to query and the reason of the choice
+        """
+        return DynamoDBUtils.query_planner.plan(table_name, key, value)
+
+    @staticmethod
+    def describe_table(table_name) -> dict:
+        """
+        Table description (key schema, attribute definitions, indexes)
+
+        :param table_name: dynamo db table name
+        :return: 'Table' part of the describe_table response
+        """
+        table = DynamoDBUtils.get_table(table_name)
+        return table.meta.client.describe_table(TableName=table_name)['Table']
+
+    @staticmethod
+    def query_items(table_name, index_name=None, **query_kwargs):
+        """
+        Query a table or index, following LastEvaluatedKey across pages
+
+        :param table_name: dynamo db table name
+        :param index_name: index to query, the table itself if None
+        :param query_kwargs: query arguments, e.g. KeyConditionExpression
+        :return: generator of items
+        """
+        if index_name:
+            query_kwargs['IndexName'] = index_name
+        for items, _ in paginate(DynamoDBUtils.get_table(table_name).query, **query_kwargs):
+            yield from items
+
+    @staticmethod
+    def scan_items(table_name, total_segments=None, max_workers=None, page_size=None, projection=None,
+                   max_items=None, cursor=None, **scan_kwargs) -> TableScanner:
+        """
+        Scan a table page by page, optionally in parallel segments
+
+        Iterating the returned scanner yields items as pages arrive; scanner.cursor can be saved (it is json
+        serializable, keys are in the dynamo db wire format with binary values as base64 text) and passed back
+        as cursor to resume the scan.
+
+        :param table_name: dynamo db table name
+        :param total_segments: number of segments to scan in parallel, sequential scan if None
+        :param max_workers: max number of threads scanning segments
+        :param page_size: max number of items evaluated per scan request
+        :param projection: list of attribute names to return
+        :param max_items: stop after this many items
+        :param cursor: cursor of a previous scan to resume from
+        :param scan_kwargs: additional scan arguments, e.g. FilterExpression
+        :return: TableScanner
+        """
+        return TableScanner(lambda: DynamoDBUtils.get_table(table_name), total_segments=total_segments,
+                            max_workers=max_workers, page_size=page_size, projection=projection,
+                            max_items=max_items, cursor=cursor, encode_key=_codec().key_to_json,
+                            decode_key=_codec().key_from_json, **scan_kwargs)
+
+    @staticmethod
+    def export_table(table_name, bucket_name, prefix, total_segments=DEFAULT_EXPORT_SEGMENTS, max_workers=None,
+                     page_size=None, max_file_bytes=None, resume=True, float_numbers=False, **scan_kwargs) -> dict:
+        """
+        Export a table to gzipped NDJSON files in s3, streaming a parallel scan into multipart uploads
+
+        Integral numbers are written as json integers and other numbers as strings of their exact value (json floats
+        with float_numbers), sets become lists and binary data base64 strings. Every segment writes
+        <prefix>/segment-<segment>-<file>.ndjson.gz files, rolled at max_file_bytes. The checkpoint of every segment
+        is stored as <prefix>/_checkpoint.json after every file, so an interrupted export called again with
+        resume=True continues where it stopped, and a finished one does nothing.
+
+        With resume=False the files of a previous export under the same prefix are not deleted: those of segments and
+        file numbers written again are replaced, the others stay. Export to a new prefix, or delete the old files
+        first, when the previous export had more segments or files.
+
+        :param table_name: dynamo db table name
+        :param bucket_name: destination bucket
+        :param prefix: prefix of the file keys
+        :param total_segments: number of parallel scan segments
+        :param max_workers: max number of segments exported at the same time, defaults to total_segments
+        :param page_size: max number of items evaluated per scan request
+        :param max_file_bytes: compressed size after which a segment starts a new file, one file per segment if None
+        :param resume: resume from the checkpoint of a previous export with the same prefix, start over if False
+        :param float_numbers: write non integral numbers as json floats, rounded, instead of exact strings
+        :param scan_kwargs: additional scan arguments, e.g. FilterExpression (low level client syntax)
+        :return: dict with rows, raw_bytes, bytes, files, elapsed, rows_per_second, raw_bytes_per_second and
+            max_rss_bytes, see TableExporter.run
+        """
+        client = aws_registry.get_client(DynamoDBUtils.DYNAMO_DB_RESOURCE_NAME, **DynamoDBUtils.get_config())
+        checkpoint_key = f'{prefix}/_checkpoint.json'
+        exporter = TableExporter(
+            functools.partial(client.scan, TableName=table_name),
+            lambda file_key, chunks: S3Utils.upload(bucket_name, file_key, chunks, ContentType='application/gzip'),
+            prefix,
+            total_segments=total_segments,
+            max_workers=max_workers,
+            page_size=page_size,
+            max_file_bytes=max_file_bytes,
+            deserialize_item=_codec().deserializer.deserialize_item,
+            float_numbers=float_numbers,
+            checkpoint=DynamoDBUtils._get_export_checkpoint(bucket_name, checkpoint_key) if resume else None,
+            save_checkpoint=lambda checkpoint: S3Utils.put_object(bucket_name, checkpoint_key,
+                                                                  json.dumps(checkpoint).encode('utf-8')),
+            **scan_kwargs
+        )
+        result = exporter.run()
+        get_logger().info(f'Exported {result["rows"]} items of table {table_name} to {len(result["files"])} files, '
+                          f'{result["rows_per_second"]:.0f} items/s, {result["raw_bytes_per_second"] / MB:.1f} MB/s, '
+                          f'peak rss {(result["max_rss_bytes"] or 0) / MB:.0f} MB')
+        return result
+
+    @staticmethod
+    def _get_export_checkpoint(bucket_name, file_key):
+        try:
+            return json.loads(S3Utils.get_object(bucket_name, file_key).get()['Body'].read())
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                raise
+            return None
+
+    @staticmethod
+    def get_item_by_search_key(table_name, search_key) -> dict:
+        """
+        Get item from dynamo db by search_key
+
+        :param table_name: dynamo db table name
+        :param search_key: key to search by
+        :return: Item, if event is present in dynamo db, None otherwise
+        """
+        item_cache = DynamoDBUtils._item_cache
+        if item_cache:
+            hit, item = item_cache.get(table_name, search_key)
+            if hit:
+                return item
+            version = item_cache.version(table_name)
+
+        table = DynamoDBUtils.get_table(table_name)
+        item = table.get_item(Key=search_key) if table else None
+        item = item['Item'] if 'Item' in item else None
+
+        if item_cache:
+            item_cache.put(table_name, search_key, item, version)
+        return item
+
+
+def _codec():
+    # the codec imports boto3, which takes a few hundred ms; it is loaded on first use
+    from ie_utils import dynamodb_codec
+    return dynamodb_codec
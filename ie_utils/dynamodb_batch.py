@@ -0,0 +1,279 @@
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from ie_utils.dynamodb_scan import projection_arguments
+from ie_utils.metrics import THROTTLING_ERROR_CODES
+from ie_utils.retry import AdaptiveBackoff, backoff_delay
+
+BATCH_GET_MAX_KEYS = 100
+BATCH_WRITE_MAX_ITEMS = 25
+DEFAULT_MAX_ATTEMPTS = 8
+
+BulkWriteResult = namedtuple('BulkWriteResult', ['written', 'duplicates', 'batches', 'throttle_events', 'elapsed'])
+
+# throttled responses of the current thread's request, botocore retries on the thread that sent the request
+_throttled = threading.local()
+
+
+class UnprocessedKeysError(Exception):
+    """
+    Raised when keys are still unprocessed after all batch get attempts
+    """
+
+    def __init__(self, table_name, keys):
+        super().__init__(f'{len(keys)} keys of table {table_name} unprocessed')
+        self.table_name = table_name
+        self.keys = keys
+
+
+class UnprocessedItemsError(Exception):
+    """
+    Raised when items are still unprocessed after all batch write attempts
+    """
+
+    def __init__(self, table_name, items):
+        super().__init__(f'{len(items)} items of table {table_name} unprocessed')
+        self.table_name = table_name
+        self.items = items
+
+
+def key_id(key) -> tuple:
+    """
+    Hashable identity of a dynamo db key
+
+    :param key: key dict, e.g. {'identifier': 'id'}
+    :return: tuple of sorted (attribute name, value) pairs
+    """
+    return tuple(sorted(key.items()))
+
+
+def unique_keys(keys) -> list:
+    """
+    Keys without duplicates, in input order
+    """
+    return list({key_id(key): key for key in keys}.values())
+
+
+def chunks(values, size):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def batch_get_items(get_resource, table_name, keys, projection=None, consistent_read=False, max_workers=4,
+                    max_attempts=DEFAULT_MAX_ATTEMPTS) -> dict:
+    """
+    Get items by key with BatchGetItem, in concurrent chunks of 100 keys
+
+    Unprocessed keys are retried with jittered exponential backoff.
+
+    :param get_resource: callable returning the dynamo db service resource, called from every worker thread
+    :param table_name: dynamo db table name
+    :param keys: list of unique key dicts, all with the same attribute names
+    :param projection: list of attribute names to return, key attributes are always returned
+    :param consistent_read: use strongly consistent reads
+    :param max_workers: max number of concurrent BatchGetItem requests
+    :param max_attempts: max number of requests per chunk
+    :return: dict of key_id(key) -> item, None for missing items, in input order
+    """
+    if not keys:
+        return {}
+    key_names = list(keys[0])
+    table_request = {'ConsistentRead': consistent_read}
+    if projection:
+        table_request.update(projection_arguments(list(projection) + [it for it in key_names if it not in projection]))
+
+    def get_chunk(chunk):
+        request_items = {table_name: dict(table_request, Keys=chunk)}
+        items = []
+        for attempt in range(max_attempts):
+            response = get_resource().batch_get_item(RequestItems=request_items)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            request_items = response.get('UnprocessedKeys')
+            if not request_items:
+                return items
+            if attempt + 1 < max_attempts:
+                time.sleep(backoff_delay(attempt))
+        raise UnprocessedKeysError(table_name, request_items[table_name]['Keys'])
+
+    results = {key_id(key): None for key in keys}
+    key_chunks = list(chunks(keys, BATCH_GET_MAX_KEYS))
+    if len(key_chunks) == 1:
+        chunk_items = [get_chunk(key_chunks[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(key_chunks))) as executor:
+            chunk_items = list(executor.map(get_chunk, key_chunks))
+
+    for items in chunk_items:
+        for item in items:
+            results[key_id({it: item[it] for it in key_names})] = item
+    return results
+
+
+def batch_write_items(get_resource, table_name, items, key_names, writers=1, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                      delete=False):
+    """
+    Put (or delete) a stream of items with BatchWriteItem requests of 25 items
+
+    Items with a primary key already present in the current batch replace the earlier item. Unprocessed items are
+    retried with an adaptive backoff shared by all writers. Throttled requests are retried by botocore, or by
+    throttle_control when enabled (see ie_utils.retry), not again here: a request still throttled after those retries
+    raises. At most 2 * writers batches are held in memory, whatever the length of the stream.
+
+    :param get_resource: callable returning the dynamo db service resource, called from every writer thread
+    :param table_name: dynamo db table name
+    :param items: iterable (e.g. generator) of items, or of keys when deleting
+    :param key_names: primary key attribute names
+    :param writers: number of writer threads, items are written from the calling thread if 1
+    :param max_attempts: max number of requests per batch
+    :param delete: send DeleteRequest for every key instead of PutRequest
+    :return: BulkWriteResult, throttle_events counts the throttled responses retried by botocore or throttle_control
+        and the responses with unprocessed items, other retries (5xx, connection errors) are not counted
+    """
+    request_type, request_field = ('DeleteRequest', 'Key') if delete else ('PutRequest', 'Item')
+    started_at = time.monotonic()
+    backoff = AdaptiveBackoff()
+    lock = threading.Lock()
+    counts = {'written': 0, 'duplicates': 0, 'batches': 0, 'throttle_events': 0}
+
+    def count(name, value=1):
+        with lock:
+            counts[name] += value
+
+    def write_batch(batch):
+        request_items = {table_name: [{request_type: {request_field: item}} for item in batch]}
+        for attempt in range(max_attempts):
+            resource = get_resource()
+            _watch_throttles(resource)
+            _throttled.count = 0
+            response = resource.batch_write_item(RequestItems=request_items)
+            count('throttle_events', _throttled.count)
+            unprocessed = response.get('UnprocessedItems')
+            if not unprocessed:
+                backoff.succeeded()
+                count('written', len(batch))
+                count('batches')
+                return
+            count('throttle_events')
+            count('written', len(batch) - len(unprocessed[table_name]))
+            batch = [it[request_type][request_field] for it in unprocessed[table_name]]
+            request_items = unprocessed
+            time.sleep(backoff.throttled())
+        raise UnprocessedItemsError(table_name, batch)
+
+    def batches():
+        batch = {}
+        for item in items:
+            item_key = key_id({it: item[it] for it in key_names})
+            if item_key in batch:
+                count('duplicates')
+            batch[item_key] = item
+            if len(batch) == BATCH_WRITE_MAX_ITEMS:
+                yield list(batch.values())
+                batch = {}
+        if batch:
+            yield list(batch.values())
+
+    if writers <= 1:
+        for batch in batches():
+            write_batch(batch)
+    else:
+        in_flight = threading.BoundedSemaphore(writers * 2)
+        futures = []
+        with ThreadPoolExecutor(max_workers=writers, thread_name_prefix='ie-utils-writer') as executor:
+            for batch in batches():
+                in_flight.acquire()
+                future = executor.submit(write_batch, batch)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures = [it for it in futures if not it.done() or it.exception()] + [future]
+                if any(it.done() and it.exception() for it in futures):
+                    break
+        for future in futures:
+            future.result()
+
+    return BulkWriteResult(elapsed=time.monotonic() - started_at, **counts)
+
+
+def _watch_throttles(resource):
+    # registering is a no-op once the handler is on the (shared) client
+    resource.meta.client.meta.events.register('needs-retry.dynamodb.BatchWriteItem', _count_throttle,
+                                              unique_id='ie-utils-batch-write-throttles')
+
+
+def _count_throttle(response=None, **kwargs):
+    if response is not None and response[1].get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+        _throttled.count = getattr(_throttled, 'count', 0) + 1
+
+
+def batch_delete_keys(get_resource, table_name, keys, key_names, writers=1, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Delete a stream of keys with BatchWriteItem requests of 25 keys, see batch_write_items
+
+    :return: BulkWriteResult, written is the number of deleted keys
+    """
+    return batch_write_items(get_resource, table_name, keys, key_names, writers=writers, max_attempts=max_attempts,
+                             delete=True)
+
+
+def put_if_absent(table, item, key_names) -> bool:
+    """
+    Put an item unless an item with its primary key exists, in a single conditional PutItem
+
+    :param table: dynamo db table resource
+    :param item: item to put
+    :param key_names: primary key attribute names
+    :return: True if the item was written, False if its key already existed
+    """
+    try:
+        table.put_item(Item=item, ConditionExpression='attribute_not_exists(#k)',
+                       ExpressionAttributeNames={'#k': key_names[0]})
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        return False
+    return True
+
+
+def put_items_if_absent(get_table, table_name, items, key_names, max_workers=8, seen_filter=None) -> dict:
+    """
+    Put items whose primary key does not exist yet, with concurrent conditional PutItem requests
+
+    BatchWriteItem does not support conditions, and a transaction would fail as a whole on the first existing key.
+    An item whose key comes again later in items is only written once.
+
+    :param get_table: callable (table_name) returning the table resource, called from every worker thread
+    :param table_name: dynamo db table name
+    :param items: list of items
+    :param key_names: primary key attribute names
+    :param max_workers: max number of concurrent requests
+    :param seen_filter: SeenKeyFilter, keys it has seen are reported as existing without a request
+    :return: dict of key_id(key) -> True if the item was written, False otherwise, in input order
+    """
+    results = {}
+    pending = []
+    for item in items:
+        key = {it: item[it] for it in key_names}
+        item_key = key_id(key)
+        if item_key in results:
+            continue
+        if seen_filter and seen_filter.seen(table_name, key):
+            results[item_key] = False
+            continue
+        results[item_key] = None
+        pending.append((item_key, key, item))
+
+    def put(args):
+        item_key, key, item = args
+        written = put_if_absent(get_table(table_name), item, key_names)
+        seen_filter and seen_filter.add(table_name, key)
+        return item_key, written
+
+    if len(pending) <= 1:
+        results.update(map(put, pending))
+        return results
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pending)), thread_name_prefix='ie-utils-put') as executor:
+        results.update(executor.map(put, pending))
+    return results
@@ -0,0 +1,197 @@
+import base64
+from collections.abc import Mapping
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary, DYNAMODB_CONTEXT, TypeSerializer
+
+_MAX_EXACT_INT = 10 ** 38
+
+
+def _to_native_number(value):
+    if '.' in value or 'e' in value or 'E' in value:
+        return float(value)
+    return int(value)
+
+
+class ItemDeserializer:
+    """
+    Converts dynamo db wire format items to python data, with a dispatch table per type tag
+
+    Produces the same values as boto3's TypeDeserializer, unless use_decimal is False, in which case numbers become
+    int (integral values) or float instead of Decimal.
+    """
+
+    def __init__(self, use_decimal=True):
+        number = DYNAMODB_CONTEXT.create_decimal if use_decimal else _to_native_number
+        value = self.deserialize_value
+        self._dispatch = {
+            'S': str,
+            'N': number,
+            'B': Binary,
+            'BOOL': bool,
+            'NULL': lambda _: None,
+            'SS': set,
+            'NS': lambda data: set(map(number, data)),
+            'BS': lambda data: set(map(Binary, data)),
+            'L': lambda data: [value(it) for it in data],
+            'M': lambda data: {k: value(v) for k, v in data.items()},
+        }
+
+    def deserialize_value(self, value):
+        (type_tag, data), = value.items()
+        try:
+            deserialize = self._dispatch[type_tag]
+        except KeyError:
+            raise TypeError(f'Dynamodb type {type_tag} is not supported')
+        return deserialize(data)
+
+    def deserialize_item(self, item, attributes=None) -> dict:
+        """
+        :param item: wire format item, e.g. {'identifier': {'S': 'id'}}
+        :param attributes: only decode these attributes, all if None
+        :return: python dict
+        """
+        value = self.deserialize_value
+        if attributes is None:
+            return {k: value(v) for k, v in item.items()}
+        return {k: value(item[k]) for k in attributes if k in item}
+
+    def deserialize_items(self, items, attributes=None) -> list:
+        """
+        Decode a list of items, e.g. a scan or query page of a low level client
+        """
+        deserialize_item = self.deserialize_item
+        return [deserialize_item(item, attributes) for item in items]
+
+    def deserialize_stream_records(self, records) -> list:
+        """
+        Decode a batch of dynamo db stream records
+
+        :param records: 'Records' of a dynamo db stream lambda event
+        :return: records with Keys, NewImage and OldImage of record['dynamodb'] decoded
+        """
+        decoded = []
+        for record in records:
+            stream_record = dict(record.get('dynamodb', {}))
+            for name in ('Keys', 'NewImage', 'OldImage'):
+                if name in stream_record:
+                    stream_record[name] = self.deserialize_item(stream_record[name])
+            decoded.append(dict(record, dynamodb=stream_record))
+        return decoded
+
+    def lazy_item(self, item) -> 'LazyItem':
+        """
+        Read only mapping decoding attributes on first access
+        """
+        return LazyItem(item, self.deserialize_value)
+
+
+class LazyItem(Mapping):
+    """
+    Read only mapping over a wire format item, decoding every attribute on first access
+    """
+
+    def __init__(self, item, deserialize_value):
+        self._item = item
+        self._deserialize_value = deserialize_value
+        self._decoded = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._decoded[key]
+        except KeyError:
+            value = self._decoded[key] = self._deserialize_value(self._item[key])
+            return value
+
+    def __iter__(self):
+        return iter(self._item)
+
+    def __len__(self):
+        return len(self._item)
+
+    def __repr__(self):
+        return f'LazyItem({list(self._item)})'
+
+
+class ItemSerializer:
+    """
+    Converts python data to dynamo db wire format, with a dispatch table per python type
+
+    Produces the same values as boto3's TypeSerializer, and falls back to it for types not in the table (subclasses,
+    other mappings and sequences). With allow_float, floats are accepted and sent as their shortest repr.
+    """
+
+    def __init__(self, allow_float=False):
+        self._fallback = TypeSerializer()
+        value = self.serialize_value
+        self._dispatch = {
+            str: lambda data: {'S': data},
+            bool: lambda data: {'BOOL': data},
+            int: self._serialize_int,
+            Decimal: lambda data: {'N': self._number(data)},
+            bytes: lambda data: {'B': data},
+            bytearray: lambda data: {'B': data},
+            Binary: lambda data: {'B': data.value},
+            type(None): lambda _: {'NULL': True},
+            dict: lambda data: {'M': {k: value(v) for k, v in data.items()}},
+            list: lambda data: {'L': [value(it) for it in data]},
+            tuple: lambda data: {'L': [value(it) for it in data]},
+        }
+        if allow_float:
+            self._dispatch[float] = lambda data: {'N': self._number(Decimal(repr(data)))}
+
+    def serialize_value(self, value):
+        try:
+            serialize = self._dispatch[type(value)]
+        except KeyError:
+            return self._fallback.serialize(value)
+        return serialize(value)
+
+    def serialize_item(self, item) -> dict:
+        value = self.serialize_value
+        return {k: value(v) for k, v in item.items()}
+
+    def serialize_items(self, items) -> list:
+        serialize_item = self.serialize_item
+        return [serialize_item(item) for item in items]
+
+    def _serialize_int(self, data):
+        if -_MAX_EXACT_INT < data < _MAX_EXACT_INT:
+            return {'N': str(data)}
+        return {'N': self._number(data)}
+
+    @staticmethod
+    def _number(data):
+        number = str(DYNAMODB_CONTEXT.create_decimal(data))
+        if number in ('Infinity', 'NaN'):
+            raise TypeError('Infinity and NaN not supported')
+        return number
+
+
+deserializer = ItemDeserializer()
+native_deserializer = ItemDeserializer(use_decimal=False)
+serializer = ItemSerializer()
+float_serializer = ItemSerializer(allow_float=True)
+
+
+def key_to_json(key) -> dict:
+    """
+    Converts a table key to json serializable dynamo db wire format, binary values being base64 text as in DynamoDB
+    JSON
+
+    :param key: key with python values
+    :return: wire format key
+    """
+    wire = serializer.serialize_item(key)
+    return {k: {'B': base64.b64encode(v['B']).decode('ascii')} if 'B' in v else v for k, v in wire.items()}
+
+
+def key_from_json(data) -> dict:
+    """
+    Converts a key produced by key_to_json back to python values
+
+    :param data: wire format key
+    :return: key with python values
+    """
+    wire = {k: {'B': base64.b64decode(v['B'])} if 'B' in v else v for k, v in data.items()}
+    return deserializer.deserialize_item(wire)
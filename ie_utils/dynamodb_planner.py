@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from collections import Counter, namedtuple
+from decimal import Decimal
+
+SCAN = 'scan'
+QUERY = 'query'
+
+QueryPlan = namedtuple('QueryPlan', ['table_name', 'operation', 'index_name', 'key_name', 'reason'])
+
+IndexSchema = namedtuple('IndexSchema', ['name', 'hash_key', 'range_key', 'projection_type', 'status'])
+
+
+class TableSchema:
+    """
+    Key schema and secondary indexes of a table, as returned by describe_table
+    """
+
+    def __init__(self, description):
+        self.table_name = description['TableName']
+        self.hash_key, self.range_key = self._key_schema(description['KeySchema'])
+        self.attribute_types = {it['AttributeName']: it['AttributeType']
+                                for it in description.get('AttributeDefinitions', [])}
+        self.indexes = [
+            IndexSchema(index['IndexName'], *self._key_schema(index['KeySchema']),
+                        index.get('Projection', {}).get('ProjectionType'), index.get('IndexStatus', 'ACTIVE'))
+            for index in description.get('GlobalSecondaryIndexes', []) + description.get('LocalSecondaryIndexes', [])
+        ]
+
+    @property
+    def key_names(self) -> list:
+        return [it for it in (self.hash_key, self.range_key) if it]
+
+    @staticmethod
+    def _key_schema(key_schema):
+        keys = {it['KeyType']: it['AttributeName'] for it in key_schema}
+        return keys.get('HASH'), keys.get('RANGE')
+
+
+class QueryPlanner:
+    """
+    Chooses between Query and Scan for attribute equality lookups
+
+    Table descriptions are fetched once per table and cached. Lookups on the partition key of the table, or on the
+    partition key of an active index projecting all attributes and without range key (an index with a range key
+    does not hold the items missing that attribute), become a Query; anything else falls back to a Scan.
+    Chosen operations are counted per table in stats, to find lookups that still cost a scan.
+    """
+
+    def __init__(self, describe_table, failure_ttl=300):
+        """
+        :param describe_table: callable (table_name) returning the describe_table 'Table' description
+        :param failure_ttl: seconds before retrying a failed describe_table (e.g. missing permission)
+        """
+        self._describe_table = describe_table
+        self._failure_ttl = failure_ttl
+        self._schemas = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def get_schema(self, table_name):
+        """
+        Cached table schema
+
+        :param table_name: dynamo db table name
+        :return: TableSchema, None if the table could not be described
+        """
+        schema, expires_at = self._schemas.get(table_name, (None, 0))
+        if schema is not None or time.monotonic() < expires_at:
+            return schema
+        try:
+            schema = TableSchema(self._describe_table(table_name))
+            expires_at = None
+        except Exception:
+            logging.getLogger(__name__).warning(f'Could not describe table {table_name}, falling back to scan',
+                                                exc_info=True)
+            schema, expires_at = None, time.monotonic() + self._failure_ttl
+        with self._lock:
+            self._schemas[table_name] = (schema, expires_at)
+        return schema
+
+    def invalidate(self, table_name=None):
+        """
+        Drop cached schemas, e.g. after an index was added
+
+        :param table_name: only drop the schema of this table, all schemas if None
+        """
+        with self._lock:
+            if table_name is None:
+                self._schemas.clear()
+            else:
+                self._schemas.pop(table_name, None)
+
+    def plan(self, table_name, attribute_name, value) -> QueryPlan:
+        """
+        Plan an equality lookup of attribute_name = value
+
+        :param table_name: dynamo db table name
+        :param attribute_name: attribute to search by
+        :param value: attribute value
+        :return: QueryPlan
+        """
+        query_plan = self._plan(table_name, attribute_name, value)
+        self.stats[(table_name, query_plan.operation)] += 1
+        return query_plan
+
+    def _plan(self, table_name, attribute_name, value):
+        schema = self.get_schema(table_name)
+        if schema is None:
+            return QueryPlan(table_name, SCAN, None, attribute_name, 'table description not available')
+        if not _value_matches_type(value, schema.attribute_types.get(attribute_name)):
+            return QueryPlan(table_name, SCAN, None, attribute_name,
+                             f'value type does not match key type {schema.attribute_types.get(attribute_name)}')
+        if schema.hash_key == attribute_name:
+            return QueryPlan(table_name, QUERY, None, attribute_name, 'partition key of the table')
+
+        skipped = []
+        for index in schema.indexes:
+            if index.hash_key != attribute_name:
+                continue
+            if index.status != 'ACTIVE':
+                skipped.append(f'{index.name} is {index.status}')
+            elif index.projection_type != 'ALL':
+                skipped.append(f'{index.name} projects {index.projection_type}')
+            elif index.range_key is not None:
+                # items without the range key attribute are not in the index
+                skipped.append(f'{index.name} has range key {index.range_key}, sparse')
+            else:
+                return QueryPlan(table_name, QUERY, index.name, attribute_name, f'partition key of index {index.name}')
+        reason = f'no usable index ({", ".join(skipped)})' if skipped else 'no index on attribute'
+        return QueryPlan(table_name, SCAN, None, attribute_name, reason)
+
+
+def _value_matches_type(value, attribute_type):
+    if attribute_type == 'S':
+        return isinstance(value, str)
+    if attribute_type == 'N':
+        return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+    if attribute_type == 'B':
+        from boto3.dynamodb.types import Binary
+        return isinstance(value, (bytes, bytearray, Binary))
+    return attribute_type is None
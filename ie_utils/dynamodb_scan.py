@@ -0,0 +1,190 @@
+import copy
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 8
+
+_SEGMENT_DONE = object()
+
+
+def paginate(operation, **kwargs):
+    """
+    Call a paginated dynamo db operation (scan, query) until LastEvaluatedKey is exhausted
+
+    :param operation: bound table method, e.g. table.scan
+    :param kwargs: operation arguments
+    :return: generator of (items, last_evaluated_key) per page, last_evaluated_key is None for the last page
+    """
+    kwargs = dict(kwargs)
+    while True:
+        response = operation(**kwargs)
+        last_key = response.get('LastEvaluatedKey')
+        yield response.get('Items', []), last_key
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def projection_arguments(projection, expression_attribute_names=None):
+    """
+    Build ProjectionExpression arguments for a list of attribute names, safe for reserved words
+
+    :param projection: list of attribute names
+    :param expression_attribute_names: existing ExpressionAttributeNames to extend
+    :return: dict with ProjectionExpression and ExpressionAttributeNames
+    """
+    names = dict(expression_attribute_names or {})
+    placeholders = []
+    for i, attribute_name in enumerate(projection):
+        placeholder = f'#proj{i}'
+        names[placeholder] = attribute_name
+        placeholders.append(placeholder)
+    return {'ProjectionExpression': ', '.join(placeholders), 'ExpressionAttributeNames': names}
+
+
+class TableScanner:
+    """
+    Iterable over all items of a (filtered) table scan
+
+    Follows LastEvaluatedKey across pages and, with total_segments, scans segments in parallel on a bounded thread
+    pool. Items of one segment are yielded in page order, segments are interleaved.
+
+    After (or while) iterating, cursor holds the position of every segment at the last completely consumed page, and
+    can be passed to a new scanner to resume. A scan stopped in the middle of a page (e.g. by max_items) resumes at the
+    start of that page. The keys of the cursor are converted with encode_key, e.g. from the Decimal numbers of a table
+    resource to the json serializable wire format, and back with decode_key.
+    """
+
+    def __init__(self, get_table, total_segments=None, max_workers=None, page_size=None, projection=None,
+                 max_items=None, cursor=None, encode_key=copy.deepcopy, decode_key=copy.deepcopy, **scan_kwargs):
+        """
+        :param get_table: callable returning the table to scan, called from every worker thread
+        :param total_segments: number of parallel scan segments, sequential scan if None
+        :param max_workers: max number of threads scanning segments, defaults to min(total_segments, 8)
+        :param page_size: max number of items evaluated per scan request (Limit)
+        :param projection: list of attribute names to return
+        :param max_items: stop after this many items
+        :param cursor: cursor of a previous scanner to resume from
+        :param encode_key: callable converting a LastEvaluatedKey to its form in the cursor
+        :param decode_key: callable converting a key of the cursor back to an ExclusiveStartKey
+        :param scan_kwargs: additional scan arguments, e.g. FilterExpression
+        """
+        self._get_table = get_table
+        self._total_segments = total_segments
+        self._max_workers = max_workers or min(total_segments or 1, DEFAULT_MAX_WORKERS)
+        self._max_items = max_items
+        self._encode_key = encode_key
+        self._scan_kwargs = dict(scan_kwargs)
+        if page_size:
+            self._scan_kwargs['Limit'] = page_size
+        if projection:
+            self._scan_kwargs.update(
+                projection_arguments(projection, self._scan_kwargs.get('ExpressionAttributeNames')))
+
+        if cursor:
+            if cursor.get('total_segments') != total_segments:
+                raise ValueError(f'Cursor was created for {cursor.get("total_segments")} segments, '
+                                 f'not {total_segments}')
+            # segment numbers become strings when a cursor is stored as json
+            self._last_keys = {int(k): decode_key(v) for k, v in cursor['last_keys'].items()}
+            self._finished = {int(it) for it in cursor['finished']}
+        else:
+            self._last_keys = {}
+            self._finished = set()
+
+    @property
+    def cursor(self) -> dict:
+        """
+        Position of the scan, to be passed as cursor to a new scanner
+        """
+        return {
+            'total_segments': self._total_segments,
+            'last_keys': {k: self._encode_key(v) for k, v in self._last_keys.items()},
+            'finished': sorted(self._finished)
+        }
+
+    @property
+    def finished(self) -> bool:
+        return len(self._finished) == (self._total_segments or 1)
+
+    def __iter__(self):
+        pages = self._scan_sequential() if self._total_segments is None else self._scan_parallel()
+        remaining = self._max_items
+        for segment, items, last_key in pages:
+            if remaining is not None and len(items) >= remaining:
+                yield from items[:remaining]
+                if len(items) == remaining:
+                    self._page_consumed(segment, last_key)
+                return
+            yield from items
+            self._page_consumed(segment, last_key)
+            if remaining is not None:
+                remaining -= len(items)
+
+    def _page_consumed(self, segment, last_key):
+        if last_key:
+            self._last_keys[segment] = last_key
+        else:
+            self._last_keys.pop(segment, None)
+            self._finished.add(segment)
+
+    def _segment_kwargs(self, segment):
+        kwargs = dict(self._scan_kwargs)
+        if self._total_segments is not None:
+            kwargs.update(Segment=segment, TotalSegments=self._total_segments)
+        if segment in self._last_keys:
+            kwargs['ExclusiveStartKey'] = self._last_keys[segment]
+        return kwargs
+
+    def _scan_sequential(self):
+        if self.finished:
+            return
+        for items, last_key in paginate(self._get_table().scan, **self._segment_kwargs(0)):
+            yield 0, items, last_key
+
+    def _scan_parallel(self):
+        segments = [it for it in range(self._total_segments) if it not in self._finished]
+        if not segments:
+            return
+        pages = queue.Queue(maxsize=self._max_workers * 2)
+        stop = threading.Event()
+
+        def put(message):
+            while not stop.is_set():
+                try:
+                    pages.put(message, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def scan_segment(segment):
+            if stop.is_set():
+                # queued behind other segments when the scan stopped, not a single request is sent
+                return
+            try:
+                for items, last_key in paginate(self._get_table().scan, **self._segment_kwargs(segment)):
+                    if not put((segment, items, last_key)):
+                        return
+            except Exception as e:
+                put((segment, e, None))
+            else:
+                put((segment, _SEGMENT_DONE, None))
+
+        executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='ie-utils-scan')
+        try:
+            for segment in segments:
+                executor.submit(scan_segment, segment)
+            running = len(segments)
+            while running:
+                segment, items, last_key = pages.get()
+                if items is _SEGMENT_DONE:
+                    running -= 1
+                elif isinstance(items, Exception):
+                    raise items
+                else:
+                    yield segment, items, last_key
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,159 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 60.0
+DEFAULT_MAX_PER_WINDOW = 3
+DEFAULT_MAX_QUEUE_SIZE = 100
+MAX_FINGERPRINTS = 1000
+MAX_FINGERPRINT_FRAMES = 10
+
+
+class _Flush:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class _Window:
+    __slots__ = ('started_at', 'sent', 'suppressed')
+
+    def __init__(self, started_at, suppressed=0):
+        self.started_at = started_at
+        self.sent = 0
+        self.suppressed = suppressed
+
+
+def fingerprint(exc) -> tuple:
+    """
+    Exception type and raising stack (file, line, function of the innermost frames); the message is only used for
+    exceptions without traceback, since it often holds ids that would defeat grouping
+    """
+    frames = []
+    tb = exc.__traceback__
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        frames.append((code.co_filename, tb.tb_lineno, code.co_name))
+        tb = tb.tb_next
+    exc_type = type(exc)
+    name = f'{exc_type.__module__}.{exc_type.__qualname__}'
+    return (name, tuple(frames[-MAX_FINGERPRINT_FRAMES:])) if frames else (name, str(exc))
+
+
+class ExceptionReporter:
+    """
+    Sends exceptions from a background thread, grouped and rate limited by fingerprint
+
+    Per fingerprint at most max_per_window exceptions are sent per window of seconds; the others are counted and the
+    count is passed along with the first exception sent in a later window. The queue to the sending thread is bounded
+    and report never blocks: exceptions reported while it is full are dropped and counted. Lambda handlers should call
+    flush before returning, since a frozen lambda container does not run the background thread.
+    """
+
+    def __init__(self, send, window=DEFAULT_WINDOW, max_per_window=DEFAULT_MAX_PER_WINDOW,
+                 max_queue_size=DEFAULT_MAX_QUEUE_SIZE, clock=time.monotonic):
+        """
+        :param send: callable (exception, suppressed), suppressed being the number of exceptions with the same
+            fingerprint not sent since the previous one
+        :param window: seconds of a rate limit window
+        :param max_per_window: max number of exceptions sent per fingerprint and window
+        :param max_queue_size: max number of exceptions waiting to be sent
+        :param clock: monotonic clock
+        """
+        self._send = send
+        self._window = window
+        self._max_per_window = max_per_window
+        self._clock = clock
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._windows = OrderedDict()
+        self._thread = None
+        self.stats = Counter()
+
+    def report(self, exc) -> bool:
+        """
+        Queue an exception, unless it was already reported or its fingerprint is over the rate limit
+
+        :param exc: exception
+        :return: True if the exception was queued
+        """
+        if getattr(exc, '_ie_utils_reported', False):
+            self._count('duplicates')
+            return False
+        try:
+            exc._ie_utils_reported = True
+        except AttributeError:
+            pass
+
+        key = fingerprint(exc)
+        now = self._clock()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window.started_at >= self._window:
+                window = self._windows[key] = _Window(now, window.suppressed if window else 0)
+                if len(self._windows) > MAX_FINGERPRINTS:
+                    self._windows.popitem(last=False)
+            self._windows.move_to_end(key)
+            if window.sent >= self._max_per_window:
+                window.suppressed += 1
+                self.stats['suppressed'] += 1
+                return False
+            window.sent += 1
+            suppressed, window.suppressed = window.suppressed, 0
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((exc, suppressed))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('queued')
+        return True
+
+    def flush(self, timeout=None) -> bool:
+        """
+        Wait until queued exceptions are sent
+
+        :param timeout: max number of seconds to wait
+        :return: True if all exceptions were sent, False on timeout
+        """
+        if self._thread is None:
+            return True
+        request = _Flush()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(timeout)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name='ie-utils-exception-reporter', daemon=True)
+                thread.start()
+                atexit.register(self.flush, 2.0)
+                self._thread = thread
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            if isinstance(message, _Flush):
+                message.done.set()
+                continue
+            exc, suppressed = message
+            try:
+                self._send(exc, suppressed)
+                self._count('sent')
+            except Exception:
+                self._count('failed')
+                logger.exception(f'Failed to report exception {exc!r}')
@@ -0,0 +1,202 @@
+import datetime
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+LOG_ATTRIBUTE = 'log_messages'
+# dynamo db limits expressions to 4 KB and items to 400 KB; updates stay well below the latter, the item also holds
+# the attributes already written
+MAX_EXPRESSION_LENGTH = 4096
+DEFAULT_MAX_UPDATE_BYTES = 256 * 1024
+
+
+class _Update:
+    __slots__ = ('attributes', 'entries', 'size', 'expression_length')
+
+    def __init__(self):
+        self.attributes = {}
+        self.entries = []
+        self.size = 0
+        self.expression_length = 0
+
+    def __bool__(self):
+        return bool(self.attributes or self.entries)
+
+
+class EventSession:
+    """
+    Collects the status, message and log entries of an event and writes them to its item in one UpdateItem
+
+    Handlers call log and set_status as often as they like; commit (called on exit of the with block, and usable
+    as a checkpoint) writes everything pending in one combined update expression, split in several updates only when
+    the expression length or item size limits require it. State pending when the with block raises is committed
+    before the exception propagates, so no log entry is lost.
+    """
+
+    def __init__(self, update_item, table_name, table_key, key_name='identifier', append_log_entries=None,
+                 max_update_bytes=DEFAULT_MAX_UPDATE_BYTES, clock=datetime.datetime.now):
+        """
+        :param update_item: callable (table_name, **update_item_kwargs)
+        :param table_name: dynamo db table name
+        :param table_key: identifier of the event item
+        :param key_name: hash key name of the table
+        :param append_log_entries: callable (entries) writing log entries elsewhere (e.g. the log store) instead of
+            appending them to the log_messages list of the item
+        :param max_update_bytes: max approximate size of the values of one update
+        :param clock: callable returning the current datetime, for log entries and processed_at
+        """
+        self._update_item = update_item
+        self._table_name = table_name
+        self._table_key = table_key
+        self._key_name = key_name
+        self._append_log_entries = append_log_entries
+        self._max_update_bytes = max_update_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._attributes = {}
+        self._entries = []
+        self.updates_sent = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+            return
+        try:
+            self.commit()
+        except Exception:
+            # the exception of the with block is the one to propagate
+            logger.exception(f'Failed to commit event {self._table_key} of table {self._table_name}')
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._attributes or self._entries)
+
+    def log(self, description, log_object):
+        """
+        Add a log entry, written on the next commit
+
+        :param description: log description
+        :param log_object: logged object, converted to a string on commit
+        :return:
+        """
+        entry = {'datetime': str(self._clock()), 'description': description, 'log_object': log_object}
+        with self._lock:
+            self._entries.append(entry)
+
+    def set_status(self, status, message=None):
+        """
+        Set status, message and processed_at as DynamoDBUtils.update_event does, on the next commit
+        """
+        self.set(status=status, message=message)
+
+    def set(self, **attributes):
+        """
+        Set item attributes on the next commit, later values replace earlier ones
+        """
+        with self._lock:
+            self._attributes.update(attributes)
+            if 'status' in attributes:
+                self._attributes['processed_at'] = None
+
+    def commit(self) -> int:
+        """
+        Write pending attributes and log entries; what could not be written stays pending
+
+        :return: number of UpdateItem requests sent
+        """
+        with self._lock:
+            attributes, self._attributes = self._attributes, {}
+            entries, self._entries = self._entries, []
+        if 'processed_at' in attributes:
+            attributes['processed_at'] = str(self._clock())
+        entries = [dict(it, log_object=str(it['log_object'])) if not isinstance(it['log_object'], str) else it
+                   for it in entries]
+
+        if entries and self._append_log_entries:
+            try:
+                self._append_log_entries(entries)
+            except Exception:
+                self._restore(attributes, entries)
+                raise
+            entries = []
+
+        updates = self.build_updates(attributes, entries)
+        for i, update in enumerate(updates):
+            try:
+                self._update_item(self._table_name, **self._update_kwargs(update))
+            except Exception:
+                for unsent in reversed(updates[i:]):
+                    self._restore(unsent.attributes, unsent.entries)
+                raise
+            self.updates_sent += 1
+        return len(updates)
+
+    def build_updates(self, attributes, entries) -> list:
+        """
+        Pack attributes and log entries into as few updates as the limits allow; an update appends at most one
+        chunk of log entries, since an update expression cannot use the same attribute twice
+        """
+        updates = [_Update()]
+
+        def current(size, expression_length, with_entries=False):
+            update = updates[-1]
+            if update and (update.size + size > self._max_update_bytes
+                           or update.expression_length + expression_length > MAX_EXPRESSION_LENGTH
+                           or with_entries and update.entries):
+                update = _Update()
+                updates.append(update)
+            update.size += size
+            update.expression_length += expression_length
+            return update
+
+        # names and values are placeholders, '#a12 = :a12, '
+        for name, value in attributes.items():
+            current(_size(value), 16).attributes[name] = value
+
+        chunk, chunk_size = [], 0
+        for entry in entries:
+            size = _size(entry)
+            if chunk and chunk_size + size > self._max_update_bytes:
+                current(chunk_size, 80, with_entries=True).entries.extend(chunk)
+                chunk, chunk_size = [], 0
+            chunk.append(entry)
+            chunk_size += size
+        if chunk:
+            current(chunk_size, 80, with_entries=True).entries.extend(chunk)
+
+        return [it for it in updates if it]
+
+    def _update_kwargs(self, update) -> dict:
+        assignments = []
+        names = {}
+        values = {}
+        for i, (name, value) in enumerate(update.attributes.items()):
+            names[f'#a{i}'] = name
+            values[f':a{i}'] = value
+            assignments.append(f'#a{i} = :a{i}')
+        if update.entries:
+            names['#log'] = LOG_ATTRIBUTE
+            values[':empty_list'] = []
+            values[':log_entries'] = update.entries
+            assignments.append('#log = list_append(if_not_exists(#log, :empty_list), :log_entries)')
+        return {
+            'Key': {self._key_name: self._table_key},
+            'UpdateExpression': 'SET ' + ', '.join(assignments),
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values,
+        }
+
+    def _restore(self, attributes, entries):
+        with self._lock:
+            # values set since the failed commit are newer
+            self._attributes = dict(attributes, **self._attributes)
+            self._entries = entries + self._entries
+
+
+def _size(value) -> int:
+    return len(json.dumps(value, default=str))
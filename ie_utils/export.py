@@ -0,0 +1,314 @@
+"""
+Streaming export of a dynamo db table to gzipped NDJSON files
+
+Every segment of a parallel scan is a pipeline: a thread fetches pages into a bounded queue, and the segment worker
+decodes items, encodes them as json lines and compresses them incrementally into the stream of chunks uploaded as a
+multipart upload. Memory use depends on page size, queue size and part size, not on the size of the table.
+
+A segment writes its own files, rolled by compressed size at page boundaries. The checkpoint of a segment moves to
+the end of a file once that file is uploaded, so an interrupted export resumed from its checkpoint writes every item
+once: the file being written when it stopped is written again from its first item.
+
+Numbers keep their exact value: integral numbers are written as json integers, others as strings holding their exact
+decimal representation, e.g. "0.1", since a json number would be read back as a binary float by most parsers. With
+float_numbers they are written as json numbers, rounded to the nearest float.
+"""
+import base64
+import copy
+import functools
+import json
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from decimal import Decimal
+
+from ie_utils.dynamodb_scan import paginate
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+DEFAULT_TOTAL_SEGMENTS = 8
+DEFAULT_QUEUED_PAGES = 4
+DEFAULT_COMPRESSION_LEVEL = 6
+FILE_KEY_FORMAT = '{prefix}/segment-{segment:04}-{file:05}.ndjson.gz'
+
+_END = object()
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def json_default(value, float_numbers=False):
+    """
+    json.dumps default for the values of dynamo db items: numbers, sets and binary data
+
+    :param value: Decimal, set or binary value
+    :param float_numbers: write non integral numbers as (rounded) floats instead of exact strings
+    """
+    if isinstance(value, Decimal):
+        if value == value.to_integral_value():
+            return int(value)
+        return float(value) if float_numbers else str(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    value = getattr(value, 'value', value)
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+_ENCODERS = {
+    float_numbers: json.JSONEncoder(default=functools.partial(json_default, float_numbers=float_numbers),
+                                    separators=(',', ':')).encode
+    for float_numbers in (False, True)
+}
+
+
+def max_rss_bytes():
+    """
+    :return: peak resident set size of the process in bytes, None where unknown
+    """
+    if resource is None:
+        return None
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _Prefetcher:
+    """
+    Iterates pages on a background thread, at most maxsize pages ahead of the consumer
+    """
+
+    def __init__(self, pages, maxsize, stop):
+        self._pages = pages
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = stop
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ie-utils-export-scan', daemon=True)
+        self._thread.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            try:
+                page = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._stop.is_set():
+                    raise _Cancelled()
+        if page is _END:
+            raise StopIteration
+        if isinstance(page, Exception):
+            raise page
+        return page
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+
+    def _put(self, message):
+        while not (self._closed.is_set() or self._stop.is_set()):
+            try:
+                self._queue.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self):
+        try:
+            for page in self._pages:
+                if not self._put(page):
+                    return
+        except Exception as e:
+            self._put(e)
+        else:
+            self._put(_END)
+
+
+class _FileWriter:
+    """
+    Compressed json lines of the pages of one output file
+    """
+
+    def __init__(self, first_page, pages, deserialize_item, encode, max_file_bytes, compression_level):
+        self._first_page = first_page
+        self._pages = pages
+        self._deserialize_item = deserialize_item
+        self._encode = encode
+        self._max_file_bytes = max_file_bytes
+        # wbits 31: gzip container
+        self._compressor = zlib.compressobj(compression_level, zlib.DEFLATED, 31)
+        self.rows = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.last_key = None
+
+    def chunks(self):
+        page = self._first_page
+        while True:
+            items, self.last_key = page
+            lines = ''.join(self._encode(self._deserialize_item(it)) + '\n' for it in items).encode('utf-8')
+            self.rows += len(items)
+            self.raw_bytes += len(lines)
+            chunk = self._compressor.compress(lines)
+            if chunk:
+                self.compressed_bytes += len(chunk)
+                yield chunk
+            if self.last_key is None or self._max_file_bytes and self.compressed_bytes >= self._max_file_bytes:
+                break
+            page = next(self._pages)
+        chunk = self._compressor.flush()
+        self.compressed_bytes += len(chunk)
+        yield chunk
+
+
+class TableExporter:
+    """
+    Exports the items of a table to gzipped NDJSON files, see the module docstring
+    """
+
+    def __init__(self, scan, upload, prefix, total_segments=DEFAULT_TOTAL_SEGMENTS, max_workers=None,
+                 page_size=None, max_file_bytes=None, queued_pages=DEFAULT_QUEUED_PAGES,
+                 compression_level=DEFAULT_COMPRESSION_LEVEL, deserialize_item=None, float_numbers=False,
+                 checkpoint=None, save_checkpoint=None, **scan_kwargs):
+        """
+        :param scan: thread safe callable (**scan_kwargs) of a scan request, e.g. a low level client scan bound to
+            the table name
+        :param upload: callable (file_key, iterable of bytes chunks) storing a file
+        :param prefix: prefix of the file keys, see FILE_KEY_FORMAT
+        :param total_segments: number of parallel scan segments
+        :param max_workers: max number of segments exported at the same time, defaults to total_segments
+        :param page_size: max number of items evaluated per scan request
+        :param max_file_bytes: compressed size after which a segment starts a new file, one file per segment if None
+        :param queued_pages: max number of pages fetched ahead of the encoder per segment
+        :param compression_level: zlib compression level
+        :param deserialize_item: callable converting a scanned item to json serializable data (numbers as Decimal for
+            exact values, see the module docstring), items as is if None
+        :param float_numbers: write non integral Decimal numbers as json floats instead of exact strings
+        :param checkpoint: checkpoint of a previous export to resume from
+        :param save_checkpoint: callable (checkpoint) called after every uploaded file, with a json serializable dict;
+            calls do not overlap, and a checkpoint is skipped when a newer one (higher sequence) was already saved
+        :param scan_kwargs: additional scan arguments, e.g. FilterExpression
+        """
+        self._scan = scan
+        self._upload = upload
+        self._prefix = prefix
+        self._total_segments = total_segments
+        self._max_workers = max_workers or total_segments
+        self._max_file_bytes = max_file_bytes
+        self._queued_pages = queued_pages
+        self._compression_level = compression_level
+        self._deserialize_item = deserialize_item or (lambda item: item)
+        self._encode = _ENCODERS[bool(float_numbers)]
+        self._save_checkpoint = save_checkpoint
+        self._scan_kwargs = dict(scan_kwargs)
+        if page_size:
+            self._scan_kwargs['Limit'] = page_size
+        if checkpoint:
+            if checkpoint.get('total_segments') != total_segments:
+                raise ValueError(f'Checkpoint was created for {checkpoint.get("total_segments")} segments, '
+                                 f'not {total_segments}')
+            self._segments = {int(k): v for k, v in copy.deepcopy(checkpoint['segments']).items()}
+            self._sequence = checkpoint.get('sequence', 0)
+        else:
+            self._segments = {}
+            self._sequence = 0
+        for segment in range(total_segments):
+            self._segments.setdefault(segment, {'last_key': None, 'files': 0, 'rows': 0, 'finished': False})
+        self._lock = threading.Lock()
+        # checkpoints are saved outside _lock, one at a time and never older than the last saved one
+        self._save_lock = threading.Lock()
+        self._saved_sequence = self._sequence
+        self._stop = threading.Event()
+        self._stats = {'rows': 0, 'raw_bytes': 0, 'bytes': 0, 'files': []}
+
+    @property
+    def checkpoint(self) -> dict:
+        with self._lock:
+            return self._snapshot()
+
+    def run(self) -> dict:
+        """
+        Export the segments not finished yet
+
+        :return: dict with rows, raw_bytes (json lines) and bytes (compressed) written by this run, files (keys),
+            elapsed seconds, rows_per_second, raw_bytes_per_second and max_rss_bytes (peak of the process)
+        """
+        started_at = time.monotonic()
+        segments = [it for it, state in self._segments.items() if not state['finished']]
+        if segments:
+            with ThreadPoolExecutor(max_workers=min(self._max_workers, len(segments)),
+                                    thread_name_prefix='ie-utils-export') as executor:
+                futures = [executor.submit(self._export_segment, it) for it in segments]
+                try:
+                    wait(futures, return_when=FIRST_EXCEPTION)
+                finally:
+                    # stops the other segments on the first error
+                    self._stop.set()
+            errors = [it.exception() for it in futures if it.exception()]
+            if errors:
+                raise next((it for it in errors if not isinstance(it, _Cancelled)), errors[0])
+        elapsed = time.monotonic() - started_at
+        return dict(
+            self._stats,
+            elapsed=elapsed,
+            rows_per_second=self._stats['rows'] / elapsed if elapsed else 0.0,
+            raw_bytes_per_second=self._stats['raw_bytes'] / elapsed if elapsed else 0.0,
+            max_rss_bytes=max_rss_bytes()
+        )
+
+    def _export_segment(self, segment):
+        state = self._segments[segment]
+        kwargs = dict(self._scan_kwargs, Segment=segment, TotalSegments=self._total_segments)
+        if state['last_key']:
+            kwargs['ExclusiveStartKey'] = state['last_key']
+        pages = _Prefetcher(paginate(self._scan, **kwargs), self._queued_pages, self._stop)
+        try:
+            for page in pages:
+                items, last_key = page
+                if not items:
+                    self._advance(segment, last_key)
+                    continue
+                file_key = FILE_KEY_FORMAT.format(prefix=self._prefix, segment=segment, file=state['files'])
+                writer = _FileWriter(page, pages, self._deserialize_item, self._encode, self._max_file_bytes,
+                                     self._compression_level)
+                self._upload(file_key, writer.chunks())
+                self._advance(segment, writer.last_key, writer, file_key)
+        finally:
+            pages.close()
+
+    def _advance(self, segment, last_key, writer=None, file_key=None):
+        with self._lock:
+            state = self._segments[segment]
+            state.update(last_key=last_key, finished=last_key is None)
+            if writer:
+                state['files'] += 1
+                state['rows'] += writer.rows
+                self._stats['rows'] += writer.rows
+                self._stats['raw_bytes'] += writer.raw_bytes
+                self._stats['bytes'] += writer.compressed_bytes
+                self._stats['files'].append(file_key)
+            elif not state['finished']:
+                # an empty page of a filtered scan, saved with the next file
+                return
+            if not self._save_checkpoint:
+                return
+            self._sequence += 1
+            checkpoint = self._snapshot()
+        with self._save_lock:
+            if checkpoint['sequence'] > self._saved_sequence:
+                self._save_checkpoint(checkpoint)
+                self._saved_sequence = checkpoint['sequence']
+
+    def _snapshot(self) -> dict:
+        return {'total_segments': self._total_segments, 'sequence': self._sequence,
+                'segments': copy.deepcopy(self._segments)}
@@ -0,0 +1,128 @@
+import copy
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from ie_utils.dynamodb_batch import key_id
+
+_MISSING = object()
+
+
+class ItemCache:
+    """
+    In-process read-through cache of dynamo db items, keyed by table name and key
+
+    Every table has its own TTL and max number of items, least recently used items are evicted first. Missing items are
+    cached too (negative caching), with their own TTL. Items are copied in and out, so callers can not modify cached
+    data. Writes invalidate the keys they touch; a read that races with a write to its table is not cached.
+    """
+
+    def __init__(self, ttl=60, max_items=1000, negative_ttl=None, table_ttls=None, clock=time.monotonic):
+        """
+        :param ttl: seconds an item stays cached
+        :param max_items: max number of cached items per table
+        :param negative_ttl: seconds a missing item stays cached, defaults to ttl
+        :param table_ttls: dict of table name -> ttl, overriding ttl
+        :param clock: monotonic clock
+        """
+        self._ttl = ttl
+        self._max_items = max_items
+        self._negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._table_ttls = dict(table_ttls or {})
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._versions = Counter()
+        self._key_names = {}
+        self.stats = Counter()
+
+    def version(self, table_name) -> int:
+        """
+        Invalidation counter of a table, to be read before fetching an item and passed to put
+        """
+        return self._versions[table_name]
+
+    def get(self, table_name, key) -> tuple:
+        """
+        :param table_name: dynamo db table name
+        :param key: key dict
+        :return: (True, item or None) on a hit, (False, None) on a miss
+        """
+        now = self._clock()
+        item_key = key_id(key)
+        with self._lock:
+            entries = self._tables.get(table_name)
+            entry = entries.get(item_key) if entries else None
+            if entry is None:
+                self.stats['misses'] += 1
+                return False, None
+            item, expires_at = entry
+            if expires_at <= now:
+                del entries[item_key]
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return False, None
+            entries.move_to_end(item_key)
+            self.stats['hits'] += 1
+        return True, None if item is _MISSING else copy.deepcopy(item)
+
+    def put(self, table_name, key, item, version=None):
+        """
+        :param table_name: dynamo db table name
+        :param key: key dict
+        :param item: item, None for a missing item
+        :param version: result of version() before the item was fetched, the item is not cached if it changed
+        """
+        ttl = self._negative_ttl if item is None else self._table_ttls.get(table_name, self._ttl)
+        if ttl <= 0:
+            return
+        value = _MISSING if item is None else copy.deepcopy(item)
+        item_key = key_id(key)
+        with self._lock:
+            if version is not None and version != self._versions[table_name]:
+                return
+            entries = self._tables.setdefault(table_name, OrderedDict())
+            entries[item_key] = (value, self._clock() + ttl)
+            entries.move_to_end(item_key)
+            self._key_names.setdefault(table_name, set()).add(tuple(sorted(key)))
+            while len(entries) > self._max_items:
+                entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, table_name, key=None):
+        """
+        :param table_name: dynamo db table name
+        :param key: key dict, all items of the table if None
+        """
+        with self._lock:
+            self._versions[table_name] += 1
+            entries = self._tables.get(table_name)
+            if not entries:
+                return
+            if key is None:
+                self.stats['invalidations'] += len(entries)
+                entries.clear()
+            elif entries.pop(key_id(key), None) is not None:
+                self.stats['invalidations'] += 1
+
+    def invalidate_item(self, table_name, item):
+        """
+        Invalidate the key of a written item, for every key schema the table was read with
+
+        :param table_name: dynamo db table name
+        :param item: written item
+        """
+        key_names = self._key_names.get(table_name)
+        if not key_names:
+            with self._lock:
+                self._versions[table_name] += 1
+            return
+        for names in list(key_names):
+            if all(name in item for name in names):
+                self.invalidate(table_name, {name: item[name] for name in names})
+
+    def clear(self):
+        with self._lock:
+            for table_name in self._tables:
+                self._versions[table_name] += 1
+            self._tables.clear()
@@ -0,0 +1,207 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+# dynamo db items are limited to 400 KB, the logged item also holds its other attributes and earlier entries
+DEFAULT_MAX_WRITE_BYTES = 256 * 1024
+
+
+class _FlushRequest:
+    def __init__(self, stop=False):
+        self.stop = stop
+        self.done = threading.Event()
+
+
+class BufferedLogWriter:
+    """
+    Collects log entries per (table name, table key) and writes them from a background thread
+
+    Entries for the same key are coalesced into a single write, split in several writes when their size exceeds
+    max_write_bytes. Pending entries are written when their number reaches max_batch_size, when the oldest pending
+    entry is older than flush_interval seconds, on flush() and on close(). The queue between callers and the writer
+    thread is bounded, so producers block when the writer falls behind. Entry order is preserved, both within a key
+    and across flushes. Entries enqueued before close() are written before the writer thread stops, later ones are
+    rejected.
+    """
+
+    def __init__(self, write_entries, error_handler=None, max_batch_size=100, flush_interval=1.0,
+                 max_queue_size=10000, max_write_bytes=DEFAULT_MAX_WRITE_BYTES):
+        """
+        :param write_entries: callable (table_name, table_key, entries) writing a list of entries in one request
+        :param error_handler: callable (exception, table_name, table_key, entries) called when a write fails
+        :param max_batch_size: number of pending entries that triggers a flush
+        :param flush_interval: max number of seconds an entry stays pending
+        :param max_queue_size: max number of entries waiting for the writer thread
+        :param max_write_bytes: max approximate size of the entries of one write, an entry larger than that is
+            written alone
+        """
+        self._write_entries = write_entries
+        self._error_handler = error_handler
+        self._max_batch_size = max_batch_size
+        self._flush_interval = flush_interval
+        self._max_write_bytes = max_write_bytes
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        # queue puts happen outside the lock, so a full queue does not block flush() and close() past their timeout
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._puts = 0
+        self._thread = None
+        self._closed = False
+
+    def enqueue(self, table_name, table_key, entry, timeout=None):
+        """
+        Add an entry, blocking while the queue is full
+
+        :param table_name: dynamo db table name
+        :param table_key: identifier of the logged item
+        :param entry: log entry
+        :param timeout: max number of seconds to wait for queue space, raises queue.Full when exceeded
+        :return:
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Log writer is closed')
+            self._start()
+            self._puts += 1
+        try:
+            self._queue.put((table_name, table_key, entry), timeout=timeout)
+        finally:
+            self._put_done()
+
+    def flush(self, timeout=None) -> bool:
+        """
+        Write all entries enqueued so far
+
+        :param timeout: max number of seconds to wait
+        :return: True if all entries were written, False on timeout
+        """
+        deadline = _deadline(timeout)
+        with self._lock:
+            if self._thread is None:
+                return True
+            if self._closed:
+                # close() wrote everything, unless it timed out
+                return not self._thread.is_alive()
+            self._puts += 1
+        request = _FlushRequest()
+        try:
+            self._queue.put(request, timeout=_remaining(deadline))
+        except queue.Full:
+            return False
+        finally:
+            self._put_done()
+        return request.done.wait(_remaining(deadline))
+
+    def close(self, timeout=None) -> bool:
+        """
+        Write pending entries and stop the writer thread
+
+        :param timeout: max number of seconds to wait
+        :return: True if all entries were written, False on timeout
+        """
+        deadline = _deadline(timeout)
+        with self._lock:
+            if self._closed:
+                return self._thread is None or not self._thread.is_alive()
+            self._closed = True
+            thread = self._thread
+            atexit.unregister(self.close)
+            if thread is None:
+                return True
+            # puts that passed the closed check go first, so no message is queued behind the stop request
+            if not self._idle.wait_for(lambda: not self._puts, _remaining(deadline)):
+                return False
+        request = _FlushRequest(stop=True)
+        try:
+            self._queue.put(request, timeout=_remaining(deadline))
+        except queue.Full:
+            return False
+        if not request.done.wait(_remaining(deadline)):
+            return False
+        thread.join(_remaining(deadline))
+        return True
+
+    def _put_done(self):
+        with self._lock:
+            self._puts -= 1
+            if not self._puts:
+                self._idle.notify_all()
+
+    def _start(self):
+        if self._thread is None:
+            thread = threading.Thread(target=self._run, name='ie-utils-log-writer', daemon=True)
+            thread.start()
+            atexit.register(self.close)
+            self._thread = thread
+
+    def _run(self):
+        pending = OrderedDict()
+        pending_count = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                message = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                message = None
+
+            if isinstance(message, _FlushRequest):
+                self._write_pending(pending)
+                pending_count, deadline = 0, None
+                message.done.set()
+                if message.stop:
+                    return
+                continue
+
+            if message is not None:
+                table_name, table_key, entry = message
+                pending.setdefault((table_name, table_key), []).append(entry)
+                pending_count += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self._flush_interval
+
+            if pending_count >= self._max_batch_size or (deadline is not None and time.monotonic() >= deadline):
+                self._write_pending(pending)
+                pending_count, deadline = 0, None
+
+    def _write_pending(self, pending):
+        while pending:
+            (table_name, table_key), entries = pending.popitem(last=False)
+            for chunk in self._chunks(entries):
+                try:
+                    self._write_entries(table_name, table_key, chunk)
+                except Exception as e:
+                    if self._error_handler:
+                        self._error_handler(e, table_name, table_key, chunk)
+                    else:
+                        logging.getLogger(__name__).exception(f'Error writing {len(chunk)} log entries')
+
+    def _chunks(self, entries):
+        chunk, chunk_size = [], 0
+        for entry in entries:
+            size = _entry_size(entry)
+            if chunk and chunk_size + size > self._max_write_bytes:
+                yield chunk
+                chunk, chunk_size = [], 0
+            chunk.append(entry)
+            chunk_size += size
+        if chunk:
+            yield chunk
+
+
+def _deadline(timeout):
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def _remaining(deadline):
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def _entry_size(entry) -> int:
+    # str() of the values rather than of the dict: lazy payloads are rendered (once) by str
+    if isinstance(entry, dict):
+        return sum(len(str(key)) + len(str(value).encode('utf-8')) for key, value in entry.items())
+    return len(str(entry).encode('utf-8'))
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+
+from ie_utils.dynamodb_batch import batch_delete_keys, batch_write_items
+from ie_utils.dynamodb_scan import paginate
+
+HASH_KEY = 'identifier'
+SORT_KEY = 'sequence'
+DEFAULT_TABLE_FORMAT = '{table_name}_logs'
+ARCHIVE_DESCRIPTION = 'log entries archived'
+
+
+class SequenceGenerator:
+    """
+    Sort keys increasing within a process and unique across processes
+
+    A sequence is a zero padded nanosecond timestamp, bumped to stay strictly increasing, followed by a random process
+    token, so string order is time order and concurrent writers never overwrite each other's entries.
+    """
+
+    def __init__(self, clock=time.time_ns):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last = 0
+        self._token = os.urandom(4).hex()
+
+    def next(self) -> str:
+        with self._lock:
+            self._last = max(self._last + 1, self._clock())
+            return f'{self._last:020d}-{self._token}'
+
+
+def sequence_before(seconds_ago, clock=time.time_ns) -> str:
+    """
+    :return: sort key lower than the sequence of every entry written less than seconds_ago seconds ago
+    """
+    return f'{clock() - int(seconds_ago * 1e9):020d}'
+
+
+class LogStore:
+    """
+    Append-only log storage, one item per log entry
+
+    Entries are stored in a log table with the identifier of the logged item as hash key and a sequence as range key,
+    so an append costs the same whatever the number of entries already logged, and a log never hits the item size
+    limit. Old entries can be compacted into an NDJSON object in s3, replaced by a single archive entry.
+    """
+
+    def __init__(self, get_table, get_resource, table_format=DEFAULT_TABLE_FORMAT, sequence=None):
+        """
+        :param get_table: callable (table_name) returning the dynamo db table
+        :param get_resource: callable returning the dynamo db service resource
+        :param table_format: log table name, formatted with the name of the logged item's table
+        :param sequence: SequenceGenerator
+        """
+        self._get_table = get_table
+        self._get_resource = get_resource
+        self._table_format = table_format
+        self._sequence = sequence or SequenceGenerator()
+
+    def log_table_name(self, table_name) -> str:
+        return self._table_format.format(table_name=table_name)
+
+    def append(self, table_name, table_key, entries):
+        """
+        :param table_name: table of the logged item
+        :param table_key: identifier of the logged item
+        :param entries: list of log entries (dicts), in log order
+        :return:
+        """
+        log_table_name = self.log_table_name(table_name)
+        items = [dict(entry, **{HASH_KEY: table_key, SORT_KEY: self._sequence.next()}) for entry in entries]
+        if len(items) == 1:
+            self._get_table(log_table_name).put_item(Item=items[0])
+        elif items:
+            batch_write_items(self._get_resource, log_table_name, items, (HASH_KEY, SORT_KEY))
+
+    def read(self, table_name, table_key, before=None, after=None, page_size=None, get_archive=None):
+        """
+        Log entries of an item in log order, fetched page by page
+
+        :param table_name: table of the logged item
+        :param table_key: identifier of the logged item
+        :param before: only entries with a lower sequence
+        :param after: only entries with a higher sequence, e.g. the last sequence read
+        :param page_size: max number of entries per query
+        :param get_archive: callable (bucket_name, file_key) returning archived NDJSON bytes; archive entries are
+            replaced by the entries they archived if given
+        :return: generator of entries
+        """
+        from boto3.dynamodb.conditions import Key
+
+        condition = Key(HASH_KEY).eq(table_key)
+        if before:
+            condition = condition & Key(SORT_KEY).lt(before)
+        kwargs = {'KeyConditionExpression': condition}
+        if after:
+            kwargs['ExclusiveStartKey'] = {HASH_KEY: table_key, SORT_KEY: after}
+        if page_size:
+            kwargs['Limit'] = page_size
+
+        for items, _ in paginate(self._get_table(self.log_table_name(table_name)).query, **kwargs):
+            for item in items:
+                archive = item.get('archive')
+                if archive and get_archive:
+                    yield from _read_archive(get_archive(archive['bucket_name'], archive['file_key']), get_archive)
+                else:
+                    yield item
+
+    def compact(self, table_name, table_key, put_object, bucket_name, before=None, file_key=None) -> dict:
+        """
+        Archive log entries to s3 as NDJSON and replace them with one archive entry
+
+        The archive entry is written before the archived entries are deleted, so an interrupted compaction never loses
+        entries; it may leave some of them both archived and in the table.
+
+        :param table_name: table of the logged item
+        :param table_key: identifier of the logged item
+        :param put_object: callable (bucket_name, file_key, bytes)
+        :param bucket_name: archive bucket
+        :param before: only entries with a lower sequence, all entries if None
+        :param file_key: archive object key, defaults to <log table>/<table key>/<first>_<last>.ndjson
+        :return: dict with archived (number of entries), bucket_name and file_key
+        """
+        entries = list(self.read(table_name, table_key, before=before))
+        if not entries:
+            return {'archived': 0, 'bucket_name': bucket_name, 'file_key': None}
+
+        log_table_name = self.log_table_name(table_name)
+        first, last = entries[0][SORT_KEY], entries[-1][SORT_KEY]
+        file_key = file_key or f'{log_table_name}/{table_key}/{first}_{last}.ndjson'
+        body = ''.join(json.dumps(entry, default=str) + '\n' for entry in entries)
+        put_object(bucket_name, file_key, body.encode('utf-8'))
+
+        # the archive entry takes the place of the last archived entry, keeping its position in the log
+        self._get_table(log_table_name).put_item(Item={
+            HASH_KEY: table_key,
+            SORT_KEY: last,
+            'description': ARCHIVE_DESCRIPTION,
+            'log_object': f's3://{bucket_name}/{file_key}',
+            'archive': {'bucket_name': bucket_name, 'file_key': file_key, 'entries': len(entries)},
+        })
+        batch_delete_keys(self._get_resource, log_table_name,
+                          ({HASH_KEY: table_key, SORT_KEY: entry[SORT_KEY]} for entry in entries[:-1]),
+                          (HASH_KEY, SORT_KEY))
+        return {'archived': len(entries), 'bucket_name': bucket_name, 'file_key': file_key}
+
+
+def _read_archive(body, get_archive):
+    for line in body.decode('utf-8').splitlines():
+        if not line:
+            continue
+        entry = json.loads(line)
+        archive = entry.get('archive')
+        if archive:
+            yield from _read_archive(get_archive(archive['bucket_name'], archive['file_key']), get_archive)
+        else:
+            yield entry
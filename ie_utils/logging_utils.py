@@ -0,0 +1,353 @@
+import atexit
+import contextlib
+import contextvars
+import copy
+import datetime
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+from ie_utils.constants import SENTRY_DSN_VAR_NAME, LOGGING_LEVEL_VAR_NAME, LOGGING_MODULE_LEVELS_VAR_NAME, \
+    LOGGING_DEBUG_SAMPLE_RATE_VAR_NAME
+from ie_utils.error_reporter import ExceptionReporter
+
+# sentry_sdk takes over 100 ms to import, it is imported when the first exception is reported
+sentry_sdk = None
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'context'}
+_log_context = contextvars.ContextVar('ie_utils_log_context', default={})
+_debug_sampled = contextvars.ContextVar('ie_utils_debug_sampled', default=None)
+_logging_lock = threading.Lock()
+_listener = None
+_root_checked = False
+_debug_sample_rate = 1.0
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as a single line json object, with the log context and the extra attributes of the record
+    """
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(
+                timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'context', None) or {})
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """
+    Stream handler writing to the current sys.stdout, which lambda sends to CloudWatch logs
+    """
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _ContextFilter(logging.Filter):
+    """
+    Runs on the calling thread: drops unsampled DEBUG records and attaches the log context
+    """
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and _debug_sample_rate < 1:
+            sampled = _debug_sampled.get()
+            if sampled is None:
+                sampled = random.random() < _debug_sample_rate
+            if not sampled:
+                return False
+        record.context = _log_context.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler merging only the message arguments on the calling thread, formatting is left to the listener
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+    def handle(self, record):
+        if isinstance(record, _FlushRequest):
+            for handler in self.handlers:
+                handler.flush()
+            record.done.set()
+            return
+        super().handle(record)
+
+
+def configure_logging(level=None, module_levels=None, debug_sample_rate=None, stream=None, json_format=True,
+                      max_queue_size=10000, force=False):
+    """
+    Route root logger records through a queue to a listener thread, which formats and writes them
+
+    The calling thread only merges the message arguments and attaches the log context, see log_context; records
+    are dropped (and counted) instead of blocking when the queue is full. Existing root handlers are replaced.
+    Arguments left to None are read from the environment variables of constants.py. Configures once unless forced.
+
+    :param level: root level name, e.g. 'INFO'
+    :param module_levels: dict of logger name -> level name, e.g. {'botocore': 'WARNING'}
+    :param debug_sample_rate: fraction of DEBUG records written, per invocation within log_invocation
+    :param stream: output stream, the current sys.stdout if None
+    :param json_format: write json records, plain text records if False
+    :param max_queue_size: max number of records waiting for the listener thread
+    :param force: configure again
+    :return: root logger
+    """
+    global _listener, _debug_sample_rate
+    root = logging.getLogger()
+    if _listener is not None and not force:
+        return root
+    with _logging_lock:
+        if _listener is not None:
+            if not force:
+                return root
+            _listener.stop()
+        environ = os.environ
+        level = level or environ.get(LOGGING_LEVEL_VAR_NAME, 'INFO')
+        if module_levels is None:
+            module_levels = _parse_module_levels(environ.get(LOGGING_MODULE_LEVELS_VAR_NAME, ''))
+        if debug_sample_rate is None:
+            debug_sample_rate = float(environ.get(LOGGING_DEBUG_SAMPLE_RATE_VAR_NAME, 1))
+        _debug_sample_rate = debug_sample_rate
+
+        handler = logging.StreamHandler(stream) if stream else _StdoutHandler()
+        handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+        log_queue = queue.Queue(max_queue_size)
+        queue_handler = _QueueHandler(log_queue)
+        queue_handler.addFilter(_ContextFilter())
+
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(queue_handler)
+        root.setLevel(logging.getLevelName(level))
+        for name, module_level in module_levels.items():
+            logging.getLogger(name).setLevel(logging.getLevelName(module_level))
+
+        listener = _QueueListener(log_queue, handler)
+        listener.start()
+        if _listener is None:
+            atexit.register(_stop_logging)
+        _listener = listener
+    return root
+
+
+def get_logger():
+    """
+    Root logger
+
+    On first call, a root logger without handlers is configured with configure_logging. Handlers installed by the host
+    application, the lambda runtime or a test runner are left alone, only the level is read from logging_level; call
+    configure_logging explicitly to replace them.
+    """
+    global _root_checked
+    if not _root_checked:
+        root = logging.getLogger()
+        if _listener is None:
+            if root.handlers:
+                root.setLevel(logging.getLevelName(os.environ.get(LOGGING_LEVEL_VAR_NAME, 'INFO')))
+            else:
+                configure_logging()
+        _root_checked = True
+    return logging.getLogger()
+
+
+def flush_logging(timeout=2.0) -> bool:
+    """
+    Wait until queued log records are written, to be called before a lambda invocation ends
+
+    :param timeout: max number of seconds to wait
+    :return: True if all records were written, False on timeout
+    """
+    listener = _listener
+    if listener is None:
+        return True
+    request = _FlushRequest()
+    try:
+        listener.queue.put(request, timeout=timeout)
+    except queue.Full:
+        return False
+    return request.done.wait(timeout)
+
+
+def set_log_context(**fields):
+    """
+    Add fields (e.g. event_id) to every record logged from the current thread / task
+    """
+    _log_context.set({**_log_context.get(), **fields})
+
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """
+    Context manager adding fields to every record logged inside it
+    """
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def log_invocation(handler):
+    """
+    Decorator for lambda handlers: logs with request_id (and event_id of events with an identifier) context, samples
+    DEBUG records per invocation and flushes logging when the handler returns or raises
+    """
+
+    @functools.wraps(handler)
+    def wrapper(event, context=None, *args, **kwargs):
+        fields = {'request_id': getattr(context, 'aws_request_id', None)}
+        if isinstance(event, dict) and 'identifier' in event:
+            fields['event_id'] = event['identifier']
+        get_logger()
+        sampled = _debug_sampled.set(random.random() < _debug_sample_rate)
+        try:
+            with log_context(**fields):
+                return handler(event, context, *args, **kwargs)
+        finally:
+            _debug_sampled.reset(sampled)
+            flush_logging()
+
+    return wrapper
+
+
+def _parse_module_levels(raw_levels):
+    """
+    :param raw_levels: comma separated name=level pairs, e.g. 'botocore=WARNING,ie_utils=DEBUG'
+    :return: dict of logger name -> level name
+    """
+    pairs = (it.split('=', 1) for it in raw_levels.split(',') if '=' in it)
+    return {name.strip(): level.strip().upper() for name, level in pairs}
+
+
+def _stop_logging():
+    if _listener is not None:
+        _listener.stop()
+
+
+def init_sentry_sdk(force=False):
+    """
+    Initialize the sentry sdk once per process, with the dsn of the sentry dsn environment variable
+
+    :param force: initialize again, e.g. after the environment variable changed
+    :return:
+    """
+    global _sentry_initialized
+    if _sentry_initialized and not force:
+        return
+    with _sentry_lock:
+        if _sentry_initialized and not force:
+            return
+        _sentry_initialized = True
+        dsn = os.environ.get(SENTRY_DSN_VAR_NAME)
+        if not dsn:
+            return
+        sentry = _load_sentry_sdk()
+        from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
+        from sentry_sdk.utils import BadDsn
+        try:
+            sentry.init(
+                dsn=dsn,
+                integrations=[AwsLambdaIntegration()]
+            )
+        except BadDsn:
+            get_logger().exception(f'Failed to log to sentry, bad dsn: {dsn}')
+
+
+def capture_exception(exc):
+    """
+    Report an exception to sentry without blocking; repeated exceptions are grouped and rate limited, see
+    ExceptionReporter. Lambda handlers should call flush_exceptions (or use DynamoDBUtils.flush_logs_after) before
+    returning.
+    """
+    # the pinned sentry-sdk binds its client to the hub of the initializing thread, which has to be the caller's (the
+    # main thread for lambda handlers) rather than the thread sending reported exceptions
+    init_sentry_sdk()
+    exception_reporter.report(exc)
+
+
+def flush_exceptions(timeout=2.0) -> bool:
+    """
+    Send reported exceptions and wait for the sentry transport
+
+    :param timeout: max number of seconds to wait for each of them
+    :return: True if all reported exceptions were handed to sentry in time
+    """
+    sent = exception_reporter.flush(timeout)
+    if _sentry_initialized and sentry_sdk is not None:
+        sentry_sdk.flush(timeout)
+    return sent
+
+
+def _send_exception(exc, suppressed):
+    sentry = _load_sentry_sdk()
+    if suppressed:
+        # capture_exception takes no extras in the pinned sentry-sdk, they are set on a scope
+        with sentry.push_scope() as scope:
+            scope.set_extra('suppressed_duplicates', suppressed)
+            sentry.capture_exception(exc)
+    else:
+        sentry.capture_exception(exc)
+
+
+def _load_sentry_sdk():
+    global sentry_sdk
+    if sentry_sdk is None:
+        import sentry_sdk as module
+        sentry_sdk = module
+    return sentry_sdk
+
+
+_sentry_initialized = False
+_sentry_lock = threading.Lock()
+exception_reporter = ExceptionReporter(lambda exc, suppressed: _send_exception(exc, suppressed))
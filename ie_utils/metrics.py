@@ -0,0 +1,294 @@
+import bisect
+import json
+import sys
+import threading
+import time
+
+from ie_utils.registry import aws_registry
+
+# latency histogram bucket upper bounds in milliseconds, the last bucket is unbounded
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+THROTTLING_ERROR_CODES = {'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded',
+                          'Throttling', 'TooManyRequestsException', 'SlowDown', 'RequestThrottled'}
+RESOURCE_PARAMETERS = ('TableName', 'Bucket', 'FunctionName', 'Rule', 'Name')
+DEFAULT_NAMESPACE = 'ie_utils'
+
+_CONTEXT_KEY = 'ie_utils_metrics'
+_HANDLER_ID = 'ie_utils_metrics'
+
+
+class Histogram:
+    """
+    Fixed bucket latency histogram, constant memory and cheap to record into
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q) -> float:
+        """
+        :param q: percentile, 0 to 100
+        :return: upper bound of the bucket holding the percentile (max for the unbounded bucket), None if empty
+        """
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'avg': self.sum / self.count if self.count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': dict(zip([*map(str, self.bounds), 'inf'], self.counts)),
+        }
+
+
+class OperationStats:
+    """
+    Counters of one (service, operation, resource)
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.throttles = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.consumed_capacity = 0.0
+        self.latency = Histogram()
+
+    def summary(self) -> dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'throttles': self.throttles,
+            'retries': self.retries,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'consumed_capacity': self.consumed_capacity,
+            'latency_ms': self.latency.summary(),
+        }
+
+
+class AwsMetrics:
+    """
+    Per call metrics of aws clients, collected with botocore event handlers
+
+    For every (service, operation, resource) - resource being the table, bucket, function or rule name - records call,
+    error, throttling and retry counts, a latency histogram, bytes sent and received by s3 object calls, and dynamo db
+    consumed capacity; ReturnConsumedCapacity is requested on every operation supporting it. Metrics are off by default:
+    disabled metrics have no handlers registered, so they cost nothing.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._operations = {}
+        self._capacity_operations = {}
+        self._registry = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._registry is not None
+
+    def enable(self, registry=aws_registry):
+        """
+        Register the metric handlers on all clients of the registry
+
+        :param registry: AwsRegistry
+        :return:
+        """
+        if self._registry is not None:
+            return
+        self._registry = registry
+        registry.add_event_handler('before-parameter-build', self._before_call, f'{_HANDLER_ID}_before')
+        registry.add_event_handler('after-call', self._after_call, f'{_HANDLER_ID}_after')
+        registry.add_event_handler('after-call-error', self._after_call_error, f'{_HANDLER_ID}_error')
+
+    def disable(self):
+        """
+        Unregister the metric handlers, collected metrics are kept
+        """
+        registry, self._registry = self._registry, None
+        if registry is not None:
+            for suffix in ('before', 'after', 'error'):
+                registry.remove_event_handler(f'{_HANDLER_ID}_{suffix}')
+
+    def reset(self):
+        with self._lock:
+            self._operations = {}
+
+    def snapshot(self) -> list:
+        """
+        :return: list of dicts with service, operation, resource and the summary of their counters
+        """
+        with self._lock:
+            operations = list(self._operations.items())
+            return [dict(service=service, operation=operation, resource=resource, **stats.summary())
+                    for (service, operation, resource), stats in sorted(operations)]
+
+    def emf_records(self, namespace=DEFAULT_NAMESPACE, reset=True, timestamp=None) -> list:
+        """
+        Metrics as CloudWatch embedded metric format records, one per (service, operation, resource)
+
+        :param namespace: CloudWatch namespace
+        :param reset: reset the metrics, so that every export covers the calls since the previous one
+        :param timestamp: record timestamp in milliseconds, defaults to now
+        :return: list of json strings
+        """
+        snapshot = self.snapshot()
+        if reset:
+            self.reset()
+        timestamp = timestamp or int(time.time() * 1000)
+        metrics = [
+            {'Name': 'Calls', 'Unit': 'Count'},
+            {'Name': 'Errors', 'Unit': 'Count'},
+            {'Name': 'Throttles', 'Unit': 'Count'},
+            {'Name': 'Retries', 'Unit': 'Count'},
+            {'Name': 'BytesSent', 'Unit': 'Bytes'},
+            {'Name': 'BytesReceived', 'Unit': 'Bytes'},
+            {'Name': 'ConsumedCapacity', 'Unit': 'Count'},
+            {'Name': 'LatencyAvg', 'Unit': 'Milliseconds'},
+            {'Name': 'LatencyP99', 'Unit': 'Milliseconds'},
+            {'Name': 'LatencyMax', 'Unit': 'Milliseconds'},
+        ]
+        records = []
+        for it in snapshot:
+            latency = it['latency_ms']
+            records.append(json.dumps({
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': namespace,
+                        'Dimensions': [['Service', 'Operation', 'Resource']],
+                        'Metrics': metrics,
+                    }],
+                },
+                'Service': it['service'],
+                'Operation': it['operation'],
+                'Resource': it['resource'],
+                'Calls': it['calls'],
+                'Errors': it['errors'],
+                'Throttles': it['throttles'],
+                'Retries': it['retries'],
+                'BytesSent': it['bytes_sent'],
+                'BytesReceived': it['bytes_received'],
+                'ConsumedCapacity': it['consumed_capacity'],
+                'LatencyAvg': latency['avg'] or 0,
+                'LatencyP99': latency['p99'] or 0,
+                'LatencyMax': latency['max'] or 0,
+            }))
+        return records
+
+    def flush(self, namespace=DEFAULT_NAMESPACE, stream=None):
+        """
+        Write embedded metric format records as log lines (stdout by default, collected by lambda) and reset
+
+        :param namespace: CloudWatch namespace
+        :param stream: text stream
+        :return:
+        """
+        stream = stream or sys.stdout
+        for record in self.emf_records(namespace):
+            stream.write(record + '\n')
+        stream.flush()
+
+    def _before_call(self, params, model, context, **kwargs):
+        if self._supports_consumed_capacity(model) and 'ReturnConsumedCapacity' not in params:
+            params['ReturnConsumedCapacity'] = 'TOTAL'
+        body = params.get('Body')
+        context[_CONTEXT_KEY] = (self._clock(), model, resource_name(params),
+                                 len(body) if isinstance(body, (bytes, bytearray)) else 0)
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        started = context.pop(_CONTEXT_KEY, None)
+        if started is None:
+            return
+        error_code = parsed.get('Error', {}).get('Code')
+        self._record(
+            started,
+            error=error_code is not None or http_response.status_code >= 300,
+            throttled=error_code in THROTTLING_ERROR_CODES,
+            retries=parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0),
+            bytes_received=parsed.get('ContentLength') or 0 if model.name == 'GetObject' else 0,
+            consumed_capacity=_capacity_units(parsed.get('ConsumedCapacity'))
+        )
+
+    def _after_call_error(self, context, **kwargs):
+        # connection errors and other exceptions raised before a response is parsed
+        started = context.pop(_CONTEXT_KEY, None)
+        if started is not None:
+            self._record(started, error=True)
+
+    def _record(self, started, error=False, throttled=False, retries=0, bytes_received=0, consumed_capacity=0.0):
+        start, model, resource, bytes_sent = started
+        elapsed = (self._clock() - start) * 1000
+        key = (model.service_model.service_name, model.name, resource)
+        with self._lock:
+            stats = self._operations.get(key)
+            if stats is None:
+                stats = self._operations[key] = OperationStats()
+            stats.calls += 1
+            stats.errors += error
+            stats.throttles += throttled
+            stats.retries += retries
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.consumed_capacity += consumed_capacity
+            stats.latency.record(elapsed)
+
+    def _supports_consumed_capacity(self, model):
+        supported = self._capacity_operations.get(model)
+        if supported is None:
+            members = model.input_shape.members if model.input_shape is not None else {}
+            supported = self._capacity_operations[model] = 'ReturnConsumedCapacity' in members
+        return supported
+
+
+def resource_name(params) -> str:
+    """
+    :return: table, bucket, function or rule name of the parameters of an aws call, '-' if none
+    """
+    for name in RESOURCE_PARAMETERS:
+        value = params.get(name)
+        if isinstance(value, str):
+            return value
+    request_items = params.get('RequestItems')
+    if request_items:
+        return ','.join(sorted(request_items))
+    return '-'
+
+
+def _capacity_units(consumed_capacity):
+    if not consumed_capacity:
+        return 0.0
+    if isinstance(consumed_capacity, dict):
+        consumed_capacity = [consumed_capacity]
+    return float(sum(it.get('CapacityUnits', 0) for it in consumed_capacity))
+
+
+aws_metrics = AwsMetrics()
@@ -0,0 +1,200 @@
+import json
+import threading
+import weakref
+
+
+class AwsRegistry:
+    """
+    Process wide registry of boto3 sessions, clients, resources and dynamo db tables
+
+    Objects are cached by service name and configuration, so repeated calls (and warm lambda invocations) reuse the
+    same endpoint resolution, credentials and http connection pool instead of building them on every call.
+
+    Low level clients are thread safe and shared by all threads. Sessions are not thread safe, so client and resource
+    creation is serialized with a lock. Resources (and tables built from them) are not thread safe either, so they are
+    cached per thread; all the resources of a service and configuration share one client, so a new thread (e.g. of a
+    thread pool) gets its resource without building a client and connection pool of its own.
+
+    Botocore event handlers added with add_event_handler are registered on every client created by the registry,
+    including the clients of resources, whether created before or after the handler was added.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._session = None
+        self._clients = {}
+        self._resources = {}
+        self._generation = 0
+        self._event_handlers = {}
+        self._event_clients = weakref.WeakSet()
+
+    def get_session(self):
+        """
+        Shared boto3 session, created on first use
+
+        :return: boto3.session.Session
+        """
+        session = self._session
+        if session is None:
+            with self._lock:
+                if self._session is None:
+                    # boto3 takes a few hundred ms to import, it is imported on first use
+                    import boto3.session
+                    self._session = boto3.session.Session()
+                session = self._session
+        return session
+
+    def get_client(self, service_name, **config):
+        """
+        Cached low level client for a service and configuration
+
+        :param service_name: aws service name, e.g. 's3', 'dynamodb'
+        :param config: keyword arguments passed to boto3 client creation (region_name, endpoint_url, ...)
+        :return: boto3 client
+        """
+        key = (service_name, self._config_key(config))
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self.get_session().client(service_name, **config)
+                    self._register_event_handlers(client)
+                    self._clients[key] = client
+        return client
+
+    def get_resource(self, service_name, **config):
+        """
+        Cached resource for a service and configuration, one instance per thread
+
+        :param service_name: aws service name, e.g. 's3', 'dynamodb'
+        :param config: keyword arguments passed to boto3 resource creation (region_name, endpoint_url, ...)
+        :return: boto3 service resource
+        """
+        resources = self._thread_cache('resources')
+        key = (service_name, self._config_key(config))
+        resource = resources.get(key)
+        if resource is None:
+            shared = self._resources.get(key)
+            if shared is None:
+                with self._lock:
+                    shared = self._resources.get(key)
+                    if shared is None:
+                        shared = self.get_session().resource(service_name, **config)
+                        self._register_event_handlers(shared.meta.client)
+                        self._resources[key] = shared
+            # a new resource of the same class on the shared client, the client is the expensive part
+            resource = type(shared)(client=shared.meta.client)
+            resources[key] = resource
+        return resource
+
+    def get_table(self, table_name, **config):
+        """
+        Cached dynamo db table for a table name and configuration, one instance per thread
+
+        :param table_name: dynamo db table name
+        :param config: keyword arguments passed to boto3 resource creation (region_name, endpoint_url, ...)
+        :return: dynamo db Table resource
+        """
+        tables = self._thread_cache('tables')
+        key = (table_name, self._config_key(config))
+        table = tables.get(key)
+        if table is None:
+            table = self.get_resource('dynamodb', **config).Table(table_name)
+            tables[key] = table
+        return table
+
+    def invalidate(self, service_name=None):
+        """
+        Drop cached objects, e.g. after credentials rotation or a configuration change
+
+        :param service_name: only drop objects of this service, all objects (including the session) if None
+        :return:
+        """
+        with self._lock:
+            if service_name is None:
+                self._session = None
+                self._clients.clear()
+                self._resources.clear()
+            else:
+                self._clients = {k: v for k, v in self._clients.items() if k[0] != service_name}
+                self._resources = {k: v for k, v in self._resources.items() if k[0] != service_name}
+            # per thread resources and tables are rebuilt lazily on next use
+            self._generation += 1
+
+    def add_event_handler(self, event_name, handler, unique_id, first=False):
+        """
+        Register a botocore event handler on all clients of the registry, existing and future
+
+        :param event_name: botocore event name, e.g. 'after-call.dynamodb'
+        :param handler: callable receiving the event keyword arguments
+        :param unique_id: handler id, used to remove the handler; registering an id twice has no effect
+        :param first: call the handler before botocore's own handlers, e.g. to answer needs-retry events
+        :return:
+        """
+        with self._lock:
+            self._event_handlers[unique_id] = (event_name, handler, first)
+            for client in list(self._event_clients):
+                _register(client, event_name, handler, unique_id, first)
+
+    def remove_event_handler(self, unique_id):
+        """
+        Unregister a handler added with add_event_handler from all clients of the registry
+
+        :param unique_id: handler id
+        :return:
+        """
+        with self._lock:
+            event_name, handler, _ = self._event_handlers.pop(unique_id, (None, None, None))
+            if event_name is None:
+                return
+            for client in list(self._event_clients):
+                client.meta.events.unregister(event_name, handler, unique_id=unique_id)
+
+    def _register_event_handlers(self, client):
+        self._event_clients.add(client)
+        for unique_id, (event_name, handler, first) in self._event_handlers.items():
+            _register(client, event_name, handler, unique_id, first)
+
+    def _thread_cache(self, name):
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            local.generation = self._generation
+            local.resources = {}
+            local.tables = {}
+        return getattr(local, name)
+
+    def _config_key(self, config):
+        if not config:
+            return ''
+        try:
+            return json.dumps(config, sort_keys=True, default=repr)
+        except TypeError:
+            return repr(sorted(config.items()))
+
+
+def _register(client, event_name, handler, unique_id, first):
+    if first:
+        client.meta.events.register_first(event_name, handler, unique_id=unique_id)
+    else:
+        client.meta.events.register(event_name, handler, unique_id=unique_id)
+
+
+def parse_config(raw_config):
+    """
+    Parse a json encoded boto3 configuration (e.g. the dynamo db config environment variable), memoized by raw value
+
+    :param raw_config: json string, or None
+    :return: dict of keyword arguments
+    """
+    config = _parsed_configs.get(raw_config)
+    if config is None:
+        config = json.loads(raw_config) if raw_config else {}
+        _parsed_configs[raw_config] = config
+    return dict(config)
+
+
+_parsed_configs = {}
+
+aws_registry = AwsRegistry()
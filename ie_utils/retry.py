@@ -0,0 +1,292 @@
+import random
+import threading
+import time
+
+from ie_utils.metrics import THROTTLING_ERROR_CODES, resource_name
+from ie_utils.registry import aws_registry
+
+DEFAULT_BASE_DELAY = 0.05
+DEFAULT_MAX_DELAY = 5.0
+DEFAULT_MIN_RATE = 1.0
+DEFAULT_DECREASE_FACTOR = 0.7
+DEFAULT_INCREASE = 5.0
+DEFAULT_DECREASE_INTERVAL = 0.5
+DEFAULT_MAX_ATTEMPTS = 10
+DEFAULT_SERVICES = ('dynamodb', 's3')
+_HANDLER_ID = 'ie_utils_throttle_control'
+_CONTEXT_KEY = 'ie_utils_rate_limiter'
+
+
+def backoff_delay(attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY) -> float:
+    """
+    Exponential backoff with full jitter
+
+    :param attempt: number of the retry, starting at 0
+    :param base_delay: delay ceiling of the first retry, in seconds
+    :param max_delay: max delay ceiling, in seconds
+    :return: number of seconds to wait, uniformly distributed between 0 and min(max_delay, base_delay * 2 ** attempt)
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class AdaptiveBackoff:
+    """
+    Backoff shared by the workers of one bulk operation
+
+    Every throttled request raises the delay level, every successful request lowers it again, so workers slow down
+    together while the service is throttling and speed up once it recovers.
+    """
+
+    def __init__(self, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._level = 0
+        self._lock = threading.Lock()
+
+    def throttled(self) -> float:
+        with self._lock:
+            level = self._level
+            self._level += 1
+        return backoff_delay(level, self._base_delay, self._max_delay)
+
+    def succeeded(self):
+        with self._lock:
+            self._level = max(0, self._level - 1)
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate adapts to throttling, additive increase / multiplicative decrease
+
+    The limiter does not limit until the first throttling response; it then starts from the measured request rate
+    multiplied by the decrease factor. Every throttling response decreases the rate again (at most once per decrease
+    interval, so a burst of throttled concurrent requests counts once), every successful request increases it by
+    increase / rate, i.e. by about `increase` requests per second every second.
+    """
+
+    def __init__(self, min_rate=DEFAULT_MIN_RATE, decrease_factor=DEFAULT_DECREASE_FACTOR, increase=DEFAULT_INCREASE,
+                 decrease_interval=DEFAULT_DECREASE_INTERVAL, clock=time.monotonic):
+        """
+        :param min_rate: lowest rate in requests per second
+        :param decrease_factor: rate multiplier on throttling
+        :param increase: rate increase per second of successful requests
+        :param decrease_interval: min number of seconds between two decreases
+        :param clock: monotonic clock
+        """
+        self._min_rate = min_rate
+        self._decrease_factor = decrease_factor
+        self._increase = increase
+        self._decrease_interval = decrease_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._rate = None
+        self._tokens = 0.0
+        self._last_refill = self._window_start = self._last_decrease = clock()
+        self._window_count = 0
+        self._measured_rate = 0.0
+
+    @property
+    def rate(self) -> float:
+        """
+        Requests per second, None while not limiting
+        """
+        return self._rate
+
+    def acquire(self) -> float:
+        """
+        Take a token
+
+        :return: number of seconds to wait before sending the request
+        """
+        with self._lock:
+            now = self._clock()
+            self._measure(now)
+            if self._rate is None:
+                return 0.0
+            # at most one second of tokens is kept, so an idle period does not allow a burst
+            self._tokens = min(self._rate, self._tokens + (now - self._last_refill) * self._rate)
+            self._last_refill = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+
+    def throttled(self):
+        with self._lock:
+            now = self._clock()
+            if self._rate is not None and now - self._last_decrease < self._decrease_interval:
+                return
+            rate = self._rate if self._rate is not None else max(self._measured(now), self._min_rate)
+            self._rate = max(self._min_rate, rate * self._decrease_factor)
+            self._tokens = min(self._tokens, 0.0)
+            self._last_refill = self._last_decrease = now
+
+    def succeeded(self):
+        with self._lock:
+            if self._rate is not None:
+                self._rate += self._increase / self._rate
+
+    def _measure(self, now):
+        self._window_count += 1
+        elapsed = now - self._window_start
+        if elapsed >= 1:
+            self._measured_rate = self._window_count / elapsed
+            self._window_start, self._window_count = now, 0
+
+    def _measured(self, now) -> float:
+        # the current window is used until a whole one was measured, e.g. when throttled in the first second
+        elapsed = now - self._window_start
+        if self._measured_rate or elapsed <= 0:
+            return self._measured_rate
+        return self._window_count / elapsed
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of successful requests, so retries cannot multiply the load of a throttled service
+
+    Every successful request deposits ratio tokens, every retry withdraws one; the budget starts full.
+    """
+
+    def __init__(self, capacity=10.0, ratio=0.1):
+        """
+        :param capacity: max number of retry tokens
+        :param ratio: tokens deposited per successful request
+        """
+        self._capacity = capacity
+        self._ratio = ratio
+        self._tokens = capacity
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._capacity, self._tokens + self._ratio)
+
+    def withdraw(self) -> bool:
+        """
+        :return: True if a retry is allowed
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _Limits:
+    __slots__ = ('limiter', 'budget', 'throttles', 'retries', 'exhausted')
+
+    def __init__(self, limiter, budget):
+        self.limiter = limiter
+        self.budget = budget
+        self.throttles = 0
+        self.retries = 0
+        self.exhausted = 0
+
+
+class ThrottleControl:
+    """
+    Process wide rate limiting and retries of throttled aws calls, per service and table / bucket
+
+    All threads calling a table share one AdaptiveRateLimiter and one RetryBudget, instead of each thread retrying on
+    its own and making the throttling worse. Calls wait for a token before being sent; throttled calls are retried
+    with jittered backoff while the budget allows, taking over botocore's retries for throttling errors only.
+    Nothing is controlled until enable() is called.
+    """
+
+    def __init__(self, services=DEFAULT_SERVICES, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 limiter_factory=AdaptiveRateLimiter, budget_factory=RetryBudget, sleep=time.sleep):
+        """
+        :param services: names of the controlled services
+        :param max_attempts: max number of attempts of a throttled call
+        :param limiter_factory: callable returning the limiter of a new (service, resource)
+        :param budget_factory: callable returning the retry budget of a new (service, resource)
+        :param sleep: callable (seconds)
+        """
+        self._services = services
+        self._max_attempts = max_attempts
+        self._limiter_factory = limiter_factory
+        self._budget_factory = budget_factory
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._limits = {}
+        self._registry = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._registry is not None
+
+    def enable(self, registry=aws_registry):
+        """
+        Register the handlers on all clients of the registry
+        """
+        if self._registry is not None:
+            return
+        self._registry = registry
+        for service_name in self._services:
+            registry.add_event_handler(f'before-parameter-build.{service_name}', self._before_call,
+                                       f'{_HANDLER_ID}_before_{service_name}')
+            # botocore's retry handler is registered for the service, ours has to come before it
+            registry.add_event_handler(f'needs-retry.{service_name}', self._needs_retry,
+                                       f'{_HANDLER_ID}_retry_{service_name}', first=True)
+
+    def disable(self):
+        registry, self._registry = self._registry, None
+        if registry is not None:
+            for service_name in self._services:
+                registry.remove_event_handler(f'{_HANDLER_ID}_before_{service_name}')
+                registry.remove_event_handler(f'{_HANDLER_ID}_retry_{service_name}')
+
+    def limits(self, service_name, resource) -> _Limits:
+        key = (service_name, resource)
+        limits = self._limits.get(key)
+        if limits is None:
+            with self._lock:
+                limits = self._limits.get(key)
+                if limits is None:
+                    limits = self._limits[key] = _Limits(self._limiter_factory(), self._budget_factory())
+        return limits
+
+    def snapshot(self) -> list:
+        """
+        :return: list of dicts with service, resource, rate (None while not limiting), throttles, retries and
+            exhausted (throttled calls not retried for lack of budget)
+        """
+        with self._lock:
+            items = sorted(self._limits.items())
+        return [{'service': service, 'resource': resource, 'rate': it.limiter.rate, 'throttles': it.throttles,
+                 'retries': it.retries, 'exhausted': it.exhausted} for (service, resource), it in items]
+
+    def reset(self):
+        with self._lock:
+            self._limits = {}
+
+    def _before_call(self, params, model, context, **kwargs):
+        limits = self.limits(model.service_model.service_name, resource_name(params))
+        context[_CONTEXT_KEY] = limits
+        delay = limits.limiter.acquire()
+        if delay > 0:
+            self._sleep(delay)
+
+    def _needs_retry(self, attempts, response=None, request_dict=None, **kwargs):
+        limits = (request_dict or {}).get('context', {}).get(_CONTEXT_KEY)
+        if limits is None or response is None:
+            return None
+        http_response, parsed = response
+        if parsed.get('Error', {}).get('Code') not in THROTTLING_ERROR_CODES:
+            if http_response.status_code < 300:
+                limits.limiter.succeeded()
+                limits.budget.deposit()
+            # other errors are left to botocore's retry handler
+            return None
+
+        limits.limiter.throttled()
+        retry = attempts < self._max_attempts and limits.budget.withdraw()
+        with self._lock:
+            limits.throttles += 1
+            limits.retries += retry
+            limits.exhausted += not retry
+        if not retry:
+            return False
+        return backoff_delay(attempts - 1) + limits.limiter.acquire()
+
+
+throttle_control = ThrottleControl()
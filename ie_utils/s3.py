@@ -0,0 +1,173 @@
+from ie_utils.registry import aws_registry
+from ie_utils.s3_cache import DEFAULT_DIRECTORY as DEFAULT_CACHE_DIRECTORY, \
+    DEFAULT_MAX_BYTES as DEFAULT_CACHE_MAX_BYTES, CachedObject, S3ObjectCache
+from ie_utils.s3_transfer import DEFAULT_MAX_CONCURRENCY, DEFAULT_PART_SIZE, DEFAULT_UPLOAD_CONCURRENCY, \
+    MultipartUploader, RangedDownloader
+
+
+class S3Utils:
+    """
+    Util cass for aws s3 operations
+    """
+    S3_RESOURCE_NAME = 's3'
+    _object_cache = None
+
+    @staticmethod
+    def get_object(bucket_name, file_key):
+        """
+        Get s3 object by file key and bucket name
+
+        :param bucket_name:
+        :param file_key:
+        :return:
+        """
+        s3_resource = aws_registry.get_resource(S3Utils.S3_RESOURCE_NAME)
+        s3_object = s3_resource.Object(
+            bucket_name,
+            file_key
+        )
+        return s3_object
+
+    @staticmethod
+    def put_object(bucket_name, file_key, file_bytes):
+        """
+        Stores file to s3 bucket
+
+        :param bucket_name:
+        :param file_key:
+        :param file_bytes:
+        :return:
+        """
+        s3_client = aws_registry.get_client(S3Utils.S3_RESOURCE_NAME)
+
+        s3_client.put_object(
+            Bucket=bucket_name,
+            Key=file_key,
+            Body=file_bytes
+        )
+
+    @staticmethod
+    def upload(bucket_name, file_key, data, part_size=DEFAULT_PART_SIZE, multipart_threshold=None,
+               max_concurrency=DEFAULT_UPLOAD_CONCURRENCY, **extra_args) -> dict:
+        """
+        Stores bytes, a file object or a stream of chunks to s3 bucket, as a multipart upload above the threshold
+
+        Peak memory use is roughly part_size * max_concurrency, whatever the object size.
+
+        :param bucket_name:
+        :param file_key:
+        :param data: bytes-like object, object with a read method, or iterable (e.g. generator) of bytes chunks
+        :param part_size: number of bytes per part, at least 5 MB
+        :param multipart_threshold: max number of bytes sent with a single PutObject, defaults to part_size
+        :param max_concurrency: max number of parts uploaded at the same time
+        :param extra_args: additional PutObject / CreateMultipartUpload arguments, e.g. ContentType
+        :return: dict with ETag, Size and Parts (number of parts, 0 for a single PutObject)
+        """
+        uploader = MultipartUploader(aws_registry.get_client(S3Utils.S3_RESOURCE_NAME), bucket_name, file_key,
+                                     part_size=part_size, multipart_threshold=multipart_threshold,
+                                     max_concurrency=max_concurrency, **extra_args)
+        return uploader.upload(data)
+
+    @staticmethod
+    def enable_object_cache(directory=DEFAULT_CACHE_DIRECTORY, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        """
+        Configure the local disk cache used by get_cached_object
+
+        :param directory: cache directory, e.g. under /tmp in lambda
+        :param max_bytes: max total size of cached objects, least recently used objects are evicted first
+        :return:
+        """
+        S3Utils._object_cache = S3ObjectCache(lambda: aws_registry.get_client(S3Utils.S3_RESOURCE_NAME),
+                                              directory=directory, max_bytes=max_bytes)
+
+    @staticmethod
+    def get_cached_object(bucket_name, file_key) -> CachedObject:
+        """
+        Get s3 object through the local disk cache, revalidated with its ETag on every call
+
+        An unchanged object costs a conditional request answered with 304 instead of a download. The cache is created
+        with default settings on first use unless enable_object_cache was called.
+
+        :param bucket_name:
+        :param file_key:
+        :return: CachedObject, readable as file, bytes or memory map, holds the cached file open until closed
+        """
+        if S3Utils._object_cache is None:
+            S3Utils.enable_object_cache()
+        return S3Utils._object_cache.get(bucket_name, file_key)
+
+    @staticmethod
+    def object_cache_stats() -> dict:
+        """
+        :return: dict with hits, misses, revalidations, evictions, bytes_saved and bytes_downloaded counters
+        """
+        return dict(S3Utils._object_cache.stats) if S3Utils._object_cache else {}
+
+    @staticmethod
+    def get_downloader(bucket_name, file_key, part_size=DEFAULT_PART_SIZE,
+                       max_concurrency=DEFAULT_MAX_CONCURRENCY) -> RangedDownloader:
+        """
+        Downloader fetching an s3 object as concurrent byte ranges, see RangedDownloader for destinations
+
+        :param bucket_name:
+        :param file_key:
+        :param part_size: number of bytes per range request
+        :param max_concurrency: max number of concurrent range requests
+        :return: RangedDownloader
+        """
+        return RangedDownloader(aws_registry.get_client(S3Utils.S3_RESOURCE_NAME), bucket_name, file_key,
+                                part_size=part_size, max_concurrency=max_concurrency)
+
+    @staticmethod
+    def download_bytes(bucket_name, file_key, **kwargs) -> bytearray:
+        """
+        Download an s3 object into memory, parts are fetched concurrently into one preallocated buffer
+
+        :param bucket_name:
+        :param file_key:
+        :param kwargs: part_size, max_concurrency
+        :return: object content
+        """
+        downloader = S3Utils.get_downloader(bucket_name, file_key, **kwargs)
+        buffer = bytearray(downloader.size)
+        downloader.download_into(buffer)
+        return buffer
+
+    @staticmethod
+    def download_file(bucket_name, file_key, path, **kwargs) -> int:
+        """
+        Download an s3 object into a file, parts are fetched concurrently and written at their offset
+
+        :param bucket_name:
+        :param file_key:
+        :param path: file path, overwritten
+        :param kwargs: part_size, max_concurrency
+        :return: number of bytes downloaded
+        """
+        return S3Utils.get_downloader(bucket_name, file_key, **kwargs).download_to_file(path)
+
+    @staticmethod
+    def download_mmap(bucket_name, file_key, path, **kwargs):
+        """
+        Download an s3 object into a memory mapped file, parts are fetched concurrently
+
+        :param bucket_name:
+        :param file_key:
+        :param path: file path, overwritten
+        :param kwargs: part_size, max_concurrency
+        :return: mmap.mmap, to be closed by the caller
+        """
+        return S3Utils.get_downloader(bucket_name, file_key, **kwargs).download_to_mmap(path)
+
+    @staticmethod
+    def iter_lines(bucket_name, file_key, keepends=False, **kwargs):
+        """
+        Stream the lines of an s3 object, parts are prefetched concurrently in object order
+
+        :param bucket_name:
+        :param file_key:
+        :param keepends: keep line endings
+        :param kwargs: part_size, max_concurrency
+        :return: generator of bytes
+        """
+        return S3Utils.get_downloader(bucket_name, file_key, **kwargs).iter_lines(keepends=keepends)
@@ -0,0 +1,289 @@
+import hashlib
+import io
+import json
+import mmap
+import os
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+
+from botocore.exceptions import ClientError
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'ie_utils_s3_cache')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class CachedObject:
+    """
+    File backed s3 object, served from the local cache
+
+    The cached file is opened when the object is handed out, so it stays readable when the cache evicts or replaces
+    it. close() releases the file, otherwise it is closed when the object is garbage collected.
+    """
+
+    def __init__(self, bucket_name, file_key, path, etag, size, file):
+        self.bucket_name = bucket_name
+        self.file_key = file_key
+        self.path = path
+        self.etag = etag
+        self.size = size
+        self._file = file
+
+    def open(self):
+        """
+        :return: binary file object with its own position, to be closed by the caller
+        """
+        return io.BufferedReader(_FileReader(self._file.fileno(), self.size))
+
+    def read(self) -> bytes:
+        with self.open() as f:
+            return f.read()
+
+    def mmap(self):
+        """
+        :return: read only mmap.mmap of the cached file (b'' for an empty object), to be closed by the caller
+        """
+        if not self.size:
+            return b''
+        return mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _FileReader(io.RawIOBase):
+    """
+    Reads a shared file descriptor with pread, keeping its own position and leaving the descriptor open
+    """
+
+    def __init__(self, fd, size):
+        self._fd = fd
+        self._size = size
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = os.pread(self._fd, len(buffer), self._position)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+
+class S3ObjectCache:
+    """
+    Local disk cache of s3 objects, with ETag revalidation and size bounded LRU eviction
+
+    A cached object is revalidated on every get with a conditional GetObject (IfNoneMatch on the cached ETag), so an
+    unchanged object costs a 304 response instead of a transfer. The cache index is rebuilt from metadata files on
+    start, so the cache survives process restarts as long as the directory does (e.g. /tmp of a warm lambda container).
+    """
+
+    def __init__(self, get_client, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param get_client: callable returning the s3 client
+        :param directory: cache directory, created if missing
+        :param max_bytes: max total size of cached objects, least recently used objects are evicted first
+        """
+        self._get_client = get_client
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        self.stats = Counter()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @property
+    def size(self) -> int:
+        return sum(it['size'] for it in self._index.values())
+
+    def get(self, bucket_name, file_key) -> CachedObject:
+        """
+        Get an object through the cache
+
+        :param bucket_name:
+        :param file_key:
+        :return: CachedObject
+        """
+        name = self._name(bucket_name, file_key)
+        with self._lock:
+            meta = self._index.get(name)
+        if meta and not os.path.exists(self._path(name)):
+            meta = None
+
+        client = self._get_client()
+        response = None
+        if meta:
+            self._count('revalidations')
+            try:
+                response = client.get_object(Bucket=bucket_name, Key=file_key, IfNoneMatch=meta['etag'])
+            except ClientError as e:
+                if not _not_modified(e):
+                    raise
+                file = self._open_cached(name, meta)
+                if file:
+                    return self._cached_object(name, meta, file)
+        if response is None:
+            # not cached, or evicted or replaced since the revalidation
+            response = client.get_object(Bucket=bucket_name, Key=file_key)
+
+        meta = {'bucket': bucket_name, 'key': file_key, 'etag': response['ETag']}
+        file, tmp_path, meta['size'] = self._download(response['Body'])
+        try:
+            with self._lock:
+                self._commit(name, tmp_path, meta)
+                self.stats['misses'] += 1
+                self.stats['bytes_downloaded'] += meta['size']
+                self._index[name] = meta
+                self._index.move_to_end(name)
+                self._evict(keep=name)
+        except BaseException:
+            file.close()
+            self._remove_file(tmp_path)
+            raise
+        return self._cached_object(name, meta, file)
+
+    def invalidate(self, bucket_name, file_key):
+        name = self._name(bucket_name, file_key)
+        with self._lock:
+            self._index.pop(name, None)
+            self._remove(name)
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def _download(self, body):
+        """
+        Write an object body to a temporary file of the cache directory
+
+        :return: (file open for reading, temporary path, size)
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, prefix='.tmp-')
+        file = os.fdopen(fd, 'w+b')
+        size = 0
+        try:
+            chunk = body.read(READ_CHUNK_SIZE)
+            while chunk:
+                file.write(chunk)
+                size += len(chunk)
+                chunk = body.read(READ_CHUNK_SIZE)
+            file.flush()
+        except BaseException:
+            file.close()
+            self._remove_file(tmp_path)
+            raise
+        return file, tmp_path, size
+
+    def _commit(self, name, tmp_path, meta):
+        # the metadata goes first and comes back last, so a crash never pairs data with the metadata of another version
+        self._remove_file(self._path(name) + '.meta')
+        os.replace(tmp_path, self._path(name))
+        fd, meta_tmp_path = tempfile.mkstemp(dir=self._directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(meta, f)
+            os.replace(meta_tmp_path, self._path(name) + '.meta')
+        except BaseException:
+            self._remove_file(meta_tmp_path)
+            self._index.pop(name, None)
+            self._remove(name)
+            raise
+
+    def _open_cached(self, name, meta):
+        """
+        Open a cached file unless it was evicted or replaced, files are only removed or replaced under the lock
+
+        :return: file open for reading, None if not cached anymore
+        """
+        with self._lock:
+            if self._index.get(name) is not meta:
+                return None
+            try:
+                file = open(self._path(name), 'rb')
+            except FileNotFoundError:
+                return None
+            self._index.move_to_end(name)
+            self.stats['hits'] += 1
+            self.stats['bytes_saved'] += meta['size']
+        # the modification time keeps the lru order across restarts
+        os.utime(file.fileno())
+        return file
+
+    def _evict(self, keep):
+        total = self.size
+        for name in list(self._index):
+            if total <= self._max_bytes:
+                return
+            if name == keep:
+                continue
+            total -= self._index.pop(name)['size']
+            self._remove(name)
+            self.stats['evictions'] += 1
+
+    def _remove(self, name):
+        for path in (self._path(name), self._path(name) + '.meta'):
+            self._remove_file(path)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _load_index(self):
+        entries = []
+        for file_name in os.listdir(self._directory):
+            if file_name.startswith('.tmp-'):
+                self._remove(file_name)
+            if not file_name.endswith('.meta'):
+                if not os.path.exists(self._path(file_name) + '.meta'):
+                    # data of an interrupted store
+                    self._remove_file(self._path(file_name))
+                continue
+            name = file_name[:-len('.meta')]
+            try:
+                with open(self._path(name) + '.meta') as f:
+                    meta = json.load(f)
+                entries.append((os.path.getmtime(self._path(name)), name, meta))
+            except (OSError, ValueError):
+                self._remove(name)
+        for _, name, meta in sorted(entries):
+            self._index[name] = meta
+        self._evict(keep=None)
+
+    def _cached_object(self, name, meta, file):
+        return CachedObject(meta['bucket'], meta['key'], self._path(name), meta['etag'], meta['size'], file)
+
+    def _path(self, name):
+        return os.path.join(self._directory, name)
+
+    @staticmethod
+    def _name(bucket_name, file_key):
+        return hashlib.sha256(f'{bucket_name}/{file_key}'.encode('utf-8')).hexdigest()
+
+
+def _not_modified(error):
+    return (error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304 or
+            error.response.get('Error', {}).get('Code') in ('304', 'NotModified'))
@@ -0,0 +1,341 @@
+import mmap
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+from ie_utils.retry import backoff_delay
+
+MB = 1024 * 1024
+DEFAULT_PART_SIZE = 8 * MB
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_UPLOAD_CONCURRENCY = 4
+DEFAULT_MAX_ATTEMPTS = 5
+MIN_PART_SIZE = 5 * MB
+MAX_PARTS = 10000
+READ_CHUNK_SIZE = MB
+# transient errors of a part upload, access or missing upload errors are final
+RETRYABLE_ERROR_CODES = {'InternalError', 'ServiceUnavailable', 'SlowDown', 'RequestTimeout', 'RequestTimeTooSkewed',
+                         'BadDigest', 'IncompleteBody'}
+
+
+class ObjectChangedError(Exception):
+    """
+    Raised when an s3 object changes (different ETag) while its parts are transferred
+    """
+
+    def __init__(self, bucket_name, file_key):
+        super().__init__(f'Object {file_key} in bucket {bucket_name} changed during download')
+        self.bucket_name = bucket_name
+        self.file_key = file_key
+
+
+class RangedDownloader:
+    """
+    Downloads an s3 object as concurrent byte range requests
+
+    Every range request is conditional on the ETag read at start (IfMatch), so parts of different versions of an
+    object are never mixed; an object changing during the download raises ObjectChangedError. Parts are streamed in
+    chunks straight into their destination (buffer, file or memory map), without holding a whole part in memory.
+    """
+
+    def __init__(self, client, bucket_name, file_key, part_size=DEFAULT_PART_SIZE,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        :param client: s3 client, shared by all download threads
+        :param bucket_name:
+        :param file_key:
+        :param part_size: number of bytes per range request
+        :param max_concurrency: max number of concurrent range requests
+        """
+        self._client = client
+        self.bucket_name = bucket_name
+        self.file_key = file_key
+        self._part_size = part_size
+        self._max_concurrency = max_concurrency
+        head = client.head_object(Bucket=bucket_name, Key=file_key)
+        self.size = head['ContentLength']
+        self.etag = head['ETag']
+
+    @property
+    def ranges(self) -> list:
+        """
+        (start, end) byte offsets of the parts, end exclusive
+        """
+        return [(start, min(start + self._part_size, self.size)) for start in range(0, self.size, self._part_size)]
+
+    def download_into(self, buffer) -> int:
+        """
+        Download into a writable buffer of exactly the object size (bytearray, memoryview, mmap)
+
+        :param buffer: writable buffer
+        :return: number of bytes downloaded
+        """
+        view = memoryview(buffer).cast('B')
+        if len(view) != self.size:
+            raise ValueError(f'Buffer size {len(view)} does not match object size {self.size}')
+
+        def download_part(part_range):
+            start, end = part_range
+            self._read_into(self._get_range(start, end), view[start:end])
+
+        self._for_each_part(download_part)
+        return self.size
+
+    def download_to_file(self, path) -> int:
+        """
+        Download into a file, parts are written at their offset as they arrive
+
+        :param path: file path, overwritten
+        :return: number of bytes downloaded
+        """
+        with open(path, 'wb') as f:
+            f.truncate(self.size)
+            fd = f.fileno()
+
+            def download_part(part_range):
+                start, end = part_range
+                body = self._get_range(start, end)
+                offset = start
+                chunk = body.read(READ_CHUNK_SIZE)
+                while chunk:
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+                    chunk = body.read(READ_CHUNK_SIZE)
+                if offset != end:
+                    raise IOError(f'Incomplete part {start}-{end} of {self.file_key}, got {offset - start} bytes')
+
+            self._for_each_part(download_part)
+        return self.size
+
+    def download_to_mmap(self, path) -> mmap.mmap:
+        """
+        Download into a memory mapped file
+
+        :param path: file path, overwritten
+        :return: writable memory map of the file, to be closed by the caller
+        """
+        if not self.size:
+            raise ValueError(f'Object {self.file_key} is empty and cannot be memory mapped')
+        with open(path, 'wb+') as f:
+            f.truncate(self.size)
+            memory_map = mmap.mmap(f.fileno(), self.size)
+        try:
+            self.download_into(memory_map)
+        except Exception:
+            memory_map.close()
+            raise
+        return memory_map
+
+    def iter_parts(self):
+        """
+        Parts in object order, downloaded up to max_concurrency parts ahead of the consumer
+
+        :return: generator of bytes
+        """
+        with ThreadPoolExecutor(max_workers=self._max_concurrency, thread_name_prefix='ie-utils-s3-get') as executor:
+            ranges = iter(self.ranges)
+            pending = deque()
+            try:
+                for part_range in ranges:
+                    pending.append(executor.submit(self._get_part, *part_range))
+                    if len(pending) >= self._max_concurrency:
+                        break
+                while pending:
+                    part = pending.popleft().result()
+                    next_range = next(ranges, None)
+                    if next_range:
+                        pending.append(executor.submit(self._get_part, *next_range))
+                    yield part
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def iter_lines(self, keepends=False):
+        """
+        Lines of the object, split across part boundaries
+
+        :param keepends: keep line endings
+        :return: generator of bytes
+        """
+        remainder = b''
+        for part in self.iter_parts():
+            lines = (remainder + part).splitlines(keepends=True)
+            # a trailing '\r' may be the first half of a '\r\n' split across parts
+            remainder = lines.pop() if lines and not lines[-1].endswith(b'\n') else b''
+            for line in lines:
+                yield line if keepends else line.rstrip(b'\r\n')
+        if remainder:
+            yield remainder if keepends else remainder.rstrip(b'\r\n')
+
+    def _for_each_part(self, download_part):
+        ranges = self.ranges
+        if len(ranges) == 1:
+            download_part(ranges[0])
+            return
+        with ThreadPoolExecutor(max_workers=self._max_concurrency, thread_name_prefix='ie-utils-s3-get') as executor:
+            for _ in executor.map(download_part, ranges):
+                pass
+
+    def _get_part(self, start, end):
+        view = memoryview(bytearray(end - start))
+        self._read_into(self._get_range(start, end), view)
+        return view.obj
+
+    def _get_range(self, start, end):
+        try:
+            response = self._client.get_object(Bucket=self.bucket_name, Key=self.file_key,
+                                               Range=f'bytes={start}-{end - 1}', IfMatch=self.etag)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('PreconditionFailed', '412'):
+                raise ObjectChangedError(self.bucket_name, self.file_key) from e
+            raise
+        if response.get('ETag', self.etag) != self.etag:
+            raise ObjectChangedError(self.bucket_name, self.file_key)
+        return response['Body']
+
+    def _read_into(self, body, view):
+        position = 0
+        while position < len(view):
+            chunk = body.read(min(READ_CHUNK_SIZE, len(view) - position))
+            if not chunk:
+                raise IOError(f'Incomplete part of {self.file_key}, got {position} of {len(view)} bytes')
+            view[position:position + len(chunk)] = chunk
+            position += len(chunk)
+
+
+def iter_chunks(data, part_size):
+    """
+    Split bytes, a file object or an iterable of byte chunks into parts of part_size bytes (the last one smaller)
+
+    :param data: bytes-like object, object with a read method, or iterable of bytes-like chunks
+    :param part_size: number of bytes per part
+    :return: generator of bytes
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data).cast('B')
+        for start in range(0, len(view), part_size):
+            yield bytes(view[start:start + part_size])
+        return
+
+    chunks = iter(lambda: data.read(part_size), b'') if hasattr(data, 'read') else data
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= part_size:
+            yield bytes(buffer[:part_size])
+            del buffer[:part_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+class MultipartUploader:
+    """
+    Uploads bytes, a file object or a stream of chunks to s3
+
+    Data up to multipart_threshold bytes is sent with a single PutObject. Larger data is sent as a multipart upload,
+    with up to max_concurrency parts in flight, so memory use stays around part_size * (max_concurrency + 1) whatever
+    the object size. Failed parts are retried with backoff; when a part keeps failing the multipart upload is aborted.
+    """
+
+    def __init__(self, client, bucket_name, file_key, part_size=DEFAULT_PART_SIZE, multipart_threshold=None,
+                 max_concurrency=DEFAULT_UPLOAD_CONCURRENCY, max_attempts=DEFAULT_MAX_ATTEMPTS, **extra_args):
+        """
+        :param client: s3 client, shared by all upload threads
+        :param bucket_name:
+        :param file_key:
+        :param part_size: number of bytes per part, at least 5 MB
+        :param multipart_threshold: max number of bytes sent with a single PutObject, defaults to part_size
+        :param max_concurrency: max number of parts uploaded (and held in memory) at the same time
+        :param max_attempts: max number of attempts per part
+        :param extra_args: additional PutObject / CreateMultipartUpload arguments, e.g. ContentType
+        """
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f'Part size must be at least {MIN_PART_SIZE} bytes')
+        self._client = client
+        self.bucket_name = bucket_name
+        self.file_key = file_key
+        self._part_size = part_size
+        self._multipart_threshold = multipart_threshold or part_size
+        self._max_concurrency = max_concurrency
+        self._max_attempts = max_attempts
+        self._extra_args = extra_args
+
+    def upload(self, data) -> dict:
+        """
+        :param data: bytes-like object, object with a read method, or iterable of bytes-like chunks
+        :return: dict with ETag, Size and Parts (number of parts, 0 for a single PutObject)
+        """
+        parts = iter_chunks(data, self._part_size)
+        head, size = [], 0
+        for part in parts:
+            head.append(part)
+            size += len(part)
+            if size > self._multipart_threshold:
+                break
+        else:
+            response = self._client.put_object(Bucket=self.bucket_name, Key=self.file_key, Body=b''.join(head),
+                                               **self._extra_args)
+            return {'ETag': response.get('ETag'), 'Size': size, 'Parts': 0}
+
+        upload_id = self._client.create_multipart_upload(Bucket=self.bucket_name, Key=self.file_key,
+                                                         **self._extra_args)['UploadId']
+        try:
+            completed_parts, size = self._upload_parts(upload_id, _chain(head, parts))
+            response = self._client.complete_multipart_upload(
+                Bucket=self.bucket_name, Key=self.file_key, UploadId=upload_id,
+                MultipartUpload={'Parts': completed_parts}
+            )
+        except BaseException:
+            self._client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.file_key, UploadId=upload_id)
+            raise
+        return {'ETag': response.get('ETag'), 'Size': size, 'Parts': len(completed_parts)}
+
+    def _upload_parts(self, upload_id, parts):
+        in_flight = threading.BoundedSemaphore(self._max_concurrency)
+        futures = []
+        size = 0
+        with ThreadPoolExecutor(max_workers=self._max_concurrency, thread_name_prefix='ie-utils-s3-put') as executor:
+            for part_number, part in enumerate(parts, start=1):
+                if part_number > MAX_PARTS:
+                    raise ValueError(f'Object {self.file_key} needs more than {MAX_PARTS} parts, increase part size')
+                in_flight.acquire()
+                if any(it.done() and it.exception() for it in futures):
+                    in_flight.release()
+                    break
+                size += len(part)
+                future = executor.submit(self._upload_part, upload_id, part_number, part)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+            completed_parts = [future.result() for future in futures]
+        return completed_parts, size
+
+    def _upload_part(self, upload_id, part_number, part):
+        for attempt in range(self._max_attempts):
+            try:
+                response = self._client.upload_part(Bucket=self.bucket_name, Key=self.file_key, UploadId=upload_id,
+                                                    PartNumber=part_number, Body=part)
+                return {'PartNumber': part_number, 'ETag': response['ETag']}
+            except Exception as e:
+                if not is_retryable(e) or attempt + 1 == self._max_attempts:
+                    raise
+                time.sleep(backoff_delay(attempt, base_delay=0.2))
+
+
+def is_retryable(exc) -> bool:
+    """
+    :return: True for connection errors, 5xx responses and the error codes of RETRYABLE_ERROR_CODES
+    """
+    if not isinstance(exc, ClientError):
+        return isinstance(exc, (BotoConnectionError, HTTPClientError))
+    status_code = exc.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+    return exc.response.get('Error', {}).get('Code') in RETRYABLE_ERROR_CODES or status_code >= 500
+
+
+def _chain(head, tail):
+    yield from head
+    head.clear()
+    yield from tail
@@ -0,0 +1,139 @@
+import hashlib
+import math
+import threading
+import time
+from collections import Counter
+from decimal import Context, Decimal
+
+from ie_utils.dynamodb_batch import key_id
+
+# dynamo db numbers have up to 38 significant digits
+_NUMBER_CONTEXT = Context(prec=38)
+
+
+class BloomFilter:
+    """
+    Fixed size bloom filter of byte strings
+
+    Sized for capacity values at the given false positive rate; adding more values raises the rate.
+    """
+
+    def __init__(self, capacity, error_rate):
+        """
+        :param capacity: number of values the filter is sized for
+        :param error_rate: false positive rate once capacity values were added, e.g. 0.001
+        """
+        if not 0 < error_rate < 1:
+            raise ValueError(f'error_rate must be between 0 and 1, got {error_rate}')
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+        self.count = 0
+
+    def __contains__(self, value: bytes) -> bool:
+        return all(self._bits[i >> 3] & (1 << (i & 7)) for i in self._positions(value))
+
+    def add(self, value: bytes) -> bool:
+        """
+        :return: True if the value was not in the filter yet
+        """
+        added = False
+        for i in self._positions(value):
+            mask = 1 << (i & 7)
+            if not self._bits[i >> 3] & mask:
+                self._bits[i >> 3] |= mask
+                added = True
+        self.count += added
+        return added
+
+    def _positions(self, value):
+        # double hashing, the k positions are h1 + i * h2
+        digest = hashlib.blake2b(value, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self._size for i in range(self._hashes)]
+
+
+class SeenKeyFilter:
+    """
+    In-process filter of recently written dynamo db keys, to reject replays without a dynamo db call
+
+    Keys are kept in two bloom filter generations: when the current one holds capacity keys (or is older than ttl)
+    it replaces the previous one, so memory stays bounded and the filter remembers at least the last capacity keys.
+    A key never written can be reported as seen with probability at most error_rate; a written key is always
+    reported as seen while its generation is kept.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001, ttl=None, clock=time.monotonic):
+        """
+        :param capacity: number of keys per generation
+        :param error_rate: max false positive rate, split between the two generations
+        :param ttl: max age of a generation in seconds, None for no limit
+        :param clock: monotonic clock
+        """
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._previous = None
+        self._current = self._generation()
+        self._started_at = clock()
+        self.stats = Counter()
+
+    def seen(self, table_name, key) -> bool:
+        """
+        :param table_name: dynamo db table name
+        :param key: key dict
+        :return: True if the key was (probably) added recently
+        """
+        value = _value(table_name, key)
+        with self._lock:
+            self._expire()
+            seen = value in self._current or (self._previous is not None and value in self._previous)
+        self.stats['hits' if seen else 'misses'] += 1
+        return seen
+
+    def add(self, table_name, key):
+        value = _value(table_name, key)
+        with self._lock:
+            self._expire()
+            if self._current.count >= self._capacity:
+                self._rotate()
+            self._current.add(value)
+
+    def clear(self):
+        with self._lock:
+            self._previous = None
+            self._current = self._generation()
+            self._started_at = self._clock()
+
+    def _expire(self):
+        if self._ttl is not None and self._clock() - self._started_at >= self._ttl:
+            self._rotate()
+
+    def _rotate(self):
+        self._previous, self._current = self._current, self._generation()
+        self._started_at = self._clock()
+        self.stats['rotations'] += 1
+
+    def _generation(self) -> BloomFilter:
+        # a key is looked up in both generations, each gets half of the false positive rate
+        return BloomFilter(self._capacity, self._error_rate / 2)
+
+
+def _value(table_name, key) -> bytes:
+    return repr((table_name, tuple((name, _canonical(value)) for name, value in key_id(key)))).encode('utf-8')
+
+
+def _canonical(value) -> tuple:
+    # dynamo db compares key values by type and value: 1, 1.0 and Decimal('1') are the same key, '1' is another one
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        number = Decimal(str(value)).normalize(_NUMBER_CONTEXT)
+        return 'N', str(number) if number else '0'
+    if isinstance(value, str):
+        return 'S', value
+    # bytes, bytearray or boto3's Binary
+    return 'B', bytes(value)
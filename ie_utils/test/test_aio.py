@@ -0,0 +1,166 @@
+import asyncio
+import io
+import json
+import threading
+from unittest import TestCase
+
+import mock
+from botocore.awsrequest import AWSResponse
+from botocore.response import StreamingBody
+
+from ie_utils import AsyncDynamoDBUtils, AsyncS3Utils
+from ie_utils import aio
+from ie_utils.constants import DYNAMO_DB_CONFIG_VAR_NAME
+from ie_utils.logging_utils import log_context, _log_context
+from ie_utils.registry import AwsRegistry
+
+CONFIG = {'region_name': 'us-west-2', 'aws_access_key_id': 'local', 'aws_secret_access_key': 'local'}
+ENVIRON = {DYNAMO_DB_CONFIG_VAR_NAME: json.dumps(CONFIG), 'AWS_DEFAULT_REGION': 'us-west-2',
+           'AWS_ACCESS_KEY_ID': 'local', 'AWS_SECRET_ACCESS_KEY': 'local'}
+
+
+class SlowStub:
+    """
+    before-call handler answering like botocore's Stubber after a delay, recording how many calls overlap
+
+    The first `overlap` calls wait until all of them are in flight, so a test fails if they cannot run concurrently.
+    """
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.barrier = None
+        self.overlap = 0
+        self.local = threading.local()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = []
+
+    def expect_overlap(self, calls):
+        self.barrier = threading.Barrier(calls, timeout=5)
+        self.overlap = calls
+
+    def register(self, registry):
+        registry.add_event_handler('before-parameter-build', self.capture_params, 'stub-params')
+        registry.add_event_handler('before-call', self, 'slow-stub')
+
+    def capture_params(self, params, **kwargs):
+        self.local.params = params
+
+    def __call__(self, model, **kwargs):
+        params = self.local.params
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.calls.append((model.name, params))
+            wait_for_others = len(self.calls) <= self.overlap
+        try:
+            if wait_for_others:
+                self.barrier.wait()
+            threading.Event().wait(self.delay)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        return AWSResponse(None, 200, {}, None), self.response(model.name, params)
+
+    def response(self, operation_name, params):
+        if operation_name == 'GetItem':
+            return {'Item': {'identifier': params['Key']['identifier']}}
+        if operation_name == 'Scan':
+            return {'Items': [{'identifier': {'S': str(i)}} for i in range(5)]}
+        if operation_name == 'GetObject':
+            return {'Body': StreamingBody(io.BytesIO(b'content'), 7)}
+        return {}
+
+
+class TestAsyncFacade(TestCase):
+    def setUp(self):
+        self.registry = AwsRegistry()
+        self.stub = SlowStub()
+        self.stub.register(self.registry)
+        for target in ('ie_utils.dynamodb.aws_registry', 'ie_utils.s3.aws_registry'):
+            patcher = mock.patch(target, self.registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict('os.environ', ENVIRON)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.executor = aio.configure_executor(max_workers=32, limits={'dynamodb': 8, 's3': 4})
+        self.addCleanup(aio.configure_executor)
+
+    def test_concurrent_item_reads_overlap(self):
+        self.stub.expect_overlap(8)
+
+        async def read_all():
+            return await asyncio.gather(*(
+                AsyncDynamoDBUtils.get_item_by_search_key('table', {'identifier': str(i)}) for i in range(32)))
+
+        items = asyncio.run(read_all())
+
+        self.assertEqual([{'identifier': str(i)} for i in range(32)], items)
+        self.assertEqual(8, self.stub.max_in_flight)
+
+    def test_service_limits_are_separate(self):
+        self.stub.expect_overlap(12)
+
+        async def fan_out():
+            await asyncio.gather(
+                *(AsyncS3Utils.get_object_bytes('bucket', f'key{i}') for i in range(8)),
+                *(AsyncDynamoDBUtils.put_item('table', {'identifier': str(i)}) for i in range(8)))
+
+        asyncio.run(fan_out())
+
+        self.assertEqual(12, self.stub.max_in_flight)
+
+    def test_get_and_put_object(self):
+        async def get_and_put():
+            content = await AsyncS3Utils.get_object_bytes('bucket', 'key')
+            await AsyncS3Utils.put_object('bucket', 'copy', content)
+            return content
+
+        self.assertEqual(b'content', asyncio.run(get_and_put()))
+        self.assertEqual(('PutObject', 'copy'), (self.stub.calls[-1][0], self.stub.calls[-1][1]['Key']))
+
+    def test_timeout(self):
+        self.stub.delay = 1
+
+        async def read():
+            await AsyncDynamoDBUtils.get_item_by_search_key('table', {'identifier': 'id'}, timeout=0.05)
+
+        self.assertRaises(asyncio.TimeoutError, asyncio.run, read())
+
+    def test_cancelled_calls_waiting_for_a_slot_never_run(self):
+        async def cancel():
+            tasks = [asyncio.ensure_future(AsyncDynamoDBUtils.update_item('table', Key={'identifier': str(i)}))
+                     for i in range(16)]
+            await asyncio.sleep(0.02)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # slots are released once the running calls return
+            await AsyncDynamoDBUtils.put_item('table', {'identifier': 'after'})
+
+        asyncio.run(cancel())
+
+        updated = [params['Key']['identifier']['S'] for name, params in self.stub.calls if name == 'UpdateItem']
+        # calls that had a slot may already be running, the others never start
+        self.assertTrue(set(updated) <= {str(i) for i in range(8)})
+        self.assertIn('PutItem', [it[0] for it in self.stub.calls])
+        self.assertLessEqual(self.stub.max_in_flight, 8)
+
+    def test_scan_items(self):
+        async def scan():
+            return [it async for it in AsyncDynamoDBUtils.scan_items('table', batch_size=2, max_items=5)]
+
+        self.assertEqual([{'identifier': str(i)} for i in range(5)], asyncio.run(scan()))
+
+    def test_log_context_passed_to_threads(self):
+        contexts = []
+
+        async def call():
+            with log_context(event_id='event'):
+                await self.executor.run('dynamodb', lambda: contexts.append(_log_context.get()))
+
+        asyncio.run(call())
+
+        self.assertEqual([{'event_id': 'event'}], contexts)
@@ -0,0 +1,100 @@
+import json
+from unittest import TestCase
+
+import mock
+
+from ie_utils import DynamoDBUtils
+from ie_utils.call_logging import LazyPayload, log_calls, to_repr, truncate
+
+
+class TestLazyPayload(TestCase):
+    def test_rendered_once(self):
+        value = {'args': (1, 'a'), 'result': {'date': object()}}
+        payload = LazyPayload(value)
+
+        rendered = str(payload)
+
+        self.assertEqual([1, 'a'], json.loads(rendered)['args'])
+        self.assertIs(rendered, str(payload))
+
+    def test_truncate(self):
+        self.assertEqual('abc', truncate('abc', 3))
+        self.assertEqual('ab...[1 more characters]', truncate('abc', 2))
+        self.assertEqual('abc', truncate('abc', None))
+        self.assertEqual('"a...[10 more characters]', str(LazyPayload('a' * 10, max_size=2)))
+
+    def test_not_truncated_by_default(self):
+        self.assertEqual(json.dumps('a' * 10000), str(LazyPayload('a' * 10000)))
+
+    def test_repr_format(self):
+        payload = LazyPayload({'args': (1,), 'result': {'a': 1}}, render=to_repr)
+
+        self.assertEqual(str({'args': [1], 'result': '{"a": 1}'}), str(payload))
+
+
+class TestLogCalls(TestCase):
+    def setUp(self):
+        self.entries = []
+
+    def log(self, table_name, table_key, description, log_object):
+        self.entries.append((table_name, table_key, description, json.loads(str(log_object))))
+
+    def test_request_and_response(self):
+        wrapper = log_calls(lambda a, b=2: a + b, self.log, 'table', 'key')
+
+        self.assertEqual(3, wrapper(1, b=2))
+
+        self.assertEqual([
+            ('table', 'key', 'function <lambda> request', {'signature': '(a, b=2)', 'args': [1], 'kwargs': {'b': 2}}),
+            ('table', 'key', 'function <lambda> response', {'args': [1], 'result': 3}),
+        ], self.entries)
+
+    def test_sampling(self):
+        samples = iter([0.5, 0.05])
+        wrapper = log_calls(lambda: 1, self.log, 'table', 'key', sample_rate=0.1, sample=lambda: next(samples))
+
+        wrapper()
+        self.assertEqual([], self.entries)
+        wrapper()
+        self.assertEqual(2, len(self.entries))
+
+    def test_errors_logged_when_not_sampled(self):
+        def fail(value):
+            raise ValueError(value)
+
+        wrapper = log_calls(fail, self.log, 'table', lambda value: f'key-{value}', sample_rate=0)
+
+        self.assertRaises(ValueError, wrapper, 1)
+        self.assertEqual([('table', 'key-1', 'function fail error', {'args': [1], 'kwargs': {},
+                                                                    'error': 'ValueError(1)'})], self.entries)
+
+    def test_method(self):
+        test = self
+
+        class Test:
+            @DynamoDBUtils.logged('table', 'key')
+            def test(self, value):
+                test.assertIsInstance(self, Test)
+                return value
+
+        with mock.patch('ie_utils.DynamoDBUtils.log', side_effect=self.log):
+            self.assertEqual(1, Test().test(1))
+
+        self.assertEqual('(self, value)', self.entries[0][3]['signature'])
+        self.assertEqual([1], self.entries[0][3]['args'])
+        self.assertEqual('test', Test.test.__name__)
+
+
+class TestLazyLogEntries(TestCase):
+    @mock.patch('ie_utils.DynamoDBUtils.update_item')
+    def test_buffered_payload_rendered_by_writer(self, update_item_mock):
+        DynamoDBUtils.enable_log_buffering(flush_interval=60)
+        try:
+            payload = LazyPayload({'result': 1})
+            DynamoDBUtils.log('table', 'key', 'description', payload)
+            DynamoDBUtils.flush_logs(5)
+        finally:
+            DynamoDBUtils.disable_log_buffering()
+
+        entry = update_item_mock.call_args[1]['ExpressionAttributeValues'][':add_value'][0]
+        self.assertEqual('{"result": 1}', entry['log_object'])
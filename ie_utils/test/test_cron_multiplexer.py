@@ -0,0 +1,132 @@
+import json
+from unittest import TestCase
+
+import mock
+
+from ie_utils import dispatch_cron_jobs, enable_cron_multiplexer, register_cron_job, unregister_cron_job
+from ie_utils import cloudwatch
+from ie_utils.cron_multiplexer import CronMultiplexer, schedule_rule_name
+
+
+class FakeJobsTable:
+    """
+    Jobs table keyed by (schedule, job_id), paging query results
+    """
+
+    def __init__(self, page_size=2):
+        self.items = {}
+        self.page_size = page_size
+
+    def put_item(self, Item):
+        self.items[(Item['schedule'], Item['job_id'])] = Item
+
+    def delete_item(self, Key):
+        self.items.pop((Key['schedule'], Key['job_id']), None)
+
+    def query(self, KeyConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues,
+              ExclusiveStartKey=None):
+        schedule = ExpressionAttributeValues[':schedule']
+        items = [item for key, item in sorted(self.items.items()) if key[0] == schedule]
+        if ExclusiveStartKey:
+            items = [it for it in items if it['job_id'] > ExclusiveStartKey['job_id']]
+        if len(items) > self.page_size:
+            items = items[:self.page_size]
+            return {'Items': items, 'LastEvaluatedKey': {k: items[-1][k] for k in ('schedule', 'job_id')}}
+        return {'Items': items}
+
+
+class TestCronMultiplexer(TestCase):
+    def setUp(self):
+        self.table = FakeJobsTable()
+        self.clients = {'events': mock.Mock(), 'lambda': mock.Mock()}
+        self.clients['events'].put_rule.return_value = {'RuleArn': 'arn:aws:events:region:account:rule/Cron_x'}
+        self.clients['lambda'].get_function.return_value = {'Configuration': {'FunctionArn': 'DispatcherArn'}}
+        self.multiplexer = CronMultiplexer(self.clients.get, lambda table_name: self.table, 'dispatcher')
+
+    def test_register_shares_rule(self):
+        for i in range(3):
+            self.multiplexer.register('rate(1 hour)', 'function', {'body': i}, job_id=f'job{i}')
+        self.multiplexer.register('rate(1 day)', 'function', {}, job_id='daily')
+
+        self.assertEqual(2, self.clients['events'].put_rule.call_count)
+        self.assertEqual({
+            'Rule': schedule_rule_name('rate(1 hour)'),
+            'Targets': [{
+                'Id': schedule_rule_name('rate(1 hour)'),
+                'Arn': 'DispatcherArn',
+                'Input': '{"schedule": "rate(1 hour)"}'
+            }]
+        }, self.clients['events'].put_targets.call_args_list[0][1])
+        self.clients['lambda'].add_permission.assert_called_once_with(
+            FunctionName='dispatcher',
+            StatementId='ie-utils-cron-multiplexer',
+            Action='lambda:InvokeFunction',
+            SourceArn='arn:aws:events:region:account:rule/Cron_*',
+            Principal='events.amazonaws.com'
+        )
+        self.assertEqual(4, len(self.table.items))
+
+    def test_unregister(self):
+        job_id = self.multiplexer.register('rate(1 hour)', 'function', {})
+
+        self.multiplexer.unregister('rate(1 hour)', job_id)
+
+        self.assertEqual([], list(self.multiplexer.jobs('rate(1 hour)')))
+
+    def test_dispatch(self):
+        for i in range(5):
+            self.multiplexer.register('rate(1 hour)', 'function', {'body': i}, job_id=f'job{i}')
+        self.multiplexer.register('rate(1 day)', 'function', {}, job_id='daily')
+
+        result = self.multiplexer.dispatch({'schedule': 'rate(1 hour)'})
+
+        self.assertEqual({'schedule': 'rate(1 hour)', 'dispatched': 5, 'failed': 0}, result)
+        invocations = sorted(json.loads(it[1]['Payload'])['body']
+                             for it in self.clients['lambda'].invoke.call_args_list)
+        self.assertEqual([0, 1, 2, 3, 4], invocations)
+        self.assertEqual('Event', self.clients['lambda'].invoke.call_args[1]['InvocationType'])
+
+    def test_dispatch_failing_job(self):
+        self.multiplexer.register('rate(1 hour)', 'function', {}, job_id='ok')
+        self.multiplexer.register('rate(1 hour)', 'function', {}, job_id='failing')
+
+        def run(job):
+            if job['job_id'] == 'failing':
+                raise ValueError('failing')
+
+        self.assertEqual({'schedule': 'rate(1 hour)', 'dispatched': 1, 'failed': 1},
+                         self.multiplexer.dispatch({'schedule': 'rate(1 hour)'}, run=run))
+
+    def test_delete_schedule(self):
+        job_id = self.multiplexer.register('rate(1 hour)', 'function', {})
+
+        self.assertFalse(self.multiplexer.delete_schedule('rate(1 hour)'))
+        self.multiplexer.unregister('rate(1 hour)', job_id)
+        self.assertTrue(self.multiplexer.delete_schedule('rate(1 hour)'))
+
+        self.clients['events'].delete_rule.assert_called_once_with(Name=schedule_rule_name('rate(1 hour)'), Force=True)
+        self.multiplexer.register('rate(1 hour)', 'function', {})
+        self.assertEqual(2, self.clients['events'].put_rule.call_count)
+
+
+class TestCronJobFunctions(TestCase):
+    def tearDown(self):
+        cloudwatch._cron_multiplexer = None
+
+    def test_not_enabled(self):
+        self.assertRaises(ValueError, register_cron_job, 'rate(1 hour)', 'function', {})
+
+    @mock.patch('ie_utils.cloudwatch._get_table')
+    @mock.patch('ie_utils.cloudwatch.aws_registry')
+    def test_register_and_dispatch(self, aws_registry_mock, get_table_mock):
+        table = get_table_mock.return_value = FakeJobsTable()
+        aws_registry_mock.get_client('events').put_rule.return_value = {'RuleArn': 'arn:rule/Cron_x'}
+        enable_cron_multiplexer('dispatcher', table_name='jobs')
+
+        job_id = register_cron_job('rate(1 hour)', 'function', {'body': '{}'})
+        result = dispatch_cron_jobs({'schedule': 'rate(1 hour)'})
+        unregister_cron_job('rate(1 hour)', job_id)
+
+        self.assertEqual(1, result['dispatched'])
+        self.assertEqual({}, table.items)
+        get_table_mock.assert_called_with('jobs')
@@ -0,0 +1,198 @@
+import json
+import threading
+from unittest import TestCase
+
+import mock
+from botocore.exceptions import ClientError
+
+from ie_utils import create_cloud_watch_cron_rules, delete_cloud_watch_cron_rules, sweep_cloud_watch_cron_rules
+from ie_utils.cron_rules import CronRuleManager
+
+ARN_PREFIX = 'arn:aws:events:region:account:rule/'
+
+
+def client_error(code, operation_name):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation_name)
+
+
+class FakeEventsClient:
+    """
+    Events client keeping rules and targets in dicts, paging list results by 2
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rules = {}
+        self.targets = {}
+        self.conflicts = 0
+        self.throttle = False
+
+    def put_rule(self, Name, ScheduleExpression, State, Description):
+        with self.lock:
+            if self.throttle:
+                raise client_error('ThrottlingException', 'PutRule')
+            if self.conflicts:
+                self.conflicts -= 1
+                raise client_error('ConcurrentModificationException', 'PutRule')
+            self.rules[Name] = {'Name': Name, 'Arn': ARN_PREFIX + Name, 'ScheduleExpression': ScheduleExpression}
+        return {'RuleArn': ARN_PREFIX + Name}
+
+    def put_targets(self, Rule, Targets):
+        with self.lock:
+            self.targets.setdefault(Rule, {}).update({it['Id']: it for it in Targets})
+
+    def list_targets_by_rule(self, Rule, NextToken=None):
+        if Rule not in self.rules:
+            raise client_error('ResourceNotFoundException', 'ListTargetsByRule')
+        return page(list(self.targets.get(Rule, {}).values()), NextToken, 'Targets')
+
+    def remove_targets(self, Rule, Ids, Force):
+        with self.lock:
+            for target_id in Ids:
+                self.targets[Rule].pop(target_id)
+
+    def delete_rule(self, Name, Force):
+        with self.lock:
+            if self.targets.get(Name):
+                raise client_error('ValidationException', 'DeleteRule')
+            self.rules.pop(Name, None)
+
+    def list_rules(self, NamePrefix, NextToken=None):
+        return page([it for name, it in sorted(self.rules.items()) if name.startswith(NamePrefix)], NextToken, 'Rules')
+
+
+class FakeLambdaClient:
+    """
+    Lambda client keeping the resource policy statements of its functions
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statements = {}
+        self.get_function_calls = 0
+
+    def get_function(self, FunctionName):
+        self.get_function_calls += 1
+        return {'Configuration': {'FunctionArn': f'arn:aws:lambda:region:account:function:{FunctionName}'}}
+
+    def add_permission(self, FunctionName, StatementId, Action, SourceArn, Principal):
+        if FunctionName == 'failing':
+            raise client_error('PolicyLengthExceededException', 'AddPermission')
+        with self.lock:
+            self.statements.setdefault(FunctionName.split(':')[-1], {})[StatementId] = SourceArn
+
+    def remove_permission(self, FunctionName, StatementId):
+        with self.lock:
+            if StatementId not in self.statements.get(FunctionName.split(':')[-1], {}):
+                raise client_error('ResourceNotFoundException', 'RemovePermission')
+            del self.statements[FunctionName.split(':')[-1]][StatementId]
+
+    def get_policy(self, FunctionName):
+        statements = self.statements.get(FunctionName.split(':')[-1])
+        if not statements:
+            raise client_error('ResourceNotFoundException', 'GetPolicy')
+        return {'Policy': json.dumps({'Statement': [
+            {'Sid': sid, 'Condition': {'ArnLike': {'AWS:SourceArn': arn}}} for sid, arn in statements.items()]})}
+
+
+def page(values, token, field):
+    start = int(token or 0)
+    response = {field: values[start:start + 2]}
+    if start + 2 < len(values):
+        response['NextToken'] = str(start + 2)
+    return response
+
+
+def rule(i, function='function'):
+    return {'rule_name': f'Rule_{i}', 'statement_id': f'stmt{i}', 'cron_expression': 'rate(1 hour)',
+            'lambda_function': function, 'lambda_json_input': {'body': str(i)}, 'description': 'description'}
+
+
+class TestCronRuleManager(TestCase):
+    def setUp(self):
+        self.clients = {'events': FakeEventsClient(), 'lambda': FakeLambdaClient()}
+        self.manager = CronRuleManager(self.clients.get, max_workers=4)
+
+    def test_create_rules(self):
+        results = self.manager.create_rules(rule(i) for i in range(10))
+
+        self.assertEqual([(f'Rule_{i}', [f'stmt{i}'], None) for i in range(10)], results)
+        self.assertEqual(10, len(self.clients['events'].rules))
+        self.assertEqual(10, len(self.clients['lambda'].statements['function']))
+        self.assertEqual(1, self.clients['lambda'].get_function_calls)
+
+    @mock.patch('ie_utils.cron_rules.time.sleep')
+    def test_conflicting_calls_retried(self, sleep_mock):
+        self.clients['events'].conflicts = 3
+
+        results = self.manager.create_rules(rule(i) for i in range(4))
+
+        self.assertTrue(all(it.ok for it in results))
+        self.assertEqual(3, sleep_mock.call_count)
+
+    @mock.patch('ie_utils.cron_rules.time.sleep')
+    def test_throttled_calls_left_to_botocore(self, sleep_mock):
+        self.clients['events'].throttle = True
+
+        results = self.manager.create_rules([rule(0)])
+
+        self.assertEqual('ThrottlingException', results[0].error.response['Error']['Code'])
+        sleep_mock.assert_not_called()
+
+    def test_failed_rule_reported_and_rolled_back(self):
+        results = self.manager.create_rules([rule(0), rule(1, function='failing')])
+
+        self.assertTrue(results[0].ok)
+        self.assertEqual('PolicyLengthExceededException', results[1].error.response['Error']['Code'])
+        self.assertEqual(['Rule_0'], list(self.clients['events'].rules))
+
+    def test_delete_rules_with_paged_targets(self):
+        self.manager.create_rules(rule(i) for i in range(3))
+        self.clients['events'].put_targets('Rule_0', [{'Id': f'extra{i}', 'Arn': 'arn'} for i in range(4)])
+
+        results = self.manager.delete_rules(
+            [{'rule_name': f'Rule_{i}', 'statement_id': f'stmt{i}', 'function_name': 'function'} for i in range(3)])
+
+        self.assertTrue(all(it.ok for it in results))
+        self.assertEqual({}, self.clients['events'].rules)
+        self.assertEqual({}, self.clients['lambda'].statements['function'])
+
+    def test_delete_missing_rule(self):
+        result, = self.manager.delete_rules([{'rule_name': 'Rule_missing', 'statement_id': 'stmt',
+                                              'function_name': 'function'}])
+
+        self.assertTrue(result.ok)
+
+    def test_sweep(self):
+        self.manager.create_rules(rule(i) for i in range(5))
+        self.clients['events'].put_rule('Other_rule', 'rate(1 day)', 'ENABLED', '')
+
+        dry_run = self.manager.sweep(lambda it: it['Name'] != 'Rule_2', dry_run=True)
+        self.assertEqual(6, len(self.clients['events'].rules))
+        results = self.manager.sweep(lambda it: it['Name'] != 'Rule_2')
+
+        self.assertEqual(dry_run, results)
+        self.assertEqual([(f'Rule_{i}', [f'stmt{i}'], None) for i in (0, 1, 3, 4)], results)
+        self.assertEqual(['Other_rule', 'Rule_2'], sorted(self.clients['events'].rules))
+        self.assertEqual({'stmt2': ARN_PREFIX + 'Rule_2'}, self.clients['lambda'].statements['function'])
+
+
+class TestCronRuleFunctions(TestCase):
+    @mock.patch('ie_utils.cloudwatch.aws_registry')
+    def test_bulk_functions(self, aws_registry_mock):
+        clients = {'events': FakeEventsClient(), 'lambda': FakeLambdaClient()}
+        aws_registry_mock.get_client.side_effect = clients.get
+
+        created = create_cloud_watch_cron_rules(
+            {'cron_expression': 'rate(1 hour)', 'lambda_function': 'function', 'lambda_json_input': {'body': '{}'},
+             'description': 'description', 'attach_rule_data': True} for _ in range(3))
+        target, = clients['events'].targets[created[0].rule_name].values()
+        swept = sweep_cloud_watch_cron_rules(lambda it: it['Name'] == created[0].rule_name)
+        deleted = delete_cloud_watch_cron_rules(
+            {'rule_name': it.rule_name, 'statement_id': it.statement_ids[0], 'function_name': 'function'}
+            for it in created[1:])
+
+        self.assertEqual(created[0].rule_name, json.loads(json.loads(target['Input'])['body'])['cron_rule_name'])
+        self.assertEqual([created[0][:2]], [it[:2] for it in swept])
+        self.assertTrue(all(it.ok for it in deleted))
+        self.assertEqual({}, clients['events'].rules)
@@ -0,0 +1,221 @@
+import threading
+from types import SimpleNamespace
+from unittest import TestCase
+
+import mock
+from botocore.exceptions import ClientError
+from botocore.hooks import HierarchicalEmitter
+
+from ie_utils import DynamoDBUtils
+from ie_utils.dynamodb_batch import UnprocessedItemsError, UnprocessedKeysError, batch_get_items, \
+    batch_write_items, key_id, unique_keys
+from ie_utils.retry import backoff_delay
+
+
+class FakeResource:
+    """
+    Dynamo db resource holding items with even ids, leaving the last key of every first request unprocessed
+    """
+
+    def __init__(self, unprocessed=True):
+        self.requests = []
+        self.unprocessed = unprocessed
+        self.lock = threading.Lock()
+
+    def batch_get_item(self, RequestItems):
+        with self.lock:
+            self.requests.append(RequestItems)
+        request = RequestItems['table']
+        keys = request['Keys']
+        unprocessed = keys[-1:] if self.unprocessed and len(keys) > 1 else []
+        items = [dict(key, data=key['id'] * 2) for key in keys[:len(keys) - len(unprocessed)] if key['id'] % 2 == 0]
+        response = {'Responses': {'table': items}}
+        if unprocessed:
+            response['UnprocessedKeys'] = {'table': dict(request, Keys=unprocessed)}
+        return response
+
+
+@mock.patch('ie_utils.dynamodb_batch.time.sleep')
+class TestBatchGetItems(TestCase):
+    def test_batch_get_items(self, sleep_mock):
+        resource = FakeResource()
+        keys = [{'id': i} for i in range(250)]
+
+        result = batch_get_items(lambda: resource, 'table', keys)
+
+        self.assertEqual([key_id(key) for key in keys], list(result))
+        self.assertEqual({'id': 4, 'data': 8}, result[key_id({'id': 4})])
+        self.assertIsNone(result[key_id({'id': 5})])
+        self.assertEqual({'id': 248, 'data': 496}, result[key_id({'id': 248})])
+        self.assertEqual([100, 100, 50], sorted((len(it['table']['Keys']) for it in resource.requests
+                                                 if len(it['table']['Keys']) > 1), reverse=True))
+        self.assertEqual(3, sleep_mock.call_count)
+
+    def test_batch_get_items_projection(self, sleep_mock):
+        resource = FakeResource(unprocessed=False)
+
+        batch_get_items(lambda: resource, 'table', [{'id': 1}, {'id': 2}], projection=['data'])
+
+        self.assertEqual({'#proj0': 'data', '#proj1': 'id'}, resource.requests[0]['table']['ExpressionAttributeNames'])
+
+    def test_batch_get_items_unprocessed(self, sleep_mock):
+        resource = mock.Mock()
+        resource.batch_get_item.return_value = {'UnprocessedKeys': {'table': {'Keys': [{'id': 1}]}}}
+
+        with self.assertRaises(UnprocessedKeysError) as context:
+            batch_get_items(lambda: resource, 'table', [{'id': 1}, {'id': 2}], max_attempts=3)
+
+        self.assertEqual([{'id': 1}], context.exception.keys)
+        self.assertEqual(3, resource.batch_get_item.call_count)
+        self.assertEqual(2, sleep_mock.call_count)
+
+    def test_unique_keys(self, sleep_mock):
+        self.assertEqual([{'a': 1, 'b': 2}, {'a': 2, 'b': 2}],
+                         unique_keys([{'a': 1, 'b': 2}, {'b': 2, 'a': 1}, {'a': 2, 'b': 2}]))
+
+    def test_backoff_delay(self, sleep_mock):
+        self.assertTrue(all(0 <= backoff_delay(attempt, 0.1, 1.0) <= min(1.0, 0.1 * 2 ** attempt)
+                            for attempt in range(10)))
+
+
+class TestDynamoDBUtilsBatchGet(TestCase):
+    @mock.patch('ie_utils.DynamoDBUtils.get_resource')
+    def test_get_items_by_keys(self, get_resource_mock):
+        get_resource_mock.return_value = FakeResource(unprocessed=False)
+
+        result = DynamoDBUtils.get_items_by_keys('table', [{'id': 1}, {'id': 2}, {'id': 2}])
+
+        self.assertEqual({(('id', 1),): None, (('id', 2),): {'id': 2, 'data': 4}}, result)
+
+    @mock.patch('ie_utils.DynamoDBUtils.get_table')
+    def test_get_items_by_keys_single_key(self, get_table_mock):
+        get_table_mock.return_value.get_item.return_value = {'Item': {'id': 1}}
+
+        result = DynamoDBUtils.get_items_by_keys('table', [{'id': 1}])
+
+        self.assertEqual({DynamoDBUtils.key_id({'id': 1}): {'id': 1}}, result)
+        self.assertEqual({'Key': {'id': 1}}, get_table_mock.return_value.get_item.call_args[1])
+
+    @mock.patch('ie_utils.DynamoDBUtils.get_resource')
+    def test_records_exist(self, get_resource_mock):
+        get_resource_mock.return_value = FakeResource(unprocessed=False)
+
+        result = DynamoDBUtils.records_exist('table', [{'id': 1}, {'id': 2}])
+
+        self.assertEqual({(('id', 1),): False, (('id', 2),): True}, result)
+        self.assertEqual('#proj0', get_resource_mock.return_value.requests[0]['table']['ProjectionExpression'])
+
+    @mock.patch('ie_utils.DynamoDBUtils.get_resource')
+    def test_no_keys(self, get_resource_mock):
+        self.assertEqual({}, DynamoDBUtils.get_items_by_keys('table', []))
+        self.assertEqual({}, DynamoDBUtils.records_exist('table', []))
+        get_resource_mock.assert_not_called()
+
+
+class FakeWriteResource:
+    """
+    Dynamo db resource leaving the last item of every first request unprocessed, after retrying the given error
+    responses like botocore
+    """
+
+    def __init__(self, retried_errors=()):
+        self.requests = []
+        self.items = {}
+        self.retried_errors = retried_errors
+        self.lock = threading.Lock()
+        self.meta = SimpleNamespace(client=SimpleNamespace(meta=SimpleNamespace(events=HierarchicalEmitter())))
+
+    def batch_write_item(self, RequestItems):
+        for attempt, (status_code, code) in enumerate(self.retried_errors, 1):
+            self.meta.client.meta.events.emit('needs-retry.dynamodb.BatchWriteItem', attempts=attempt,
+                                              response=(SimpleNamespace(status_code=status_code),
+                                                        {'Error': {'Code': code}}))
+        with self.lock:
+            self.requests.append(RequestItems)
+        requests = RequestItems['table']
+        self.assertUniqueKeys(requests)
+        unprocessed = requests[-1:] if len(requests) > 1 else []
+        for request in requests[:len(requests) - len(unprocessed)]:
+            with self.lock:
+                self.items[request['PutRequest']['Item']['id']] = request['PutRequest']['Item']
+        return {'UnprocessedItems': {'table': unprocessed} if unprocessed else {},
+                'ResponseMetadata': {'RetryAttempts': len(self.retried_errors)}}
+
+    @staticmethod
+    def assertUniqueKeys(requests):
+        ids = [it['PutRequest']['Item']['id'] for it in requests]
+        if len(ids) != len(set(ids)) or len(ids) > 25:
+            raise ClientError({'Error': {'Code': 'ValidationException'}}, 'BatchWriteItem')
+
+
+@mock.patch('ie_utils.dynamodb_batch.time.sleep')
+class TestBatchWriteItems(TestCase):
+    def test_batch_write_items(self, sleep_mock):
+        resource = FakeWriteResource()
+
+        result = batch_write_items(lambda: resource, 'table', ({'id': i % 10, 'n': i} for i in range(30)), ['id'])
+
+        self.assertEqual(10, len(resource.items))
+        self.assertEqual(29, resource.items[9]['n'])
+        self.assertEqual((10, 20, 1, 1), result[:4])
+        sleep_mock.assert_called_once()
+
+    def test_batch_write_items_writers(self, sleep_mock):
+        resource = FakeWriteResource()
+
+        result = batch_write_items(lambda: resource, 'table', ({'id': i} for i in range(1000)), ['id'], writers=4)
+
+        self.assertEqual(1000, len(resource.items))
+        self.assertEqual((1000, 0, 40, 40), result[:4])
+
+    def test_batch_write_items_retried_by_botocore(self, sleep_mock):
+        resource = FakeWriteResource(retried_errors=[(400, 'ProvisionedThroughputExceededException'),
+                                                     (500, 'InternalServerError'), (400, 'ThrottlingException')])
+
+        result = batch_write_items(lambda: resource, 'table', [{'id': 1}], ['id'])
+
+        self.assertEqual(1, result.written)
+        self.assertEqual(2, result.throttle_events)
+        sleep_mock.assert_not_called()
+
+    def test_batch_write_items_throttled(self, sleep_mock):
+        resource = mock.Mock()
+        resource.batch_write_item.side_effect = ClientError(
+            {'Error': {'Code': 'ProvisionedThroughputExceededException'}}, 'BatchWriteItem')
+
+        self.assertRaises(ClientError, batch_write_items, lambda: resource, 'table', [{'id': 1}], ['id'])
+        resource.batch_write_item.assert_called_once()
+
+    def test_batch_write_items_error(self, sleep_mock):
+        resource = mock.Mock()
+        resource.batch_write_item.side_effect = ClientError({'Error': {'Code': 'ValidationException'}},
+                                                            'BatchWriteItem')
+
+        self.assertRaises(ClientError, batch_write_items, lambda: resource, 'table',
+                          ({'id': i} for i in range(100)), ['id'], writers=2)
+
+    def test_batch_write_items_unprocessed(self, sleep_mock):
+        resource = mock.Mock()
+        resource.batch_write_item.return_value = {'UnprocessedItems': {'table': [{'PutRequest': {'Item': {'id': 1}}}]}}
+
+        self.assertRaises(UnprocessedItemsError, batch_write_items, lambda: resource, 'table', [{'id': 1}], ['id'],
+                          max_attempts=2)
+
+
+class TestDynamoDBUtilsPutItems(TestCase):
+    @mock.patch('ie_utils.DynamoDBUtils.get_resource')
+    @mock.patch('ie_utils.DynamoDBUtils.query_planner')
+    def test_put_items(self, query_planner_mock, get_resource_mock):
+        get_resource_mock.return_value = FakeWriteResource()
+        query_planner_mock.get_schema.return_value.key_names = ['id']
+
+        result = DynamoDBUtils.put_items('table', ({'id': i} for i in range(30)))
+
+        self.assertEqual(30, result.written)
+        query_planner_mock.get_schema.assert_called_with('table')
+
+    @mock.patch('ie_utils.DynamoDBUtils.query_planner')
+    def test_put_items_unknown_keys(self, query_planner_mock):
+        query_planner_mock.get_schema.return_value = None
+
+        self.assertRaises(ValueError, DynamoDBUtils.put_items, 'table', [{'id': 1}])
@@ -0,0 +1,97 @@
+from decimal import Decimal
+from unittest import TestCase
+
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
+
+from ie_utils import DynamoDBUtils
+from ie_utils.dynamodb_codec import ItemDeserializer, ItemSerializer
+
+PYTHON_ITEM = {
+    'identifier': 'id',
+    'count': 42,
+    'amount': Decimal('12.50'),
+    'big': 10 ** 37,
+    'active': True,
+    'missing': None,
+    'payload': b'bytes',
+    'binary': Binary(b'binary'),
+    'tags': {'a', 'b'},
+    'numbers': {1, Decimal('2.5')},
+    'blobs': {Binary(b'x')},
+    'lines': [{'sku': 'sku', 'quantity': 2, 'price': Decimal('9.99')}, 'text', [1, [True, None]]],
+    'customer': {'name': 'name', 'address': {'city': 'city', 'zip': 11000}},
+    'tuple': ('a', 1),
+}
+
+
+class TestItemCodec(TestCase):
+    def test_serialize_like_boto3(self):
+        type_serializer = TypeSerializer()
+
+        self.assertEqual({k: type_serializer.serialize(v) for k, v in PYTHON_ITEM.items()},
+                         ItemSerializer().serialize_item(PYTHON_ITEM))
+
+    def test_deserialize_like_boto3(self):
+        dynamo_db_item = ItemSerializer().serialize_item(PYTHON_ITEM)
+        type_deserializer = TypeDeserializer()
+
+        self.assertEqual({k: type_deserializer.deserialize(v) for k, v in dynamo_db_item.items()},
+                         ItemDeserializer().deserialize_item(dynamo_db_item))
+
+    def test_serialize_float(self):
+        self.assertRaises(TypeError, ItemSerializer().serialize_item, {'float': 1.1})
+        self.assertEqual({'float': {'N': '1.1'}}, ItemSerializer(allow_float=True).serialize_item({'float': 1.1}))
+
+    def test_serialize_invalid_number(self):
+        self.assertRaises(TypeError, ItemSerializer().serialize_item, {'nan': Decimal('NaN')})
+
+    def test_deserialize_native_numbers(self):
+        result = ItemDeserializer(use_decimal=False).deserialize_item(
+            {'int': {'N': '42'}, 'float': {'N': '1.5'}, 'list': {'L': [{'N': '-3'}]}})
+
+        self.assertEqual({'int': 42, 'float': 1.5, 'list': [-3]}, result)
+        self.assertIsInstance(result['int'], int)
+
+    def test_deserialize_attributes(self):
+        self.assertEqual({'a': 'a'}, ItemDeserializer().deserialize_item({'a': {'S': 'a'}, 'b': {'S': 'b'}}, ['a', 'c']))
+
+    def test_deserialize_unknown_type(self):
+        self.assertRaises(TypeError, ItemDeserializer().deserialize_item, {'a': {'X': 'a'}})
+
+    def test_lazy_item(self):
+        decoded = []
+        deserializer = ItemDeserializer()
+        deserialize_value = deserializer.deserialize_value
+        lazy_item = deserializer.lazy_item({'a': {'S': 'a'}, 'b': {'N': '1'}})
+        lazy_item._deserialize_value = lambda value: decoded.append(value) or deserialize_value(value)
+
+        self.assertEqual('a', lazy_item['a'])
+        self.assertEqual('a', lazy_item['a'])
+        self.assertEqual([{'S': 'a'}], decoded)
+        self.assertEqual(['a', 'b'], list(lazy_item))
+        self.assertEqual({'a': 'a', 'b': Decimal(1)}, dict(lazy_item))
+
+
+class TestDynamoDBUtilsCodec(TestCase):
+    def test_deserialize_items(self):
+        self.assertEqual([{'n': 1}, {'n': 2}], DynamoDBUtils.deserialize_items([{'n': {'N': '1'}}, {'n': {'N': '2'}}],
+                                                                               use_decimal=False))
+
+    def test_serialize_items(self):
+        self.assertEqual([{'n': {'N': '1.5'}}], DynamoDBUtils.serialize_items([{'n': 1.5}], allow_float=True))
+
+    def test_deserialize_stream_records(self):
+        records = [{'eventName': 'MODIFY', 'dynamodb': {'Keys': {'identifier': {'S': 'id'}},
+                                                        'NewImage': {'identifier': {'S': 'id'}, 'n': {'N': '2'}},
+                                                        'OldImage': {'identifier': {'S': 'id'}, 'n': {'N': '1'}},
+                                                        'SequenceNumber': '1'}}]
+
+        result = DynamoDBUtils.deserialize_stream_records(records)
+
+        self.assertEqual({'Keys': {'identifier': 'id'}, 'NewImage': {'identifier': 'id', 'n': 2},
+                          'OldImage': {'identifier': 'id', 'n': 1}, 'SequenceNumber': '1'}, result[0]['dynamodb'])
+        self.assertEqual('MODIFY', result[0]['eventName'])
+        self.assertEqual({'S': 'id'}, records[0]['dynamodb']['Keys']['identifier'])
+
+    def test_lazy_python_data(self):
+        self.assertEqual(1, DynamoDBUtils.lazy_python_data({'n': {'N': '1'}}, use_decimal=False)['n'])
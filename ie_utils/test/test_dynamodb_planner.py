@@ -0,0 +1,117 @@
+from unittest import TestCase
+
+import mock
+from boto3.dynamodb.conditions import Attr, Key
+
+from ie_utils import DynamoDBUtils
+from ie_utils.dynamodb_planner import QueryPlanner, QueryPlan, TableSchema
+
+TABLE_DESCRIPTION = {
+    'TableName': 'events',
+    'KeySchema': [{'AttributeName': 'identifier', 'KeyType': 'HASH'}],
+    'AttributeDefinitions': [
+        {'AttributeName': 'identifier', 'AttributeType': 'S'},
+        {'AttributeName': 'external_id', 'AttributeType': 'S'},
+        {'AttributeName': 'source', 'AttributeType': 'S'},
+        {'AttributeName': 'created', 'AttributeType': 'N'},
+        {'AttributeName': 'account', 'AttributeType': 'S'},
+    ],
+    'GlobalSecondaryIndexes': [
+        {'IndexName': 'external_id-index', 'KeySchema': [{'AttributeName': 'external_id', 'KeyType': 'HASH'}],
+         'Projection': {'ProjectionType': 'ALL'}, 'IndexStatus': 'ACTIVE'},
+        {'IndexName': 'source-index', 'KeySchema': [{'AttributeName': 'source', 'KeyType': 'HASH'},
+                                                    {'AttributeName': 'created', 'KeyType': 'RANGE'}],
+         'Projection': {'ProjectionType': 'KEYS_ONLY'}, 'IndexStatus': 'ACTIVE'},
+        {'IndexName': 'account-index', 'KeySchema': [{'AttributeName': 'account', 'KeyType': 'HASH'},
+                                                     {'AttributeName': 'created', 'KeyType': 'RANGE'}],
+         'Projection': {'ProjectionType': 'ALL'}, 'IndexStatus': 'ACTIVE'},
+    ]
+}
+
+
+class TestQueryPlanner(TestCase):
+    def setUp(self):
+        self.describe_table = mock.Mock(return_value=TABLE_DESCRIPTION)
+        self.planner = QueryPlanner(self.describe_table)
+
+    def test_table_schema(self):
+        schema = TableSchema(TABLE_DESCRIPTION)
+
+        self.assertEqual(['identifier'], schema.key_names)
+        self.assertEqual(('source', 'created'), schema.indexes[1][1:3])
+
+    def test_plan_partition_key(self):
+        self.assertEqual(QueryPlan('events', 'query', None, 'identifier', 'partition key of the table'),
+                         self.planner.plan('events', 'identifier', 'id'))
+
+    def test_plan_index(self):
+        query_plan = self.planner.plan('events', 'external_id', 'ext')
+
+        self.assertEqual(('query', 'external_id-index'), (query_plan.operation, query_plan.index_name))
+
+    def test_plan_index_without_projection(self):
+        query_plan = self.planner.plan('events', 'source', 'stripe')
+
+        self.assertEqual('scan', query_plan.operation)
+        self.assertEqual('no usable index (source-index projects KEYS_ONLY)', query_plan.reason)
+
+    def test_plan_sparse_index(self):
+        query_plan = self.planner.plan('events', 'account', 'acct')
+
+        self.assertEqual('scan', query_plan.operation)
+        self.assertEqual('no usable index (account-index has range key created, sparse)', query_plan.reason)
+
+    def test_plan_type_mismatch(self):
+        self.assertEqual('scan', self.planner.plan('events', 'identifier', 1).operation)
+
+    def test_plan_not_indexed(self):
+        self.assertEqual('scan', self.planner.plan('events', 'status', 'processed').operation)
+
+    def test_schema_cached(self):
+        for _ in range(3):
+            self.planner.plan('events', 'identifier', 'id')
+
+        self.describe_table.assert_called_once_with('events')
+        self.assertEqual(3, self.planner.stats[('events', 'query')])
+
+    def test_describe_failure(self):
+        self.describe_table.side_effect = Exception('AccessDenied')
+
+        self.assertEqual('scan', self.planner.plan('events', 'identifier', 'id').operation)
+        self.assertEqual('scan', self.planner.plan('events', 'identifier', 'id').operation)
+        self.describe_table.assert_called_once()
+
+
+class TestDynamoDBUtilsSearch(TestCase):
+    def setUp(self):
+        patcher = mock.patch('ie_utils.DynamoDBUtils.query_planner', QueryPlanner(lambda _: TABLE_DESCRIPTION))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('ie_utils.DynamoDBUtils.get_table')
+    def test_get_items_by_search_attr_query(self, get_table_mock):
+        get_table_mock.return_value.query.side_effect = [
+            {'Items': ['item 1'], 'LastEvaluatedKey': {'identifier': 'id'}},
+            {'Items': ['item 2']}
+        ]
+
+        result = DynamoDBUtils.get_items_by_search_attr('events', 'external_id', 'ext')
+
+        self.assertEqual(['item 1', 'item 2'], result)
+        self.assertEqual({'KeyConditionExpression': Key('external_id').eq('ext'), 'IndexName': 'external_id-index'},
+                         get_table_mock.return_value.query.call_args_list[0][1])
+        get_table_mock.return_value.scan.assert_not_called()
+
+    @mock.patch('ie_utils.DynamoDBUtils.get_table')
+    def test_get_items_by_search_attr_scan(self, get_table_mock):
+        get_table_mock.return_value.scan.return_value = {'Items': ['item']}
+
+        result = DynamoDBUtils.get_items_by_search_attr('events', 'status', 'processed')
+
+        self.assertEqual(['item'], result)
+        self.assertEqual({'FilterExpression': Attr('status').eq('processed')},
+                         get_table_mock.return_value.scan.call_args[1])
+
+    def test_explain_search(self):
+        self.assertEqual('partition key of the table',
+                         DynamoDBUtils.explain_search('events', 'identifier', 'id').reason)
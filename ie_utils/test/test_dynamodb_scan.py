@@ -0,0 +1,155 @@
+import json
+from decimal import Decimal
+from unittest import TestCase
+
+import mock
+from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.types import Binary
+
+from ie_utils import DynamoDBUtils
+from ie_utils.dynamodb_scan import TableScanner, paginate, projection_arguments
+
+
+class FakeTable:
+    """
+    Table with 10 items per segment, served in pages of 3 items
+    """
+    PAGE_SIZE = 3
+    SEGMENT_SIZE = 10
+
+    def __init__(self, number=int):
+        self.calls = []
+        self.number = number
+
+    def scan(self, **kwargs):
+        self.calls.append(kwargs)
+        segment = kwargs.get('Segment', 0)
+        start = int(kwargs.get('ExclusiveStartKey', {}).get('id', -1)) + 1
+        end = min(start + self.PAGE_SIZE, self.SEGMENT_SIZE)
+        response = {'Items': [{'id': self.number(i), 'segment': segment} for i in range(start, end)]}
+        if end < self.SEGMENT_SIZE:
+            response['LastEvaluatedKey'] = {'id': self.number(end - 1)}
+        return response
+
+
+class BinaryKeyTable(FakeTable):
+    """
+    FakeTable with binary ids
+    """
+
+    def scan(self, **kwargs):
+        if 'ExclusiveStartKey' in kwargs:
+            kwargs['ExclusiveStartKey'] = {'id': kwargs['ExclusiveStartKey']['id'].value[0]}
+        response = super().scan(**kwargs)
+        for item in response['Items'] + [response.get('LastEvaluatedKey', {})]:
+            if 'id' in item:
+                item['id'] = Binary(bytes([item['id']]))
+        return response
+
+
+class TestTableScanner(TestCase):
+    def setUp(self):
+        self.table = FakeTable()
+
+    def test_paginate(self):
+        pages = list(paginate(self.table.scan, FilterExpression='filter'))
+
+        self.assertEqual(4, len(pages))
+        self.assertEqual({'id': 2}, pages[0][1])
+        self.assertIsNone(pages[-1][1])
+        self.assertEqual({'FilterExpression': 'filter', 'ExclusiveStartKey': {'id': 8}}, self.table.calls[-1])
+
+    def test_sequential_scan(self):
+        scanner = TableScanner(lambda: self.table)
+
+        self.assertEqual(list(range(10)), [it['id'] for it in scanner])
+        self.assertTrue(scanner.finished)
+
+    def test_parallel_scan(self):
+        scanner = TableScanner(lambda: self.table, total_segments=4, max_workers=2)
+
+        items = list(scanner)
+
+        self.assertEqual(40, len(items))
+        for segment in range(4):
+            self.assertEqual(list(range(10)), [it['id'] for it in items if it['segment'] == segment])
+        self.assertEqual({'total_segments': 4, 'last_keys': {}, 'finished': [0, 1, 2, 3]}, scanner.cursor)
+        self.assertEqual({4}, {it['TotalSegments'] for it in self.table.calls})
+
+    def test_max_items_and_resume(self):
+        scanner = TableScanner(lambda: self.table, max_items=4)
+
+        self.assertEqual([0, 1, 2, 3], [it['id'] for it in scanner])
+        self.assertEqual({'total_segments': None, 'last_keys': {0: {'id': 2}}, 'finished': []}, scanner.cursor)
+
+        resumed = TableScanner(lambda: self.table, cursor=scanner.cursor)
+        self.assertEqual(list(range(3, 10)), [it['id'] for it in resumed])
+
+    def test_parallel_max_items(self):
+        scanner = TableScanner(lambda: self.table, total_segments=4, max_items=5)
+
+        self.assertEqual(5, len(list(scanner)))
+
+    def test_parallel_max_items_skips_queued_segments(self):
+        scanner = TableScanner(lambda: self.table, total_segments=8, max_workers=1, max_items=2)
+
+        self.assertEqual(2, len(list(scanner)))
+
+        self.assertEqual({0}, {it['Segment'] for it in self.table.calls})
+
+    def test_resume_with_other_segments(self):
+        cursor = TableScanner(lambda: self.table).cursor
+
+        self.assertRaises(ValueError, TableScanner, lambda: self.table, total_segments=2, cursor=cursor)
+
+    def test_page_size_and_projection(self):
+        list(TableScanner(lambda: self.table, page_size=3, projection=['id', 'status']))
+
+        self.assertEqual(3, self.table.calls[0]['Limit'])
+        self.assertEqual('#proj0, #proj1', self.table.calls[0]['ProjectionExpression'])
+        self.assertEqual({'#proj0': 'id', '#proj1': 'status'}, self.table.calls[0]['ExpressionAttributeNames'])
+
+    def test_projection_arguments_keep_names(self):
+        self.assertEqual({'#st': 'status', '#proj0': 'id'},
+                         projection_arguments(['id'], {'#st': 'status'})['ExpressionAttributeNames'])
+
+    def test_worker_error(self):
+        self.table.scan = mock.Mock(side_effect=ValueError('error'))
+
+        self.assertRaises(ValueError, list, TableScanner(lambda: self.table, total_segments=2))
+
+
+class TestDynamoDBUtilsScan(TestCase):
+    @mock.patch('ie_utils.DynamoDBUtils.get_table')
+    def test_get_items_by_search_attr_all_pages(self, get_table_mock):
+        get_table_mock.return_value = FakeTable()
+
+        result = DynamoDBUtils.get_items_by_search_attr('table', 'data_item', 'test1')
+
+        self.assertEqual(10, len(result))
+        self.assertEqual(Attr('data_item').eq('test1'), get_table_mock.return_value.calls[0]['FilterExpression'])
+
+    @mock.patch('ie_utils.DynamoDBUtils.get_table')
+    def test_json_cursor(self, get_table_mock):
+        get_table_mock.return_value = FakeTable(number=Decimal)
+        scanner = DynamoDBUtils.scan_items('table', max_items=4)
+        list(scanner)
+
+        cursor = json.loads(json.dumps(scanner.cursor))
+
+        self.assertEqual({'0': {'id': {'N': '2'}}}, cursor['last_keys'])
+        self.assertEqual([Decimal(it) for it in range(3, 10)],
+                         [it['id'] for it in DynamoDBUtils.scan_items('table', cursor=cursor)])
+        self.assertIsInstance(get_table_mock.return_value.calls[-3]['ExclusiveStartKey']['id'], Decimal)
+
+    @mock.patch('ie_utils.dynamodb.DynamoDBUtils.get_table')
+    def test_json_cursor_binary_key(self, get_table_mock):
+        get_table_mock.return_value = BinaryKeyTable()
+        scanner = DynamoDBUtils.scan_items('table', max_items=4)
+        list(scanner)
+
+        cursor = json.loads(json.dumps(scanner.cursor))
+
+        self.assertEqual({'0': {'id': {'B': 'Ag=='}}}, cursor['last_keys'])
+        self.assertEqual([Binary(bytes([it])) for it in range(3, 10)],
+                         [it['id'] for it in DynamoDBUtils.scan_items('table', cursor=cursor)])
@@ -0,0 +1,69 @@
+import threading
+from unittest import TestCase
+
+from ie_utils.error_reporter import ExceptionReporter, fingerprint
+
+
+def raise_error(message):
+    raise ValueError(message)
+
+
+def caught(message='error'):
+    try:
+        raise_error(message)
+    except ValueError as e:
+        return e
+
+
+class TestExceptionReporter(TestCase):
+    def setUp(self):
+        self.now = 0
+        self.sent = []
+        self.reporter = ExceptionReporter(lambda *args: self.sent.append(args), window=60, max_per_window=2,
+                                          clock=lambda: self.now)
+
+    def test_fingerprint_ignores_message(self):
+        self.assertEqual(fingerprint(caught('id 1')), fingerprint(caught('id 2')))
+        self.assertNotEqual(fingerprint(ValueError('id 1')), fingerprint(ValueError('id 2')))
+
+    def test_rate_limit_per_fingerprint(self):
+        errors = [caught() for _ in range(5)]
+        for error in errors:
+            self.reporter.report(error)
+        self.reporter.report(KeyError('other'))
+        self.assertTrue(self.reporter.flush(5))
+
+        self.assertEqual([(errors[0], 0), (errors[1], 0)], self.sent[:2])
+        self.assertEqual(3, len(self.sent))
+        self.assertEqual(3, self.reporter.stats['suppressed'])
+
+        self.now = 60
+        error = caught()
+        self.reporter.report(error)
+        self.reporter.flush(5)
+        self.assertEqual((error, 3), self.sent[-1])
+
+    def test_same_exception_reported_once(self):
+        error = caught()
+
+        self.assertTrue(self.reporter.report(error))
+        self.assertFalse(self.reporter.report(error))
+
+    def test_report_does_not_block(self):
+        release = threading.Event()
+        reporter = ExceptionReporter(lambda *args: release.wait(5), max_queue_size=1, max_per_window=10)
+
+        results = [reporter.report(KeyError(i)) for i in range(5)]
+        release.set()
+
+        self.assertIn(False, results)
+        self.assertGreaterEqual(reporter.stats['dropped'], 1)
+        self.assertTrue(reporter.flush(5))
+
+    def test_send_failure_is_counted(self):
+        reporter = ExceptionReporter(lambda *args: 1 / 0)
+
+        reporter.report(KeyError('error'))
+
+        self.assertTrue(reporter.flush(5))
+        self.assertEqual(1, reporter.stats['failed'])
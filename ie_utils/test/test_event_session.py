@@ -0,0 +1,123 @@
+import datetime
+from unittest import TestCase
+
+import mock
+
+from ie_utils import DynamoDBUtils
+from ie_utils.event_session import EventSession
+
+NOW = datetime.datetime(2020, 1, 1)
+
+
+class TestEventSession(TestCase):
+    def setUp(self):
+        self.update_item = mock.Mock()
+        self.session = EventSession(self.update_item, 'table', 'key', clock=lambda: NOW)
+
+    def test_one_update_on_exit(self):
+        with self.session as session:
+            session.log('received', {'body': '{}'})
+            session.set_status('PROCESSING')
+            session.log('processed', 'ok')
+            session.set_status('PROCESSED', 'done')
+
+        self.update_item.assert_called_once_with('table', **{
+            'Key': {'identifier': 'key'},
+            'UpdateExpression': 'SET #a0 = :a0, #a1 = :a1, #a2 = :a2, '
+                                '#log = list_append(if_not_exists(#log, :empty_list), :log_entries)',
+            'ExpressionAttributeNames': {'#a0': 'status', '#a1': 'message', '#a2': 'processed_at',
+                                         '#log': 'log_messages'},
+            'ExpressionAttributeValues': {
+                ':a0': 'PROCESSED', ':a1': 'done', ':a2': str(NOW), ':empty_list': [],
+                ':log_entries': [{'datetime': str(NOW), 'description': 'received', 'log_object': "{'body': '{}'}"},
+                                 {'datetime': str(NOW), 'description': 'processed', 'log_object': 'ok'}]}})
+        self.assertFalse(self.session.pending)
+
+    def test_checkpoint(self):
+        self.session.log('first', 'a')
+        self.assertEqual(1, self.session.commit())
+        self.assertEqual(0, self.session.commit())
+        self.session.log('second', 'b')
+        self.session.commit()
+
+        self.assertEqual(2, self.update_item.call_count)
+        self.assertEqual(['second'], [it['description'] for it in
+                                      self.update_item.call_args[1]['ExpressionAttributeValues'][':log_entries']])
+
+    def test_committed_on_exception(self):
+        with self.assertRaises(KeyError):
+            with self.session as session:
+                session.log('received', 'event')
+                raise KeyError('failure')
+
+        self.update_item.assert_called_once()
+
+    def test_commit_failure_does_not_hide_exception(self):
+        self.update_item.side_effect = ValueError('throttled')
+
+        with self.assertRaises(KeyError):
+            with self.session as session:
+                session.log('received', 'event')
+                raise KeyError('failure')
+
+        self.assertTrue(self.session.pending)
+
+    def test_split_on_size(self):
+        session = EventSession(self.update_item, 'table', 'key', max_update_bytes=1000, clock=lambda: NOW)
+        session.set_status('PROCESSED')
+        for i in range(10):
+            session.log(f'entry {i}', 'x' * 200)
+
+        self.assertEqual(4, session.commit())
+
+        calls = [it[1] for it in self.update_item.call_args_list]
+        entries = [entry['description'] for it in calls for entry in it['ExpressionAttributeValues'][':log_entries']]
+        self.assertEqual([f'entry {i}' for i in range(10)], entries)
+        self.assertEqual('PROCESSED', calls[0]['ExpressionAttributeValues'][':a0'])
+        self.assertTrue(all(len(str(it['ExpressionAttributeValues'])) < 1000 for it in calls))
+
+    def test_split_on_expression_length(self):
+        self.session.set(**{f'attribute_{i:03}': i for i in range(400)})
+
+        self.assertEqual(2, self.session.commit())
+
+        expressions = [it[1]['UpdateExpression'] for it in self.update_item.call_args_list]
+        self.assertTrue(all(len(it) < 4096 for it in expressions))
+
+    def test_failed_updates_stay_pending(self):
+        session = EventSession(self.update_item, 'table', 'key', max_update_bytes=500, clock=lambda: NOW)
+        for i in range(4):
+            session.log(f'entry {i}', 'x' * 200)
+        self.update_item.side_effect = [None, ValueError('throttled')]
+
+        self.assertRaises(ValueError, session.commit)
+        self.update_item.side_effect = None
+        session.log('entry 4', 'x')
+        session.commit()
+
+        calls = [it[1] for it in self.update_item.call_args_list]
+        entries = [entry['description'] for it in calls[:1] + calls[2:]
+                   for entry in it['ExpressionAttributeValues'][':log_entries']]
+        self.assertEqual([f'entry {i}' for i in range(5)], entries)
+
+    def test_log_entries_to_log_store(self):
+        append_log_entries = mock.Mock()
+        session = EventSession(self.update_item, 'table', 'key', append_log_entries=append_log_entries)
+
+        with session:
+            session.log('received', 'event')
+            session.set_status('PROCESSED')
+
+        append_log_entries.assert_called_once()
+        self.assertNotIn('#log', self.update_item.call_args[1]['ExpressionAttributeNames'])
+
+
+class TestDynamoDBEventSession(TestCase):
+    @mock.patch('ie_utils.dynamodb.DynamoDBUtils.get_table')
+    def test_event_session(self, get_table_mock):
+        with DynamoDBUtils.event_session('table', 'key') as session:
+            session.log('received', 'event')
+            session.set_status('PROCESSED', 'done')
+
+        get_table_mock.assert_called_once_with('table')
+        get_table_mock.return_value.update_item.assert_called_once()
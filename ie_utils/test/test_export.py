@@ -0,0 +1,218 @@
+import gzip
+import json
+import threading
+from decimal import Decimal
+from unittest import TestCase
+
+import mock
+from botocore.exceptions import ClientError
+
+from ie_utils import DynamoDBUtils
+from ie_utils.export import TableExporter, json_default
+
+
+class FakeScan:
+    """
+    Low level scan of 25 wire format items per segment, served in pages of 5 items
+    """
+    PAGE_SIZE = 5
+    SEGMENT_SIZE = 25
+
+    def __init__(self, empty_segments=()):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.empty_segments = empty_segments
+
+    def __call__(self, Segment, TotalSegments, ExclusiveStartKey=None, **kwargs):
+        with self.lock:
+            self.calls.append(Segment)
+        if Segment in self.empty_segments:
+            return {'Items': []}
+        start = int(ExclusiveStartKey['n']['N']) + 1 if ExclusiveStartKey else 0
+        end = min(start + self.PAGE_SIZE, self.SEGMENT_SIZE)
+        response = {'Items': [{'identifier': {'S': f'{Segment}-{i}'}, 'n': {'N': str(i)}, 'tags': {'SS': ['b', 'a']}}
+                              for i in range(start, end)]}
+        if end < self.SEGMENT_SIZE:
+            response['LastEvaluatedKey'] = {'n': {'N': str(end - 1)}}
+        return response
+
+
+class FakeStorage:
+    def __init__(self, fail_on=None):
+        self.files = {}
+        self.fail_on = fail_on
+        self.checkpoints = []
+
+    def upload(self, file_key, chunks):
+        content = b''
+        for chunk in chunks:
+            content += chunk
+            if len(self.files) == self.fail_on:
+                raise ClientError({'Error': {'Code': 'SlowDown', 'Message': ''}}, 'UploadPart')
+        self.files[file_key] = content
+
+    def rows(self):
+        return [json.loads(line) for content in self.files.values()
+                for line in gzip.decompress(content).decode('utf-8').splitlines()]
+
+
+def deserialize(item):
+    return {'identifier': item['identifier']['S'], 'n': int(item['n']['N']), 'tags': set(item['tags']['SS'])}
+
+
+class TestTableExporter(TestCase):
+    def exporter(self, scan, storage, **kwargs):
+        kwargs.setdefault('deserialize_item', deserialize)
+        return TableExporter(scan, storage.upload, 'exports/table', save_checkpoint=storage.checkpoints.append,
+                             **kwargs)
+
+    def test_export(self):
+        storage = FakeStorage()
+
+        result = self.exporter(FakeScan(), storage, total_segments=4, max_workers=2).run()
+
+        rows = storage.rows()
+        self.assertEqual(100, len(rows))
+        self.assertEqual({'identifier': '0-0', 'n': 0, 'tags': ['a', 'b']},
+                         next(it for it in rows if it['identifier'] == '0-0'))
+        self.assertEqual([f'exports/table/segment-{i:04}-00000.ndjson.gz' for i in range(4)], sorted(result['files']))
+        self.assertEqual(100, result['rows'])
+        self.assertEqual(sum(len(it) for it in storage.files.values()), result['bytes'])
+        self.assertGreater(result['raw_bytes'], 0)
+        self.assertGreater(result['max_rss_bytes'], 0)
+        self.assertTrue(all(it['finished'] for it in storage.checkpoints[-1]['segments'].values()))
+
+    def test_rolling_files(self):
+        storage = FakeStorage()
+
+        result = self.exporter(FakeScan(), storage, total_segments=2, max_file_bytes=1).run()
+
+        # a file per page
+        self.assertEqual(10, len(result['files']))
+        self.assertEqual(50, len(storage.rows()))
+
+    def test_resume_from_checkpoint(self):
+        storage = FakeStorage(fail_on=3)
+        exporter = self.exporter(FakeScan(), storage, total_segments=2, max_workers=1, max_file_bytes=1)
+
+        self.assertRaises(ClientError, exporter.run)
+        checkpoint = json.loads(json.dumps(storage.checkpoints[-1]))
+        storage.fail_on = None
+        result = self.exporter(FakeScan(), storage, total_segments=2, checkpoint=checkpoint, max_file_bytes=1).run()
+
+        self.assertEqual(7, len(result['files']))
+        self.assertEqual(sorted(f'{s}-{i}' for s in range(2) for i in range(25)),
+                         sorted(it['identifier'] for it in storage.rows()))
+
+    def test_checkpoint_saved_outside_lock(self):
+        saved, read = [], []
+
+        def save_checkpoint(checkpoint):
+            reader = threading.Thread(target=lambda: read.append(exporter.checkpoint))
+            reader.start()
+            reader.join(5)
+            saved.append(checkpoint)
+
+        exporter = TableExporter(FakeScan(), FakeStorage().upload, 'exports/table', total_segments=2,
+                                 max_file_bytes=1, save_checkpoint=save_checkpoint)
+        exporter.run()
+
+        self.assertEqual(len(saved), len(read))
+        self.assertEqual(sorted(it['sequence'] for it in saved), [it['sequence'] for it in saved])
+        self.assertTrue(all(it['finished'] for it in saved[-1]['segments'].values()))
+        self.assertEqual(saved[-1], exporter.checkpoint)
+
+    def test_finished_export_does_nothing(self):
+        storage = FakeStorage()
+        self.exporter(FakeScan(), storage, total_segments=2).run()
+        scan = FakeScan()
+
+        result = self.exporter(scan, storage, total_segments=2, checkpoint=storage.checkpoints[-1]).run()
+
+        self.assertEqual(([], 0), (scan.calls, result['rows']))
+
+    def test_checkpoint_of_other_segment_count(self):
+        self.assertRaises(ValueError, self.exporter, FakeScan(), FakeStorage(), total_segments=2,
+                          checkpoint={'total_segments': 4, 'segments': {}})
+
+    def test_empty_segment_writes_no_file(self):
+        storage = FakeStorage()
+
+        result = self.exporter(FakeScan(empty_segments={1}), storage, total_segments=2).run()
+
+        self.assertEqual(['exports/table/segment-0000-00000.ndjson.gz'], result['files'])
+        self.assertTrue(storage.checkpoints[-1]['segments'][1]['finished'])
+
+    def test_scan_bounded_by_queue(self):
+        scan = FakeScan()
+        blocked = threading.Event()
+        released = threading.Event()
+
+        def upload(file_key, chunks):
+            for _ in chunks:
+                blocked.set()
+                released.wait(5)
+
+        exporter = TableExporter(scan, upload, 'prefix', total_segments=1, queued_pages=2)
+        thread = threading.Thread(target=exporter.run)
+        thread.start()
+        blocked.wait(5)
+        threading.Event().wait(0.2)
+        # the page being encoded, the queued pages and the one waiting for room in the queue
+        self.assertLessEqual(len(scan.calls), 4)
+        released.set()
+        thread.join(5)
+        self.assertEqual(5, len(scan.calls))
+
+    def test_json_default(self):
+        self.assertEqual('{"b":"AAE=","s":[1,2]}', json.dumps({'b': b'\x00\x01', 's': {2, 1}}, default=json_default,
+                                                               separators=(',', ':')))
+
+    def test_exact_numbers(self):
+        item = {'i': Decimal('12345678901234567890123'), 'd': Decimal('0.1000000000000000000000000001')}
+
+        self.assertEqual('{"i": 12345678901234567890123, "d": "0.1000000000000000000000000001"}',
+                         json.dumps(item, default=json_default))
+        self.assertEqual('{"d": 0.1}', json.dumps({'d': item['d']}, default=lambda it: json_default(it, True)))
+
+    def test_float_numbers(self):
+        storage = FakeStorage()
+
+        self.exporter(FakeScan(), storage, total_segments=1,
+                      deserialize_item=lambda item: {'n': Decimal(item['n']['N']) / 4}, float_numbers=True).run()
+
+        self.assertEqual([0, 0.25, 0.5], [it['n'] for it in storage.rows()[:3]])
+
+
+class TestExportTable(TestCase):
+    @mock.patch('ie_utils.dynamodb.S3Utils')
+    @mock.patch('ie_utils.dynamodb.aws_registry')
+    def test_export_table(self, aws_registry_mock, s3_utils_mock):
+        storage = FakeStorage()
+        aws_registry_mock.get_client.return_value.scan.side_effect = lambda TableName, **kwargs: FakeScan()(**kwargs)
+        s3_utils_mock.upload.side_effect = lambda bucket_name, file_key, chunks, **kwargs: storage.upload(file_key,
+                                                                                                          chunks)
+        s3_utils_mock.get_object.return_value.get.side_effect = ClientError(
+            {'Error': {'Code': 'NoSuchKey', 'Message': ''}}, 'GetObject')
+
+        result = DynamoDBUtils.export_table('table', 'bucket', 'exports/table', total_segments=2)
+
+        self.assertEqual(50, result['rows'])
+        self.assertEqual({'identifier': '0-0', 'n': 0, 'tags': ['a', 'b']},
+                         next(it for it in storage.rows() if it['identifier'] == '0-0'))
+        bucket_name, file_key, content = s3_utils_mock.put_object.call_args[0]
+        self.assertEqual(('bucket', 'exports/table/_checkpoint.json'), (bucket_name, file_key))
+        self.assertEqual(2, json.loads(content)['total_segments'])
+
+    @mock.patch('ie_utils.dynamodb.S3Utils')
+    @mock.patch('ie_utils.dynamodb.aws_registry')
+    def test_export_table_exact_numbers(self, aws_registry_mock, s3_utils_mock):
+        storage = FakeStorage()
+        aws_registry_mock.get_client.return_value.scan.return_value = {
+            'Items': [{'identifier': {'S': 'a'}, 'price': {'N': '19.99'}, 'id': {'N': '12345678901234567890'}}]}
+        s3_utils_mock.upload.side_effect = lambda bucket_name, file_key, chunks, **kwargs: storage.upload(file_key,
+                                                                                                          chunks)
+
+        DynamoDBUtils.export_table('table', 'bucket', 'exports/table', total_segments=1, resume=False)
+
+        self.assertEqual([{'identifier': 'a', 'price': '19.99', 'id': 12345678901234567890}], storage.rows())
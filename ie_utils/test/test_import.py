@@ -0,0 +1,30 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+import ie_utils
+
+
+def loaded_modules(statement, modules=('boto3', 'sentry_sdk')):
+    script = f'import sys\n{statement}\nprint(",".join(m for m in {modules!r} if m in sys.modules))'
+    return subprocess.run([sys.executable, '-c', script], check=True, capture_output=True, text=True).stdout.strip()
+
+
+class TestLazyImport(TestCase):
+    def test_heavy_dependencies_not_imported(self):
+        for statement in ('import ie_utils',
+                          'from ie_utils import get_logger, capture_exception',
+                          'from ie_utils import S3Utils',
+                          'from ie_utils import DynamoDBUtils',
+                          'from ie_utils import create_cloud_watch_cron_rule, delete_cloud_watch_cron_rule'):
+            self.assertEqual('', loaded_modules(statement), statement)
+
+    def test_boto3_imported_on_first_use(self):
+        self.assertEqual('boto3', loaded_modules('from ie_utils import aws_registry; aws_registry.get_session()'))
+
+    def test_attributes(self):
+        from ie_utils.dynamodb import DynamoDBUtils
+
+        self.assertIs(DynamoDBUtils, ie_utils.DynamoDBUtils)
+        self.assertIn('S3Utils', dir(ie_utils))
+        self.assertRaises(AttributeError, getattr, ie_utils, 'missing')
@@ -0,0 +1,118 @@
+from unittest import TestCase
+
+import mock
+
+from ie_utils import DynamoDBUtils
+from ie_utils.item_cache import ItemCache
+
+
+class TestItemCache(TestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = ItemCache(ttl=10, max_items=2, negative_ttl=5, table_ttls={'short': 1}, clock=lambda: self.now)
+
+    def test_get_put(self):
+        self.assertEqual((False, None), self.cache.get('table', {'id': 1}))
+
+        self.cache.put('table', {'id': 1}, {'id': 1, 'data': [1]})
+        hit, item = self.cache.get('table', {'id': 1})
+        item['data'].append(2)
+
+        self.assertEqual((True, {'id': 1, 'data': [1]}), self.cache.get('table', {'id': 1}))
+        self.assertEqual({'hits': 2, 'misses': 1}, dict(self.cache.stats))
+
+    def test_negative_caching(self):
+        self.cache.put('table', {'id': 1}, None)
+
+        self.assertEqual((True, None), self.cache.get('table', {'id': 1}))
+        self.now = 5
+        self.assertEqual((False, None), self.cache.get('table', {'id': 1}))
+
+    def test_ttl(self):
+        self.cache.put('table', {'id': 1}, {'id': 1})
+        self.cache.put('short', {'id': 1}, {'id': 1})
+        self.now = 1
+
+        self.assertEqual((True, {'id': 1}), self.cache.get('table', {'id': 1}))
+        self.assertEqual((False, None), self.cache.get('short', {'id': 1}))
+        self.assertEqual(1, self.cache.stats['expirations'])
+
+    def test_lru_eviction(self):
+        self.cache.put('table', {'id': 1}, {'id': 1})
+        self.cache.put('table', {'id': 2}, {'id': 2})
+        self.cache.get('table', {'id': 1})
+        self.cache.put('table', {'id': 3}, {'id': 3})
+
+        self.assertTrue(self.cache.get('table', {'id': 1})[0])
+        self.assertFalse(self.cache.get('table', {'id': 2})[0])
+        self.assertEqual(1, self.cache.stats['evictions'])
+
+    def test_invalidate(self):
+        self.cache.put('table', {'id': 1}, {'id': 1})
+        self.cache.put('table', {'id': 2}, {'id': 2})
+
+        self.cache.invalidate('table', {'id': 1})
+        self.assertFalse(self.cache.get('table', {'id': 1})[0])
+        self.assertTrue(self.cache.get('table', {'id': 2})[0])
+
+        self.cache.invalidate('table')
+        self.assertFalse(self.cache.get('table', {'id': 2})[0])
+
+    def test_invalidate_item(self):
+        self.cache.put('table', {'id': 1, 'sort': 'a'}, {'id': 1, 'sort': 'a'})
+
+        self.cache.invalidate_item('table', {'id': 1, 'sort': 'a', 'data': 'new'})
+
+        self.assertFalse(self.cache.get('table', {'id': 1, 'sort': 'a'})[0])
+
+    def test_put_after_invalidation_is_ignored(self):
+        version = self.cache.version('table')
+        self.cache.invalidate('table', {'id': 1})
+
+        self.cache.put('table', {'id': 1}, {'id': 1}, version)
+
+        self.assertFalse(self.cache.get('table', {'id': 1})[0])
+
+
+@mock.patch('ie_utils.DynamoDBUtils.get_table')
+class TestDynamoDBUtilsItemCache(TestCase):
+    def setUp(self):
+        DynamoDBUtils.enable_item_cache(ttl=60)
+
+    def tearDown(self):
+        DynamoDBUtils.disable_item_cache()
+
+    def test_get_item_by_search_key(self, get_table_mock):
+        get_table_mock.return_value.get_item.return_value = {'Item': {'id': 1}}
+
+        for _ in range(3):
+            self.assertEqual({'id': 1}, DynamoDBUtils.get_item_by_search_key('table', {'id': 1}))
+
+        get_table_mock.return_value.get_item.assert_called_once()
+        self.assertEqual({'hits': 2, 'misses': 1}, DynamoDBUtils.item_cache_stats())
+
+    def test_record_exists(self, get_table_mock):
+        get_table_mock.return_value.get_item.return_value = {}
+
+        self.assertFalse(DynamoDBUtils.record_exists('table', {'id': 1}))
+        self.assertFalse(DynamoDBUtils.record_exists('table', {'id': 1}))
+
+        get_table_mock.return_value.get_item.assert_called_once()
+
+    def test_put_item_invalidates(self, get_table_mock):
+        get_table_mock.return_value.get_item.return_value = {}
+        DynamoDBUtils.record_exists('table', {'id': 1})
+
+        DynamoDBUtils.put_item('table', {'id': 1, 'data': 'data'})
+        get_table_mock.return_value.get_item.return_value = {'Item': {'id': 1, 'data': 'data'}}
+
+        self.assertTrue(DynamoDBUtils.record_exists('table', {'id': 1}))
+
+    def test_update_event_invalidates(self, get_table_mock):
+        get_table_mock.return_value.get_item.return_value = {'Item': {'identifier': 'id', 'status': 'new'}}
+        DynamoDBUtils.get_item_by_search_key('table', {'identifier': 'id'})
+
+        DynamoDBUtils.update_event(table_name='table', table_key='id', status='processed')
+        get_table_mock.return_value.get_item.return_value = {'Item': {'identifier': 'id', 'status': 'processed'}}
+
+        self.assertEqual('processed', DynamoDBUtils.get_item_by_search_key('table', {'identifier': 'id'})['status'])
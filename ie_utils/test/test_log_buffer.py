@@ -0,0 +1,162 @@
+import threading
+import time
+from unittest import TestCase
+
+import mock
+
+from ie_utils import DynamoDBUtils
+from ie_utils.log_buffer import BufferedLogWriter
+
+
+class TestBufferedLogWriter(TestCase):
+    def setUp(self):
+        self.writes = []
+        self.writer = BufferedLogWriter(lambda *args: self.writes.append(args), flush_interval=60)
+
+    def tearDown(self):
+        self.writer.close()
+
+    def test_flush_coalesces_per_key(self):
+        for i in range(3):
+            self.writer.enqueue('table', 'key_1', i)
+            self.writer.enqueue('table', 'key_2', i)
+
+        self.assertTrue(self.writer.flush(5))
+
+        self.assertEqual([('table', 'key_1', [0, 1, 2]), ('table', 'key_2', [0, 1, 2])], self.writes)
+
+    def test_flush_on_size(self):
+        written = threading.Event()
+        writer = BufferedLogWriter(lambda *args: (self.writes.append(args), written.set()), max_batch_size=2,
+                                   flush_interval=60)
+
+        writer.enqueue('table', 'key', 1)
+        writer.enqueue('table', 'key', 2)
+
+        self.assertTrue(written.wait(5))
+        self.assertEqual([('table', 'key', [1, 2])], self.writes)
+        writer.close()
+
+    def test_flush_on_time(self):
+        writer = BufferedLogWriter(lambda *args: written.set(), flush_interval=0.01)
+        written = threading.Event()
+
+        writer.enqueue('table', 'key', 1)
+
+        self.assertTrue(written.wait(5))
+        writer.close()
+
+    def test_close_writes_pending_entries(self):
+        self.writer.enqueue('table', 'key', 1)
+
+        self.assertTrue(self.writer.close(5))
+
+        self.assertEqual([('table', 'key', [1])], self.writes)
+        self.assertRaises(RuntimeError, self.writer.enqueue, 'table', 'key', 2)
+
+    def test_flush_after_close(self):
+        self.writer.enqueue('table', 'key', 1)
+        self.writer.close(5)
+
+        self.assertTrue(self.writer.flush(5))
+        self.assertEqual([('table', 'key', [1])], self.writes)
+
+    def test_flush_timeout_on_full_queue(self):
+        writing, release = threading.Event(), threading.Event()
+        writer = BufferedLogWriter(lambda *args: (writing.set(), release.wait()), max_batch_size=1, max_queue_size=1)
+        writer.enqueue('table', 'key', 1)
+        self.assertTrue(writing.wait(5))
+        writer.enqueue('table', 'key', 2)
+
+        self.assertFalse(writer.flush(0.01))
+
+        release.set()
+        self.assertTrue(writer.close(5))
+
+    def test_timeouts_with_blocked_producer(self):
+        writing, release = threading.Event(), threading.Event()
+        writer = BufferedLogWriter(lambda *args: (writing.set(), release.wait()), max_batch_size=1, max_queue_size=1)
+        writer.enqueue('table', 'key', 1)
+        self.assertTrue(writing.wait(5))
+        writer.enqueue('table', 'key', 2)
+        producer = threading.Thread(target=writer.enqueue, args=('table', 'key', 3))
+        producer.start()
+
+        start = time.monotonic()
+        self.assertFalse(writer.flush(0.1))
+        self.assertFalse(writer.close(0.1))
+        self.assertLess(time.monotonic() - start, 2)
+
+        release.set()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+
+    def test_close_writes_entries_of_concurrent_producers(self):
+        enqueued = []
+
+        def produce(key):
+            for i in range(1000):
+                try:
+                    self.writer.enqueue('table', key, i)
+                except RuntimeError:
+                    return
+                enqueued.append(i)
+
+        producers = [threading.Thread(target=produce, args=(f'key_{i}',)) for i in range(4)]
+        for producer in producers:
+            producer.start()
+        self.assertTrue(self.writer.close(5))
+        for producer in producers:
+            producer.join()
+
+        self.assertEqual(len(enqueued), sum(len(entries) for _, _, entries in self.writes))
+
+    def test_split_by_size(self):
+        writer = BufferedLogWriter(lambda *args: self.writes.append(args), flush_interval=60, max_write_bytes=150)
+        for i in range(5):
+            writer.enqueue('table', 'key', {'description': str(i), 'log_object': 'x' * 40})
+
+        self.assertTrue(writer.close(5))
+
+        self.assertEqual([2, 2, 1], [len(entries) for _, _, entries in self.writes])
+
+    def test_error_handler(self):
+        error_handler = mock.Mock()
+        writer = BufferedLogWriter(mock.Mock(side_effect=ValueError('error')), error_handler=error_handler)
+
+        writer.enqueue('table', 'key', 1)
+        writer.close(5)
+
+        self.assertEqual(('table', 'key', [1]), error_handler.call_args[0][1:])
+
+
+class TestDynamoDBUtilsLogBuffering(TestCase):
+    def tearDown(self):
+        DynamoDBUtils.disable_log_buffering()
+
+    @mock.patch('ie_utils.DynamoDBUtils.update_item')
+    def test_buffered_log(self, update_item_mock):
+        DynamoDBUtils.enable_log_buffering(flush_interval=60)
+
+        DynamoDBUtils.log('table_name', 'table_key', 'first', 'log object')
+        DynamoDBUtils.log('table_name', 'table_key', 'second', 'log object')
+        update_item_mock.assert_not_called()
+        DynamoDBUtils.flush_logs()
+
+        self.assertEqual(1, update_item_mock.call_count)
+        self.assertEqual({'identifier': 'table_key'}, update_item_mock.call_args[1]['Key'])
+        self.assertEqual(['first', 'second'],
+                         [it['description'] for it in
+                          update_item_mock.call_args[1]['ExpressionAttributeValues'][':add_value']])
+
+    @mock.patch('ie_utils.DynamoDBUtils.update_item')
+    def test_flush_logs_after(self, update_item_mock):
+        DynamoDBUtils.enable_log_buffering(flush_interval=60)
+
+        @DynamoDBUtils.flush_logs_after
+        def handler(event, context):
+            DynamoDBUtils.log('table_name', 'table_key', 'description', event)
+            return 'result'
+
+        self.assertEqual('result', handler({'event': 'event'}, None))
+        update_item_mock.assert_called_once()
@@ -0,0 +1,136 @@
+import itertools
+from unittest import TestCase
+
+import mock
+
+from ie_utils import DynamoDBUtils
+from ie_utils.log_store import LogStore, SequenceGenerator
+
+
+class FakeLogTable:
+    """
+    Log table keyed by (identifier, sequence), evaluating the key conditions used by LogStore
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.queries = 0
+        self.meta = mock.MagicMock()
+
+    def put_item(self, Item):
+        self.items[(Item['identifier'], Item['sequence'])] = Item
+
+    def query(self, KeyConditionExpression, ExclusiveStartKey=None, Limit=None):
+        self.queries += 1
+        items = [item for _, item in sorted(self.items.items()) if matches(KeyConditionExpression, item)]
+        if ExclusiveStartKey:
+            items = [it for it in items if it['sequence'] > ExclusiveStartKey['sequence']]
+        if Limit and len(items) > Limit:
+            items = items[:Limit]
+            return {'Items': items, 'LastEvaluatedKey': {k: items[-1][k] for k in ('identifier', 'sequence')}}
+        return {'Items': items}
+
+    def batch_write_item(self, RequestItems):
+        for requests in RequestItems.values():
+            for request in requests:
+                if 'PutRequest' in request:
+                    self.put_item(request['PutRequest']['Item'])
+                else:
+                    key = request['DeleteRequest']['Key']
+                    self.items.pop((key['identifier'], key['sequence']), None)
+        return {}
+
+
+def matches(condition, item):
+    expression = condition.get_expression()
+    values = expression['values']
+    if expression['operator'] == 'AND':
+        return all(matches(it, item) for it in values)
+    value = item[values[0].name]
+    return value == values[1] if expression['operator'] == '=' else value < values[1]
+
+
+class TestLogStore(TestCase):
+    def setUp(self):
+        self.table = FakeLogTable()
+        self.table_names = []
+        self.clock = itertools.count(1000, 10)
+        self.store = LogStore(self.get_table, lambda: self.table, sequence=SequenceGenerator(lambda: next(self.clock)))
+
+    def get_table(self, table_name):
+        self.table_names.append(table_name)
+        return self.table
+
+    def append(self, *descriptions, key='key'):
+        self.store.append('events', key, [{'description': it} for it in descriptions])
+
+    def test_sequence_increasing(self):
+        sequence = SequenceGenerator(clock=lambda: 5)
+
+        values = [sequence.next() for _ in range(3)]
+
+        self.assertEqual(sorted(values), values)
+        self.assertEqual(3, len(set(values)))
+
+    def test_append_and_read(self):
+        self.append('a')
+        self.append('b', 'c')
+        self.append('other', key='other')
+
+        entries = list(self.store.read('events', 'key', page_size=2))
+
+        self.assertEqual(['a', 'b', 'c'], [it['description'] for it in entries])
+        self.assertEqual({'events_logs'}, set(self.table_names))
+        self.assertEqual(2, self.table.queries)
+
+    def test_read_after(self):
+        self.append('a', 'b', 'c')
+        first = next(self.store.read('events', 'key'))
+
+        self.assertEqual(['b', 'c'], [it['description'] for it in self.store.read('events', 'key',
+                                                                                  after=first['sequence'])])
+
+    def test_compact(self):
+        self.append('a', 'b', 'c')
+        before = sorted(self.table.items)[2][1]
+        archives = {}
+
+        result = self.store.compact('events', 'key', lambda *args: archives.setdefault(args[:2], args[2]), 'bucket',
+                                    before=before, file_key='archive.ndjson')
+
+        self.assertEqual({'archived': 2, 'bucket_name': 'bucket', 'file_key': 'archive.ndjson'}, result)
+        self.assertEqual(2, len(archives[('bucket', 'archive.ndjson')].splitlines()))
+        entries = list(self.store.read('events', 'key'))
+        self.assertEqual(['log entries archived', 'c'], [it['description'] for it in entries])
+
+        restored = self.store.read('events', 'key', get_archive=lambda *args: archives[args])
+        self.assertEqual(['a', 'b', 'c'], [it['description'] for it in restored])
+
+    def test_compact_nothing(self):
+        result = self.store.compact('events', 'key', mock.Mock(), 'bucket')
+
+        self.assertEqual(0, result['archived'])
+
+
+@mock.patch('ie_utils.DynamoDBUtils.get_resource')
+@mock.patch('ie_utils.DynamoDBUtils.get_table')
+class TestDynamoDBUtilsLogStore(TestCase):
+    def setUp(self):
+        DynamoDBUtils.enable_log_store()
+
+    def tearDown(self):
+        DynamoDBUtils.disable_log_store()
+
+    def test_log_and_read_log(self, get_table_mock, get_resource_mock):
+        log_table = FakeLogTable()
+        event_table = mock.Mock()
+        event_table.get_item.return_value = {'Item': {'log_messages': [{'description': 'legacy'}]}}
+        get_table_mock.side_effect = lambda name: log_table if name == 'events_logs' else event_table
+
+        DynamoDBUtils.log('events', 'key', 'first', 'object')
+        DynamoDBUtils.log('events', 'key', 'second', {'data': 1})
+
+        event_table.update_item.assert_not_called()
+        self.assertEqual(['legacy', 'first', 'second'],
+                         [it['description'] for it in DynamoDBUtils.read_log('events', 'key')])
+        self.assertEqual("{'data': 1}", list(log_table.items.values())[1]['log_object'])
@@ -0,0 +1,169 @@
+import io
+import json
+import logging
+import queue
+from unittest import TestCase
+
+import mock
+
+from ie_utils import configure_logging, flush_logging, get_logger, log_context, log_invocation, set_log_context
+from ie_utils import logging_utils
+from ie_utils.constants import LOGGING_LEVEL_VAR_NAME
+
+
+def keep_root_logging(test_case):
+    """
+    Stop the listener and put back the root handlers and level of the test runner when test_case ends
+    """
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    patcher = mock.patch.multiple(logging_utils, _listener=None, _root_checked=False)
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
+
+    def restore():
+        if logging_utils._listener is not None:
+            logging_utils._listener.stop()
+        root.handlers[:] = handlers
+        root.setLevel(level)
+
+    test_case.addCleanup(restore)
+
+
+class TestConfigureLogging(TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        keep_root_logging(self)
+        self.addCleanup(logging_utils._log_context.set, {})
+
+    def configure(self, **kwargs):
+        configure_logging(stream=self.stream, force=True, **dict({'level': 'DEBUG', 'module_levels': {}}, **kwargs))
+
+    def records(self) -> list:
+        self.assertTrue(flush_logging())
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_json_records(self):
+        self.configure()
+        logger = logging.getLogger('test.json')
+
+        logger.info('processed %s items', 3, extra={'table_name': 'events'})
+        try:
+            raise ValueError('invalid')
+        except ValueError:
+            logger.exception('failed')
+
+        processed, failed = self.records()
+        self.assertEqual(('INFO', 'test.json', 'processed 3 items', 'events'),
+                         (processed['level'], processed['logger'], processed['message'], processed['table_name']))
+        self.assertIn('ValueError: invalid', failed['exception'])
+
+    def test_message_arguments_merged_when_logged(self):
+        self.configure()
+        items = ['a']
+
+        logging.getLogger('test').info('items %s', items)
+        items.append('b')
+
+        self.assertEqual("items ['a']", self.records()[0]['message'])
+
+    def test_context(self):
+        self.configure()
+        set_log_context(event_id='event')
+
+        with log_context(request_id='request'):
+            logging.getLogger('test').info('inside')
+        logging.getLogger('test').info('outside')
+
+        inside, outside = self.records()
+        self.assertEqual(('event', 'request'), (inside['event_id'], inside['request_id']))
+        self.assertNotIn('request_id', outside)
+
+    def test_module_levels(self):
+        self.configure(module_levels={'test.quiet': 'WARNING'})
+        self.addCleanup(logging.getLogger('test.quiet').setLevel, logging.NOTSET)
+
+        logging.getLogger('test.quiet').info('dropped')
+        logging.getLogger('test.quiet').warning('kept')
+
+        self.assertEqual(['kept'], [it['message'] for it in self.records()])
+
+    def test_module_levels_from_environment(self):
+        self.assertEqual({'botocore': 'WARNING', 'ie_utils': 'DEBUG'},
+                         logging_utils._parse_module_levels('botocore=warning, ie_utils=DEBUG,invalid'))
+
+    def test_text_format(self):
+        self.configure(json_format=False)
+
+        logging.getLogger('test').info('text')
+
+        flush_logging()
+        self.assertIn('INFO test text', self.stream.getvalue())
+
+    def test_dropped_when_queue_full(self):
+        self.configure(max_queue_size=1)
+        handler = logging.getLogger().handlers[0]
+        handler.queue = queue.Queue(1)
+
+        for _ in range(3):
+            logging.getLogger('test').info('message')
+
+        self.assertEqual(2, handler.dropped)
+
+
+class TestGetLogger(TestCase):
+    def setUp(self):
+        keep_root_logging(self)
+        self.root = logging.getLogger()
+
+    @mock.patch.dict('os.environ', {LOGGING_LEVEL_VAR_NAME: 'WARNING'})
+    def test_existing_handlers_left_alone(self):
+        handler = logging.NullHandler()
+        self.root.handlers[:] = [handler]
+
+        logger = get_logger()
+
+        self.assertEqual([handler], logger.handlers)
+        self.assertEqual(logging.WARNING, logger.level)
+        self.assertIsNone(logging_utils._listener)
+
+    def test_bare_root_configured_once(self):
+        self.root.handlers[:] = []
+
+        get_logger()
+        with mock.patch('ie_utils.logging_utils.configure_logging') as configure_logging_mock:
+            get_logger()
+
+        self.assertEqual([logging_utils._QueueHandler], [type(it) for it in self.root.handlers])
+        configure_logging_mock.assert_not_called()
+
+
+class TestLogInvocation(TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        keep_root_logging(self)
+
+    def invoke(self, debug_sample_rate, random_value=0.5):
+        configure_logging(level='DEBUG', module_levels={}, debug_sample_rate=debug_sample_rate, stream=self.stream,
+                          force=True)
+
+        @log_invocation
+        def handler(event, context):
+            logging.getLogger('test').debug('debug')
+            logging.getLogger('test').info('info')
+            return 'result'
+
+        with mock.patch('ie_utils.logging_utils.random.random', return_value=random_value):
+            self.assertEqual('result', handler({'identifier': 'event'}, mock.Mock(aws_request_id='request')))
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_context_and_flush(self):
+        debug, info = self.invoke(debug_sample_rate=1)
+
+        self.assertEqual(('event', 'request'), (info['event_id'], info['request_id']))
+        self.assertEqual('debug', debug['message'])
+
+    def test_debug_sampled_per_invocation(self):
+        self.assertEqual(['info'], [it['message'] for it in self.invoke(debug_sample_rate=0.1)])
+        self.stream = io.StringIO()
+        self.assertEqual(2, len(self.invoke(debug_sample_rate=0.9)))
@@ -0,0 +1,86 @@
+import io
+import json
+from unittest import TestCase
+
+from botocore.stub import Stubber
+
+from ie_utils.metrics import AwsMetrics, Histogram
+from ie_utils.registry import AwsRegistry
+
+CONFIG = {'region_name': 'us-west-2', 'aws_access_key_id': 'local', 'aws_secret_access_key': 'local'}
+KEY = {'identifier': {'S': 'id'}}
+
+
+class TestHistogram(TestCase):
+    def test_percentiles(self):
+        histogram = Histogram(bounds=(1, 10, 100))
+        for value in [0.5] * 90 + [5] * 9 + [500]:
+            histogram.record(value)
+
+        self.assertEqual(1, histogram.percentile(50))
+        self.assertEqual(10, histogram.percentile(99))
+        self.assertEqual(500, histogram.percentile(100))
+        self.assertEqual({'1': 90, '10': 9, '100': 0, 'inf': 1}, histogram.summary()['buckets'])
+
+
+class TestAwsMetrics(TestCase):
+    def setUp(self):
+        self.registry = AwsRegistry()
+        self.client = self.registry.get_client('dynamodb', **CONFIG)
+        self.metrics = AwsMetrics()
+        self.metrics.enable(self.registry)
+        self.addCleanup(self.metrics.disable)
+
+    def test_calls_and_consumed_capacity(self):
+        sent = []
+        self.client.meta.events.register_last('before-parameter-build', lambda params, **kwargs: sent.append(params))
+        with Stubber(self.client) as stubber:
+            for _ in range(3):
+                stubber.add_response(
+                    'get_item',
+                    {'ConsumedCapacity': {'TableName': 'table', 'CapacityUnits': 0.5},
+                     'ResponseMetadata': {'RetryAttempts': 1}},
+                    {'TableName': 'table', 'Key': KEY})
+                self.client.get_item(TableName='table', Key=KEY)
+
+        stats, = self.metrics.snapshot()
+
+        self.assertEqual(('dynamodb', 'GetItem', 'table'), (stats['service'], stats['operation'], stats['resource']))
+        self.assertEqual((3, 0, 3, 1.5), (stats['calls'], stats['errors'], stats['retries'],
+                                          stats['consumed_capacity']))
+        self.assertEqual(3, stats['latency_ms']['count'])
+        self.assertEqual('TOTAL', sent[0]['ReturnConsumedCapacity'])
+
+    def test_throttling(self):
+        with Stubber(self.client) as stubber:
+            stubber.add_client_error('put_item', 'ProvisionedThroughputExceededException', http_status_code=400)
+            with self.assertRaises(self.client.exceptions.ProvisionedThroughputExceededException):
+                self.client.put_item(TableName='table', Item=KEY)
+
+        stats, = self.metrics.snapshot()
+        self.assertEqual((1, 1, 1), (stats['calls'], stats['errors'], stats['throttles']))
+
+    def test_resource_clients_and_disable(self):
+        table = self.registry.get_resource('dynamodb', **CONFIG).Table('other')
+
+        with Stubber(table.meta.client) as stubber:
+            stubber.add_response('get_item', {}, {'TableName': 'other', 'Key': {'identifier': 'id'}})
+            table.get_item(Key={'identifier': 'id'})
+            self.metrics.disable()
+            stubber.add_response('get_item', {}, {'TableName': 'other', 'Key': {'identifier': 'id'}})
+            table.get_item(Key={'identifier': 'id'})
+
+        self.assertEqual([1], [it['calls'] for it in self.metrics.snapshot()])
+
+    def test_emf(self):
+        with Stubber(self.client) as stubber:
+            stubber.add_response('describe_table', {}, {'TableName': 'table'})
+            self.client.describe_table(TableName='table')
+        stream = io.StringIO()
+
+        self.metrics.flush(namespace='test', stream=stream)
+
+        record = json.loads(stream.getvalue())
+        self.assertEqual('test', record['_aws']['CloudWatchMetrics'][0]['Namespace'])
+        self.assertEqual(('DescribeTable', 'table', 1), (record['Operation'], record['Resource'], record['Calls']))
+        self.assertEqual([], self.metrics.snapshot())
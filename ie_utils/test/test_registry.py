@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+from unittest import TestCase
+
+import mock
+from botocore.stub import Stubber
+
+from ie_utils import DynamoDBUtils
+from ie_utils.constants import DYNAMO_DB_CONFIG_VAR_NAME
+from ie_utils.registry import AwsRegistry, parse_config
+
+DYNAMO_DB_CONFIG = {'region_name': 'us-west-2', 'aws_access_key_id': 'local', 'aws_secret_access_key': 'local'}
+
+
+class TestAwsRegistry(TestCase):
+    def setUp(self):
+        self.registry = AwsRegistry()
+
+    def test_get_client_creates_one_client(self):
+        session = self.registry.get_session()
+
+        with mock.patch.object(session, 'client', wraps=session.client) as client_spy:
+            clients = [self.registry.get_client('dynamodb', **DYNAMO_DB_CONFIG) for _ in range(10)]
+
+        self.assertEqual(1, client_spy.call_count)
+        self.assertTrue(all(client is clients[0] for client in clients))
+
+        with Stubber(clients[0]) as stubber:
+            for _ in range(10):
+                stubber.add_response('get_item', {'Item': {'identifier': {'S': 'id'}}},
+                                     {'TableName': 'table', 'Key': {'identifier': {'S': 'id'}}})
+            for _ in range(10):
+                self.registry.get_client('dynamodb', **DYNAMO_DB_CONFIG).get_item(
+                    TableName='table', Key={'identifier': {'S': 'id'}})
+            stubber.assert_no_pending_responses()
+
+    def test_get_client_differs_by_config(self):
+        client = self.registry.get_client('dynamodb', **DYNAMO_DB_CONFIG)
+        other_client = self.registry.get_client('dynamodb', **dict(DYNAMO_DB_CONFIG, region_name='eu-west-1'))
+
+        self.assertIsNot(client, other_client)
+
+    def test_get_table_through_dynamo_db_utils(self):
+        session = self.registry.get_session()
+
+        with mock.patch('ie_utils.dynamodb.aws_registry', self.registry), \
+                mock.patch.dict(os.environ, {DYNAMO_DB_CONFIG_VAR_NAME: json.dumps(DYNAMO_DB_CONFIG)}), \
+                mock.patch.object(session, 'resource', wraps=session.resource) as resource_spy:
+            table = DynamoDBUtils.get_table('table')
+            with Stubber(table.meta.client) as stubber:
+                for _ in range(10):
+                    stubber.add_response('get_item', {'Item': {'identifier': {'S': 'id'}}},
+                                         {'TableName': 'table', 'Key': {'identifier': 'id'}})
+                items = [DynamoDBUtils.get_item_by_search_key('table', {'identifier': 'id'}) for _ in range(10)]
+                stubber.assert_no_pending_responses()
+
+        self.assertEqual(1, resource_spy.call_count)
+        self.assertEqual([{'identifier': 'id'}] * 10, items)
+
+    def test_resources_are_per_thread(self):
+        resources = []
+        thread = threading.Thread(target=lambda: resources.append(self.registry.get_resource('s3')))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(resources[0], self.registry.get_resource('s3'))
+        self.assertIs(self.registry.get_resource('s3'), self.registry.get_resource('s3'))
+        self.assertIs(resources[0].meta.client, self.registry.get_resource('s3').meta.client)
+
+    def test_tables_of_threads_share_a_client(self):
+        tables = []
+        thread = threading.Thread(target=lambda: tables.append(self.registry.get_table('table', **DYNAMO_DB_CONFIG)))
+        thread.start()
+        thread.join()
+        table = self.registry.get_table('table', **DYNAMO_DB_CONFIG)
+
+        self.assertIsNot(tables[0], table)
+        self.assertIs(tables[0].meta.client, table.meta.client)
+        with Stubber(table.meta.client) as stubber:
+            stubber.add_response('get_item', {'Item': {'identifier': {'S': 'id'}, 'value': {'N': '1'}}},
+                                 {'TableName': 'table', 'Key': {'identifier': 'id'}})
+            self.assertEqual({'identifier': 'id', 'value': 1}, tables[0].get_item(Key={'identifier': 'id'})['Item'])
+
+    def test_invalidate(self):
+        client = self.registry.get_client('s3', region_name='us-west-2')
+        table = self.registry.get_table('table', **DYNAMO_DB_CONFIG)
+
+        self.registry.invalidate('s3')
+
+        self.assertIsNot(client, self.registry.get_client('s3', region_name='us-west-2'))
+        self.assertIsNot(table, self.registry.get_table('table', **DYNAMO_DB_CONFIG))
+
+    def test_parse_config(self):
+        self.assertEqual({}, parse_config(None))
+        self.assertEqual(DYNAMO_DB_CONFIG, parse_config(json.dumps(DYNAMO_DB_CONFIG)))
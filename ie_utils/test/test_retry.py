@@ -0,0 +1,211 @@
+import heapq
+import itertools
+import json
+from unittest import TestCase
+
+import mock
+from botocore.awsrequest import AWSResponse
+
+from ie_utils.registry import AwsRegistry
+from ie_utils.retry import AdaptiveRateLimiter, RetryBudget, ThrottleControl
+
+CONFIG = {'region_name': 'us-west-2', 'aws_access_key_id': 'local', 'aws_secret_access_key': 'local'}
+THROTTLED = {'Error': {'Code': 'ProvisionedThroughputExceededException'}, 'ResponseMetadata': {}}
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveRateLimiter(TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.limiter = AdaptiveRateLimiter(min_rate=1, decrease_factor=0.5, increase=1, clock=self.clock)
+
+    def test_not_limiting_until_throttled(self):
+        for i in range(100):
+            self.clock.now = i / 100
+            self.assertEqual(0, self.limiter.acquire())
+        self.assertIsNone(self.limiter.rate)
+
+    def test_rate_from_measured_rate(self):
+        for i in range(101):
+            self.clock.now = i / 100
+            self.limiter.acquire()
+
+        self.limiter.throttled()
+
+        self.assertAlmostEqual(50, self.limiter.rate, delta=1)
+        delays = [self.limiter.acquire() for _ in range(5)]
+        for i, delay in enumerate(delays):
+            self.assertAlmostEqual((i + 1) / self.limiter.rate, delay)
+
+    def test_multiplicative_decrease_once_per_second(self):
+        self.limiter.throttled()
+        self.limiter.throttled()
+        self.assertEqual(1, self.limiter.rate)
+
+    def test_additive_increase(self):
+        self.clock.now = 1
+        self.limiter.acquire()
+        self.limiter.throttled()
+        self.clock.now = 2
+        self.limiter.throttled()
+        rate = self.limiter.rate
+
+        for _ in range(10):
+            self.limiter.succeeded()
+
+        self.assertGreater(self.limiter.rate, rate)
+        self.assertLessEqual(self.limiter.rate, rate + 10)
+
+
+class TestRetryBudget(TestCase):
+    def test_budget(self):
+        budget = RetryBudget(capacity=2, ratio=0.5)
+
+        self.assertEqual([True, True, False], [budget.withdraw() for _ in range(3)])
+        budget.deposit()
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+
+
+class ThrottlingBackend:
+    """
+    Table serving `capacity` requests per second (token bucket with one second of burst)
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = 0.0
+
+    def accept(self, now) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.capacity)
+        self.last = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def simulate(control, clock, workers=32, capacity=200, latency=0.01, duration=30.0, warmup=10.0) -> dict:
+    """
+    Discrete event simulation of workers calling a throttling table through the ThrottleControl handlers
+
+    :return: dict with throughput (successful calls per second after warmup) and throttled (fraction of the
+        requests throttled after warmup)
+    """
+    backend = ThrottlingBackend(capacity)
+    model = mock.Mock()
+    model.service_model.service_name = 'dynamodb'
+    sequence = itertools.count()
+    events = [(0.0, next(sequence), 'call', worker, 1, None) for worker in range(workers)]
+    counts = {'succeeded': 0, 'throttled': 0, 'sent': 0}
+    pending = []
+    control._sleep = pending.append
+
+    while events:
+        now, _, kind, worker, attempts, context = heapq.heappop(events)
+        clock.now = now
+        if now > duration:
+            break
+        if kind == 'call':
+            context = {}
+            control._before_call(params={'TableName': 'table'}, model=model, context=context)
+            heapq.heappush(events, (now + sum(pending), next(sequence), 'send', worker, attempts, context))
+            pending.clear()
+        elif kind == 'send':
+            accepted = backend.accept(now)
+            if now >= warmup:
+                counts['sent'] += 1
+                counts['throttled'] += not accepted
+            heapq.heappush(events, (now + latency, next(sequence), 'ok' if accepted else 'throttled', worker,
+                                    attempts, context))
+        else:
+            response = (AWSResponse(None, 200 if kind == 'ok' else 400, {}, None),
+                        {'ResponseMetadata': {}} if kind == 'ok' else THROTTLED)
+            delay = control._needs_retry(attempts, response=response, request_dict={'context': context})
+            if delay:
+                heapq.heappush(events, (now + delay, next(sequence), 'send', worker, attempts + 1, context))
+            else:
+                if kind == 'ok' and now >= warmup:
+                    counts['succeeded'] += 1
+                heapq.heappush(events, (now, next(sequence), 'call', worker, 1, None))
+
+    return {'throughput': counts['succeeded'] / (duration - warmup), 'throttled': counts['throttled'] / counts['sent']}
+
+
+class TestThrottleControl(TestCase):
+    def test_simulation_converges_to_capacity(self):
+        clock = VirtualClock()
+        control = ThrottleControl(limiter_factory=lambda: AdaptiveRateLimiter(clock=clock))
+
+        result = simulate(control, clock, capacity=200)
+
+        self.assertGreater(result['throughput'], 0.8 * 200)
+        self.assertLess(result['throttled'], 0.05)
+
+    def test_simulation_without_rate_limiting(self):
+        clock = VirtualClock()
+
+        class Unlimited(AdaptiveRateLimiter):
+            def throttled(self):
+                pass
+
+        control = ThrottleControl(limiter_factory=lambda: Unlimited(clock=clock))
+
+        result = simulate(control, clock, capacity=200)
+
+        # the same load without rate limiting: most requests are throttled
+        self.assertGreater(result['throttled'], 0.5)
+
+    def test_retries_through_botocore(self):
+        registry = AwsRegistry()
+        control = ThrottleControl(sleep=lambda seconds: None)
+        control.enable(registry)
+        self.addCleanup(control.disable)
+        client = registry.get_client('dynamodb', **CONFIG)
+        responses = [400, 400, 200]
+
+        def send(request, **kwargs):
+            status = responses.pop(0)
+            body = (json.dumps({'__type': 'com.amazonaws.dynamodb.v20120810#ThrottlingException'}) if status == 400
+                    else '{}').encode('utf-8')
+            raw = mock.Mock()
+            raw.stream.return_value = [body]
+            return AWSResponse(request.url, status, {}, raw)
+
+        client.meta.events.register('before-send', send)
+        with mock.patch('botocore.endpoint.time.sleep') as sleep_mock:
+            response = client.describe_table(TableName='table')
+
+        self.assertEqual(2, response['ResponseMetadata']['RetryAttempts'])
+        self.assertEqual(2, sleep_mock.call_count)
+        stats, = control.snapshot()
+        self.assertEqual(('dynamodb', 'table', 2, 2, 0),
+                         (stats['service'], stats['resource'], stats['throttles'], stats['retries'], stats['exhausted']))
+        self.assertIsNotNone(stats['rate'])
+
+    def test_budget_exhausted(self):
+        registry = AwsRegistry()
+        control = ThrottleControl(budget_factory=lambda: RetryBudget(capacity=1), sleep=lambda seconds: None)
+        control.enable(registry)
+        self.addCleanup(control.disable)
+        client = registry.get_client('dynamodb', **CONFIG)
+
+        def send(request, **kwargs):
+            raw = mock.Mock()
+            raw.stream.return_value = [b'{"__type": "ThrottlingException"}']
+            return AWSResponse(request.url, 400, {}, raw)
+
+        client.meta.events.register('before-send', send)
+        with mock.patch('botocore.endpoint.time.sleep'):
+            with self.assertRaises(client.exceptions.ClientError):
+                client.describe_table(TableName='table')
+
+        self.assertEqual((1, 1), (control.snapshot()[0]['retries'], control.snapshot()[0]['exhausted']))
@@ -0,0 +1,148 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+import mock
+from botocore.exceptions import ClientError
+
+from ie_utils import S3Utils
+from ie_utils.s3_cache import S3ObjectCache
+
+
+class FakeS3Client:
+    """
+    S3 client serving objects from a dict, honoring IfNoneMatch
+    """
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.calls = []
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        self.calls.append((Key, IfNoneMatch))
+        content, etag = self.objects[Key]
+        if IfNoneMatch == etag:
+            raise ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'},
+                               'ResponseMetadata': {'HTTPStatusCode': 304}}, 'GetObject')
+        return {'Body': io.BytesIO(content), 'ETag': etag}
+
+
+class TestS3ObjectCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.client = FakeS3Client({'a': (b'a' * 10, '"a1"'), 'b': (b'b' * 10, '"b1"'), 'c': (b'c' * 10, '"c1"')})
+        self.cache = self.create_cache()
+
+    def create_cache(self, max_bytes=25):
+        return S3ObjectCache(lambda: self.client, directory=self.directory.name, max_bytes=max_bytes)
+
+    def test_miss_then_hit(self):
+        self.assertEqual(b'a' * 10, self.cache.get('bucket', 'a').read())
+        cached = self.cache.get('bucket', 'a')
+
+        self.assertEqual(b'a' * 10, cached.read())
+        self.assertEqual('"a1"', cached.etag)
+        self.assertEqual([('a', None), ('a', '"a1"')], self.client.calls)
+        self.assertEqual({'misses': 1, 'hits': 1, 'revalidations': 1, 'bytes_saved': 10, 'bytes_downloaded': 10},
+                         dict(self.cache.stats))
+
+    def test_changed_object(self):
+        self.cache.get('bucket', 'a')
+        self.client.objects['a'] = (b'new', '"a2"')
+
+        cached = self.cache.get('bucket', 'a')
+
+        self.assertEqual(b'new', cached.read())
+        self.assertEqual('"a2"', cached.etag)
+        self.assertEqual(2, self.cache.stats['misses'])
+
+    def test_eviction(self):
+        self.cache.get('bucket', 'a')
+        self.cache.get('bucket', 'b')
+        self.cache.get('bucket', 'a')
+        self.cache.get('bucket', 'c')
+
+        self.assertEqual(1, self.cache.stats['evictions'])
+        self.assertEqual(20, self.cache.size)
+        self.cache.get('bucket', 'b')
+        self.assertEqual(('b', None), self.client.calls[-1])
+
+    def test_index_reloaded_from_disk(self):
+        self.cache.get('bucket', 'a')
+
+        cache = self.create_cache()
+        cached = cache.get('bucket', 'a')
+
+        self.assertEqual(b'a' * 10, cached.read())
+        self.assertEqual({'hits': 1, 'revalidations': 1, 'bytes_saved': 10}, dict(cache.stats))
+
+    def test_invalidate(self):
+        self.cache.get('bucket', 'a')
+
+        self.cache.invalidate('bucket', 'a')
+        self.cache.get('bucket', 'a')
+
+        self.assertEqual(('a', None), self.client.calls[-1])
+
+    def test_mmap(self):
+        memory_map = self.cache.get('bucket', 'a').mmap()
+
+        self.assertEqual(b'a' * 10, memory_map[:])
+        memory_map.close()
+
+    def test_handed_out_object_survives_eviction(self):
+        cached = self.cache.get('bucket', 'a')
+        self.cache.invalidate('bucket', 'a')
+        self.cache.get('bucket', 'b')
+        self.cache.get('bucket', 'c')
+
+        with cached.open() as first, cached.open() as second:
+            self.assertEqual(b'aaa', first.read(3))
+            self.assertEqual(b'a' * 10, second.read())
+            self.assertEqual(b'a' * 7, first.read())
+        memory_map = cached.mmap()
+        self.assertEqual(b'a' * 10, memory_map[:])
+        memory_map.close()
+        cached.close()
+
+    def test_interrupted_metadata_write(self):
+        with mock.patch('ie_utils.s3_cache.json.dump', side_effect=OSError('disk full')):
+            self.assertRaises(OSError, self.cache.get, 'bucket', 'a')
+
+        self.assertEqual([], os.listdir(self.directory.name))
+        self.create_cache().get('bucket', 'a')
+        self.assertEqual(('a', None), self.client.calls[-1])
+
+    def test_orphan_data_file_removed(self):
+        self.cache.get('bucket', 'a').close()
+        name = next(it for it in os.listdir(self.directory.name) if not it.endswith('.meta'))
+        os.remove(os.path.join(self.directory.name, name + '.meta'))
+
+        self.create_cache()
+
+        self.assertEqual([], os.listdir(self.directory.name))
+
+    def test_error_is_raised(self):
+        self.assertRaises(KeyError, self.cache.get, 'bucket', 'missing')
+
+
+class TestS3UtilsObjectCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        S3Utils.enable_object_cache(directory=self.directory.name)
+
+    def tearDown(self):
+        S3Utils._object_cache = None
+
+    @mock.patch('ie_utils.s3.aws_registry')
+    def test_get_cached_object(self, aws_registry_mock):
+        aws_registry_mock.get_client.return_value = FakeS3Client({'key': (b'content', '"etag"')})
+
+        for _ in range(3):
+            self.assertEqual(b'content', S3Utils.get_cached_object('bucket', 'key').read())
+
+        self.assertEqual(2, S3Utils.object_cache_stats()['hits'])
+        aws_registry_mock.get_client.assert_called_with('s3')
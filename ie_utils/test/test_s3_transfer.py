@@ -0,0 +1,239 @@
+import io
+import os
+import re
+import tempfile
+import threading
+from unittest import TestCase
+
+import mock
+from botocore.exceptions import ClientError
+
+from ie_utils import S3Utils
+from ie_utils.s3_transfer import MultipartUploader, ObjectChangedError, RangedDownloader, iter_chunks
+
+CONTENT = b''.join(f'line {i}\r\n'.encode('utf-8') for i in range(1000))
+
+
+class FakeS3Client:
+    """
+    S3 client serving one object, honoring Range and IfMatch
+    """
+
+    def __init__(self, content=CONTENT, etag='"etag"'):
+        self.content = content
+        self.etag = etag
+        self.ranges = []
+        self.lock = threading.Lock()
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': len(self.content), 'ETag': self.etag}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        if IfMatch and IfMatch != self.etag:
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'GetObject')
+        start, end = map(int, re.match(r'bytes=(\d+)-(\d+)', Range).groups())
+        with self.lock:
+            self.ranges.append((start, end))
+        return {'Body': io.BytesIO(self.content[start:end + 1]), 'ETag': self.etag}
+
+
+class TestRangedDownloader(TestCase):
+    def setUp(self):
+        self.client = FakeS3Client()
+        self.downloader = RangedDownloader(self.client, 'bucket', 'key', part_size=1000, max_concurrency=4)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_ranges(self):
+        ranges = self.downloader.ranges
+
+        self.assertEqual((0, 1000), ranges[0])
+        self.assertEqual(len(CONTENT), ranges[-1][1])
+        self.assertEqual(-(-len(CONTENT) // 1000), len(ranges))
+
+    def test_download_into(self):
+        buffer = bytearray(len(CONTENT))
+
+        self.assertEqual(len(CONTENT), self.downloader.download_into(buffer))
+
+        self.assertEqual(CONTENT, buffer)
+        self.assertEqual(len(self.downloader.ranges), len(self.client.ranges))
+
+    def test_download_into_wrong_size(self):
+        self.assertRaises(ValueError, self.downloader.download_into, bytearray(10))
+
+    def test_download_to_file(self):
+        path = os.path.join(self.directory.name, 'file')
+
+        self.downloader.download_to_file(path)
+
+        with open(path, 'rb') as f:
+            self.assertEqual(CONTENT, f.read())
+
+    def test_download_to_mmap(self):
+        memory_map = self.downloader.download_to_mmap(os.path.join(self.directory.name, 'file'))
+
+        self.assertEqual(CONTENT, memory_map[:])
+        memory_map.close()
+
+    def test_iter_lines(self):
+        lines = list(self.downloader.iter_lines())
+
+        self.assertEqual([f'line {i}'.encode('utf-8') for i in range(1000)], lines)
+        self.assertEqual(CONTENT, b''.join(self.downloader.iter_lines(keepends=True)))
+
+    def test_iter_lines_final_carriage_return(self):
+        downloader = RangedDownloader(FakeS3Client(content=b'first\r\nlast\r'), 'bucket', 'key', part_size=4)
+
+        self.assertEqual([b'first', b'last'], list(downloader.iter_lines()))
+        self.assertEqual([b'first\r\n', b'last\r'], list(downloader.iter_lines(keepends=True)))
+
+    def test_object_changed(self):
+        self.client.etag = '"other"'
+
+        self.assertRaises(ObjectChangedError, self.downloader.download_into, bytearray(len(CONTENT)))
+
+    def test_empty_object(self):
+        downloader = RangedDownloader(FakeS3Client(content=b''), 'bucket', 'key')
+
+        self.assertEqual(bytearray(), self.download_bytes(downloader))
+        self.assertEqual([], list(downloader.iter_lines()))
+
+    @staticmethod
+    def download_bytes(downloader):
+        buffer = bytearray(downloader.size)
+        downloader.download_into(buffer)
+        return buffer
+
+
+class TestS3UtilsDownload(TestCase):
+    @mock.patch('ie_utils.s3.aws_registry')
+    def test_download_bytes(self, aws_registry_mock):
+        aws_registry_mock.get_client.return_value = FakeS3Client()
+
+        self.assertEqual(CONTENT, S3Utils.download_bytes('bucket', 'key', part_size=4096))
+
+    @mock.patch('ie_utils.s3.aws_registry')
+    def test_iter_lines(self, aws_registry_mock):
+        aws_registry_mock.get_client.return_value = FakeS3Client()
+
+        self.assertEqual(1000, len(list(S3Utils.iter_lines('bucket', 'key', part_size=100))))
+
+
+class FakeMultipartClient:
+    """
+    S3 client recording uploaded parts and the max number of parts uploaded at the same time
+    """
+
+    def __init__(self, failures=0, failure_code='InternalError'):
+        self.parts = {}
+        self.put_objects = []
+        self.aborted = []
+        self.completed = None
+        self.failures = failures
+        self.failure_code = failure_code
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def put_object(self, **kwargs):
+        self.put_objects.append(kwargs)
+        return {'ETag': '"single"'}
+
+    def create_multipart_upload(self, **kwargs):
+        return {'UploadId': 'upload_id'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            threading.Event().wait(0.001)
+            with self.lock:
+                if self.failures:
+                    self.failures -= 1
+                    raise ClientError({'Error': {'Code': self.failure_code}}, 'UploadPart')
+                self.parts[PartNumber] = Body
+            return {'ETag': f'"{PartNumber}"'}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def complete_multipart_upload(self, **kwargs):
+        self.completed = kwargs
+        return {'ETag': '"multipart"'}
+
+    def abort_multipart_upload(self, **kwargs):
+        self.aborted.append(kwargs)
+
+
+@mock.patch('ie_utils.s3_transfer.MIN_PART_SIZE', 1)
+@mock.patch('ie_utils.s3_transfer.time.sleep')
+class TestMultipartUploader(TestCase):
+    def test_iter_chunks(self, sleep_mock):
+        expected = [b'abc', b'def', b'g']
+
+        self.assertEqual(expected, list(iter_chunks(b'abcdefg', 3)))
+        self.assertEqual(expected, list(iter_chunks(io.BytesIO(b'abcdefg'), 3)))
+        self.assertEqual(expected, list(iter_chunks(iter([b'ab', b'cdefg']), 3)))
+        self.assertEqual([], list(iter_chunks(iter([]), 3)))
+
+    def test_single_put(self, sleep_mock):
+        client = FakeMultipartClient()
+
+        result = MultipartUploader(client, 'bucket', 'key', part_size=100, ContentType='text/plain').upload(
+            iter([b'a' * 50, b'b' * 50]))
+
+        self.assertEqual({'ETag': '"single"', 'Size': 100, 'Parts': 0}, result)
+        self.assertEqual({'Bucket': 'bucket', 'Key': 'key', 'Body': b'a' * 50 + b'b' * 50,
+                          'ContentType': 'text/plain'}, client.put_objects[0])
+
+    def test_multipart(self, sleep_mock):
+        client = FakeMultipartClient()
+        chunks = (CONTENT[i:i + 777] for i in range(0, len(CONTENT), 777))
+
+        result = MultipartUploader(client, 'bucket', 'key', part_size=1000, max_concurrency=3).upload(chunks)
+
+        self.assertEqual({'ETag': '"multipart"', 'Size': len(CONTENT), 'Parts': len(client.parts)}, result)
+        self.assertEqual(CONTENT, b''.join(client.parts[i] for i in sorted(client.parts)))
+        self.assertEqual(list(range(1, len(client.parts) + 1)),
+                         [it['PartNumber'] for it in client.completed['MultipartUpload']['Parts']])
+        self.assertLessEqual(client.max_in_flight, 3)
+        self.assertEqual([], client.aborted)
+
+    def test_part_retry(self, sleep_mock):
+        client = FakeMultipartClient(failures=2)
+
+        MultipartUploader(client, 'bucket', 'key', part_size=1000).upload(CONTENT)
+
+        self.assertEqual(CONTENT, b''.join(client.parts[i] for i in sorted(client.parts)))
+        self.assertEqual(2, sleep_mock.call_count)
+
+    def test_part_not_retried_on_final_error(self, sleep_mock):
+        client = FakeMultipartClient(failures=1, failure_code='AccessDenied')
+
+        self.assertRaises(ClientError, MultipartUploader(client, 'bucket', 'key', part_size=1000).upload, CONTENT)
+
+        sleep_mock.assert_not_called()
+        self.assertEqual(1, len(client.aborted))
+
+    def test_abort_on_failure(self, sleep_mock):
+        client = FakeMultipartClient(failures=1000)
+
+        self.assertRaises(ClientError, MultipartUploader(client, 'bucket', 'key', part_size=1000).upload, CONTENT)
+
+        self.assertEqual([{'Bucket': 'bucket', 'Key': 'key', 'UploadId': 'upload_id'}], client.aborted)
+        self.assertIsNone(client.completed)
+
+    def test_min_part_size(self, sleep_mock):
+        with mock.patch('ie_utils.s3_transfer.MIN_PART_SIZE', 100):
+            self.assertRaises(ValueError, MultipartUploader, FakeMultipartClient(), 'bucket', 'key', part_size=10)
+
+    @mock.patch('ie_utils.s3.aws_registry')
+    def test_s3_utils_upload(self, aws_registry_mock, sleep_mock):
+        aws_registry_mock.get_client.return_value = FakeMultipartClient()
+
+        result = S3Utils.upload('bucket', 'key', io.BytesIO(CONTENT), part_size=4096)
+
+        self.assertEqual(len(CONTENT), result['Size'])
+        self.assertEqual(3, result['Parts'])
@@ -0,0 +1,164 @@
+import threading
+from decimal import Decimal
+from unittest import TestCase
+
+import mock
+from boto3.dynamodb.types import Binary
+from botocore.exceptions import ClientError
+
+from ie_utils import DynamoDBUtils
+from ie_utils.dynamodb_batch import key_id
+from ie_utils.seen_filter import BloomFilter, SeenKeyFilter
+
+
+class FakeTable:
+    """
+    Table honouring attribute_not_exists conditions, counting put_item calls
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = {}
+        self.calls = 0
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None):
+        with self.lock:
+            self.calls += 1
+            key = Item['identifier']
+            if ConditionExpression and key in self.items:
+                raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}}, 'PutItem')
+            self.items[key] = Item
+
+
+class TestBloomFilter(TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        values = [str(i).encode() for i in range(1000)]
+
+        self.assertTrue(all(bloom.add(it) for it in values[:10]))
+        for value in values[10:]:
+            bloom.add(value)
+
+        self.assertTrue(all(it in bloom for it in values))
+        self.assertFalse(bloom.add(values[0]))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(10000, 0.01)
+        for i in range(10000):
+            bloom.add(f'in{i}'.encode())
+
+        false_positives = sum(f'out{i}'.encode() in bloom for i in range(20000))
+
+        self.assertLess(false_positives / 20000, 0.015)
+
+    def test_invalid_error_rate(self):
+        self.assertRaises(ValueError, BloomFilter, 100, 0)
+
+
+class TestSeenKeyFilter(TestCase):
+    def test_seen_per_table(self):
+        seen_filter = SeenKeyFilter(capacity=100)
+        seen_filter.add('table', {'identifier': 'a'})
+
+        self.assertTrue(seen_filter.seen('table', {'identifier': 'a'}))
+        self.assertFalse(seen_filter.seen('other', {'identifier': 'a'}))
+        self.assertFalse(seen_filter.seen('table', {'identifier': 'b'}))
+
+    def test_equal_key_values(self):
+        seen_filter = SeenKeyFilter(capacity=100)
+        seen_filter.add('table', {'identifier': 1, 'data': b'a'})
+
+        self.assertTrue(seen_filter.seen('table', {'identifier': 1.0, 'data': Binary(b'a')}))
+        self.assertTrue(seen_filter.seen('table', {'identifier': Decimal('1.00'), 'data': bytearray(b'a')}))
+        self.assertFalse(seen_filter.seen('table', {'identifier': '1', 'data': b'a'}))
+        self.assertFalse(seen_filter.seen('table', {'identifier': 1, 'data': 'a'}))
+
+    def test_remembers_last_capacity_keys(self):
+        seen_filter = SeenKeyFilter(capacity=100)
+        for i in range(250):
+            seen_filter.add('table', {'identifier': str(i)})
+
+        self.assertTrue(all(seen_filter.seen('table', {'identifier': str(i)}) for i in range(150, 250)))
+        self.assertEqual(2, seen_filter.stats['rotations'])
+        self.assertLess(sum(seen_filter.seen('table', {'identifier': str(i)}) for i in range(100)), 5)
+
+    def test_ttl(self):
+        now = [0]
+        seen_filter = SeenKeyFilter(capacity=100, ttl=10, clock=lambda: now[0])
+        seen_filter.add('table', {'identifier': 'a'})
+
+        now[0] = 15
+        self.assertTrue(seen_filter.seen('table', {'identifier': 'a'}))
+        now[0] = 25
+        self.assertFalse(seen_filter.seen('table', {'identifier': 'a'}))
+
+
+@mock.patch('ie_utils.dynamodb.DynamoDBUtils.get_table')
+class TestPutIfAbsent(TestCase):
+    def setUp(self):
+        self.table = FakeTable()
+        self.addCleanup(DynamoDBUtils.disable_seen_filter)
+
+    def test_put_if_absent(self, get_table_mock):
+        get_table_mock.return_value = self.table
+
+        self.assertTrue(DynamoDBUtils.put_if_absent('table', {'identifier': 'a', 'value': 1}, key_names=['identifier']))
+        self.assertFalse(DynamoDBUtils.put_if_absent('table', {'identifier': 'a', 'value': 2}, key_names=['identifier']))
+
+        self.assertEqual({'identifier': 'a', 'value': 1}, self.table.items['a'])
+        self.assertEqual(2, self.table.calls)
+
+    def test_concurrent_writers_one_wins(self, get_table_mock):
+        get_table_mock.return_value = self.table
+        barrier = threading.Barrier(8, timeout=5)
+        results = []
+
+        def put(i):
+            barrier.wait()
+            results.append(DynamoDBUtils.put_if_absent('table', {'identifier': 'a', 'writer': i},
+                                                       key_names=['identifier']))
+
+        threads = [threading.Thread(target=put, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, results.count(True))
+
+    def test_replays_rejected_without_call(self, get_table_mock):
+        get_table_mock.return_value = self.table
+        DynamoDBUtils.enable_seen_filter(capacity=1000)
+
+        for _ in range(5):
+            DynamoDBUtils.put_if_absent('table', {'identifier': 'a'}, key_names=['identifier'])
+
+        self.assertEqual(1, self.table.calls)
+
+    def test_other_errors_raised(self, get_table_mock):
+        get_table_mock.return_value.put_item.side_effect = ClientError(
+            {'Error': {'Code': 'ValidationException', 'Message': ''}}, 'PutItem')
+
+        self.assertRaises(ClientError, DynamoDBUtils.put_if_absent, 'table', {'identifier': 'a'},
+                          key_names=['identifier'])
+
+    def test_key_names_from_schema(self, get_table_mock):
+        get_table_mock.return_value = self.table
+        schema = mock.Mock(key_names=['identifier'])
+        with mock.patch.object(DynamoDBUtils.query_planner, 'get_schema', return_value=schema):
+            self.assertTrue(DynamoDBUtils.put_if_absent('table', {'identifier': 'a'}))
+
+    def test_put_items_if_absent(self, get_table_mock):
+        get_table_mock.return_value = self.table
+        self.table.items['b'] = {'identifier': 'b'}
+        DynamoDBUtils.enable_seen_filter(capacity=1000)
+        DynamoDBUtils.put_if_absent('table', {'identifier': 'c'}, key_names=['identifier'])
+        entries = [{'identifier': it} for it in 'abcad']
+
+        results = DynamoDBUtils.put_items_if_absent('table', entries, key_names=['identifier'], max_workers=4)
+
+        self.assertEqual({key_id({'identifier': 'a'}): True, key_id({'identifier': 'b'}): False,
+                          key_id({'identifier': 'c'}): False, key_id({'identifier': 'd'}): True}, results)
+        # c was rejected by the filter, a only sent once
+        self.assertEqual(4, self.table.calls)
+        self.assertTrue(DynamoDBUtils._seen_filter.seen('table', {'identifier': 'b'}))
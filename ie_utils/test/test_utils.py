@@ -1,45 +1,96 @@
 import logging
+import os
+import threading
 from unittest import TestCase
 
 import mock
 from boto3.dynamodb.conditions import Attr
 
 from ie_utils import get_logger, init_sentry_sdk, S3Utils, DynamoDBUtils, \
-    capture_exception, delete_cloud_watch_cron_rule, create_cloud_watch_cron_rule
-from ie_utils.constants import SENTRY_DSN_VAR_NAME
+    capture_exception, delete_cloud_watch_cron_rule, create_cloud_watch_cron_rule, flush_exceptions
+from ie_utils import logging_utils
+from ie_utils.constants import SENTRY_DSN_VAR_NAME, LOGGING_LEVEL_VAR_NAME
+from ie_utils.error_reporter import ExceptionReporter
+from ie_utils.test.test_logging_utils import keep_root_logging
 
 
 class TestLogUtils(TestCase):
-    @mock.patch('ie_utils.os')
-    def test_get_logger(self, os_mock):
-        os_mock.environ.get.return_value = 'INFO'
+    @mock.patch.dict('os.environ', {LOGGING_LEVEL_VAR_NAME: 'WARNING'})
+    def test_get_logger(self):
+        keep_root_logging(self)
         logger = get_logger()
-        self.assertEqual('INFO', logging.getLevelName(logger.level))
+        self.assertEqual('WARNING', logging.getLevelName(logger.level))
 
-    @mock.patch('ie_utils.os')
-    @mock.patch('ie_utils.sentry_sdk')
+        with mock.patch('ie_utils.logging_utils.configure_logging') as configure_logging_mock:
+            get_logger()
+        configure_logging_mock.assert_not_called()
+
+    @mock.patch('ie_utils.logging_utils._sentry_initialized', False)
+    @mock.patch('ie_utils.logging_utils.os')
+    @mock.patch('ie_utils.logging_utils.sentry_sdk')
     def test_init_sentry_sdk(self, sentry_sdk_mock, os_mock):
         os_mock.environ = {SENTRY_DSN_VAR_NAME: 'sentry_dsn'}
         init_sentry_sdk()
+        init_sentry_sdk()
         self.assertEqual('sentry_dsn', sentry_sdk_mock.init.call_args[1].get('dsn'))
+        sentry_sdk_mock.init.assert_called_once()
 
-    @mock.patch('ie_utils.init_sentry_sdk')
-    @mock.patch('ie_utils.sentry_sdk.capture_exception')
+    @mock.patch('ie_utils.logging_utils.exception_reporter',
+                ExceptionReporter(lambda *args: logging_utils._send_exception(*args)))
+    @mock.patch('ie_utils.logging_utils.init_sentry_sdk')
+    @mock.patch('sentry_sdk.capture_exception')
     def test_capture_exception(self, capture_exception_mock, init_sentry_sdk_mock):
         exc = Exception('error')
 
         capture_exception(exc)
+        flush_exceptions()
 
         init_sentry_sdk_mock.assert_called()
         capture_exception_mock.assert_called()
         self.assertEqual(exc, capture_exception_mock.call_args[0][0])
 
+    @mock.patch('ie_utils.logging_utils._sentry_initialized', False)
+    @mock.patch('ie_utils.logging_utils.exception_reporter')
+    @mock.patch('ie_utils.logging_utils.sentry_sdk')
+    def test_capture_exception_binds_calling_thread(self, sentry_sdk_mock, exception_reporter_mock):
+        # sentry-sdk 0.9.5 binds the client to the hub of the thread calling init
+        init_threads = []
+        sentry_sdk_mock.init.side_effect = lambda **kwargs: init_threads.append(threading.current_thread())
+
+        with mock.patch.dict(os.environ, {SENTRY_DSN_VAR_NAME: 'https://key@localhost/1'}):
+            capture_exception(Exception('error'))
+
+        self.assertEqual([threading.current_thread()], init_threads)
+        exception_reporter_mock.report.assert_called_once()
+
+    def test_send_exception_with_suppressed_count(self):
+        # api of the pinned sentry-sdk 0.9.5: capture_exception(error=None), push_scope() as a context manager
+        captured = []
+        scope = mock.Mock()
+
+        def pinned_capture_exception(error=None):
+            captured.append((error, scope.set_extra.call_count))
+
+        sentry_mock = mock.Mock(capture_exception=pinned_capture_exception)
+        sentry_mock.push_scope.return_value.__enter__ = mock.Mock(return_value=scope)
+        sentry_mock.push_scope.return_value.__exit__ = mock.Mock(return_value=False)
+        exc = Exception('error')
+
+        with mock.patch('ie_utils.logging_utils.sentry_sdk', sentry_mock):
+            logging_utils._send_exception(exc, 3)
+            logging_utils._send_exception(exc, 0)
+
+        # the count is set before the first capture, the second one goes without scope
+        self.assertEqual([(exc, 1), (exc, 1)], captured)
+        scope.set_extra.assert_called_once_with('suppressed_duplicates', 3)
+        sentry_mock.push_scope.assert_called_once()
+
 
 class TestS3Utils(TestCase):
-    @mock.patch('ie_utils.boto3')
-    def test_get_object(self, boto3_mock):
+    @mock.patch('ie_utils.s3.aws_registry')
+    def test_get_object(self, aws_registry_mock):
         s3_object_mock = mock.Mock()
-        boto3_mock.resource.return_value = s3_object_mock
+        aws_registry_mock.get_resource.return_value = s3_object_mock
 
         S3Utils.get_object('bucket_name', 'file_key')
 
@@ -47,10 +98,10 @@ class TestS3Utils(TestCase):
         self.assertEqual('bucket_name', s3_object_mock.Object.call_args[0][0])
         self.assertEqual('file_key', s3_object_mock.Object.call_args[0][1])
 
-    @mock.patch('ie_utils.boto3')
-    def test_put_object(self, boto3_mock):
+    @mock.patch('ie_utils.s3.aws_registry')
+    def test_put_object(self, aws_registry_mock):
         s3_client_mock = mock.Mock()
-        boto3_mock.client.return_value = s3_client_mock
+        aws_registry_mock.get_client.return_value = s3_client_mock
 
         S3Utils.put_object('bucket_name', 'file_key', 'bytes'.encode('utf-8'))
 
@@ -74,9 +125,24 @@ class TestDynamoDBUtils(TestCase):
 
         self.assertEqual('test', test_class_instance.test())
         self.assertEqual(2, log_mock.call_count)
+        self.assertEqual("{'signature': '()', 'args': [], 'kwargs': {}}", str(log_mock.call_args_list[0][0][3]))
+        self.assertEqual("{'args': [], 'result': '\"test\"'}", str(log_mock.call_args_list[1][0][3]))
+
+    @mock.patch('ie_utils.DynamoDBUtils.log')
+    def test_log_wrapper_error(self, log_mock):
+        class Test:
+            def test(self):
+                raise ValueError('test')
+
+        test_class_instance = Test()
+
+        DynamoDBUtils.log_wrapper(test_class_instance, 'test', 'table_name', 'table_key')
+
+        self.assertRaises(ValueError, test_class_instance.test)
+        self.assertEqual(1, log_mock.call_count)
 
     @mock.patch('ie_utils.DynamoDBUtils.update_item')
-    @mock.patch('ie_utils.datetime.datetime')
+    @mock.patch('ie_utils.dynamodb.datetime.datetime')
     def test_log(self, datetime_mock, update_item_mock):
         datetime_mock.now.return_value = 'now'
 
@@ -99,7 +165,7 @@ class TestDynamoDBUtils(TestCase):
             update_item_mock.call_args[1]['ExpressionAttributeValues']
         )
 
-    @mock.patch('ie_utils.get_logger')
+    @mock.patch('ie_utils.dynamodb.get_logger')
     def test_log_table_None(self, get_logger_mock):
         DynamoDBUtils.log(None, 'table_key', 'log description', 'log object')
 
@@ -108,7 +174,7 @@ class TestDynamoDBUtils(TestCase):
             'table name: None, table key: table_key, log_object: log object',
             get_logger_mock.return_value.error.call_args[0][0])
 
-    @mock.patch('ie_utils.datetime.datetime')
+    @mock.patch('ie_utils.dynamodb.datetime.datetime')
     @mock.patch('ie_utils.DynamoDBUtils.update_item')
     def test_update_event(self, update_item_mock, datetime_mock):
         datetime_mock.now.return_value = 'now'
@@ -133,7 +199,7 @@ class TestDynamoDBUtils(TestCase):
             update_item_mock.call_args[1]
         )
 
-    @mock.patch('ie_utils.DynamoDBUtils')
+    @mock.patch('ie_utils.dynamodb.DynamoDBUtils')
     def test_update_item(self, dynamo_db_utils_mock):
         table_mock = mock.Mock()
         dynamo_db_utils_mock.get_table.return_value = table_mock
@@ -143,12 +209,12 @@ class TestDynamoDBUtils(TestCase):
         self.assertEqual('table name', dynamo_db_utils_mock.get_table.call_args[0][0])
         self.assertEqual('arg', table_mock.update_item.call_args[1]['arg'])
 
-    @mock.patch('ie_utils.boto3')
-    def test_get_table(self, boto3_mock):
+    @mock.patch('ie_utils.dynamodb.aws_registry')
+    def test_get_table(self, aws_registry_mock):
         DynamoDBUtils.get_table('table name')
 
-        boto3_mock.resource.assert_called()
-        self.assertEqual('table name', boto3_mock.resource.return_value.Table.call_args[0][0])
+        aws_registry_mock.get_table.assert_called()
+        self.assertEqual('table name', aws_registry_mock.get_table.call_args[0][0])
 
     def test_deserialize_python_data(self):
         dynamo_db_dict = {
@@ -239,16 +305,16 @@ class TestDynamoDBUtils(TestCase):
 
 
 class TestCloudWatchUtils(TestCase):
-    @mock.patch('ie_utils.boto3')
-    @mock.patch('ie_utils.uuid.uuid4')
-    def test_create_cloud_watch_cron_rule(self, uuid4_mock, boto3_mock):
+    @mock.patch('ie_utils.cloudwatch.aws_registry')
+    @mock.patch('ie_utils.cloudwatch.uuid.uuid4')
+    def test_create_cloud_watch_cron_rule(self, uuid4_mock, aws_registry_mock):
         uuid4_mock.return_value.hex = 'hex'
-        boto3_mock.client('lambda').get_function.return_value = {
+        aws_registry_mock.get_client('lambda').get_function.return_value = {
             'Configuration': {
                 'FunctionArn': 'FunctionArn'
             }
         }
-        boto3_mock.client('events').put_rule.return_value = {
+        aws_registry_mock.get_client('events').put_rule.return_value = {
             'RuleArn': 'RuleArn'
         }
 
@@ -260,7 +326,7 @@ class TestCloudWatchUtils(TestCase):
             'ScheduleExpression': 'cron_expression',
             'State': 'ENABLED',
             'Description': 'description'
-        }, boto3_mock.client('events').put_rule.call_args[1])
+        }, aws_registry_mock.get_client('events').put_rule.call_args[1])
 
         self.assertEqual({
             'Rule': 'Rule_hex',
@@ -269,7 +335,7 @@ class TestCloudWatchUtils(TestCase):
                 'Arn': "FunctionArn",
                 'Input': '"lambda_json_input"'
             }]
-        }, boto3_mock.client('events').put_targets.call_args[1])
+        }, aws_registry_mock.get_client('events').put_targets.call_args[1])
 
         self.assertEqual({
             'FunctionName': 'lambda_function',
@@ -277,11 +343,11 @@ class TestCloudWatchUtils(TestCase):
             'Action': 'lambda:InvokeFunction',
             'SourceArn': "RuleArn",
             'Principal': 'events.amazonaws.com'
-        }, boto3_mock.client('lambda').add_permission.call_args[1])
+        }, aws_registry_mock.get_client('lambda').add_permission.call_args[1])
 
-    @mock.patch('ie_utils.boto3')
-    def test_delete_cloud_watch_cron_rule(self, boto3_mock):
-        boto3_mock.client('events').list_targets_by_rule.return_value = {
+    @mock.patch('ie_utils.cloudwatch.aws_registry')
+    def test_delete_cloud_watch_cron_rule(self, aws_registry_mock):
+        aws_registry_mock.get_client('events').list_targets_by_rule.return_value = {
             'Targets': [{'Id': 'id'}]
         }
 
@@ -291,14 +357,14 @@ class TestCloudWatchUtils(TestCase):
             'Rule': 'rule_name',
             'Ids': ['id'],
             'Force': True
-        }, boto3_mock.client('events').remove_targets.call_args[1])
+        }, aws_registry_mock.get_client('events').remove_targets.call_args[1])
 
         self.assertEqual({
             'Name': 'rule_name',
             'Force': True
-        }, boto3_mock.client('events').delete_rule.call_args[1])
+        }, aws_registry_mock.get_client('events').delete_rule.call_args[1])
 
         self.assertEqual({
             'FunctionName': 'function_name',
             'StatementId': 'statement_id'
-        }, boto3_mock.client('lambda').remove_permission.call_args[1])
+        }, aws_registry_mock.get_client('lambda').remove_permission.call_args[1])